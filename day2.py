@@ -3,107 +3,181 @@ https://adventofcode.com/2019/day/2
 """
 
 
+import os
 import sys
-import abc
-import copy
-import itertools
+import time
 import logging
+import multiprocessing
+
+from intcode import IntCode, IntCodeError, BudgetExceeded, Cancelled, parse, load
+from intcode.symbolic import NotStraightLine, evaluate, solve
+from intcode import batch
+from intcode import cluster
 
 
 log = logging.getLogger(__name__)
 
 
-class IntCodeOperation(abc.ABC):
-	@abc.abstractclassmethod
-	def opcode(cls):
-		pass
-
-	@abc.abstractclassmethod
-	def eval(cls, state):
-		pass
-
-	@classmethod
-	def getops(cls):
-		for subclass in cls.__subclasses__():
-			yield from subclass.getops()
-			yield subclass
-
-
-class AddOperation(IntCodeOperation):
-	@classmethod
-	def opcode(cls):
-		return 1
-
-	@classmethod
-	def eval(cls, state):
-		data, pos = state
-		opcode, x, y, z = data[pos:pos+4]
-		a = data[x]
-		b = data[y]
-		data[z] = a + b
-		log.debug("data[{}] ({}) + data[{}] ({}) = data[{}] ({})".format(
-			x, a, y, b, z, data[z]
-		))
-		return pos + 4
-
-
-class MulOperation(IntCodeOperation):
-	@classmethod
-	def opcode(cls):
-		return 2
-
-	@classmethod
-	def eval(cls, state):
-		data, pos = state
-		opcode, x, y, z = data[pos:pos+4]
-		a = data[x]
-		b = data[y]
-		data[z] = a * b
-		log.debug("data[{}] ({}) * data[{}] ({}) = data[{}] ({})".format(
-			x, a, y, b, z, data[z]
-		))
-		return pos + 4
-
-
-class EndOperation(IntCodeOperation):
-	@classmethod
-	def opcode(cls):
-		return 99
-
-	@classmethod
-	def eval(cls, state):
-		return len(state[0])
-
-
-class IntCode(object):
-	def __init__(self, state):
-		self._state = state
-		self._pos = 0
-		self._ops = None
-		log.debug("initial state: {}".format(self._state))
-
-	@property
-	def output(self):
-		return self._state[0]
-
-	@property
-	def state(self):
-		return self._state
-
-	def nextop(self):
-		if not self._ops:
-			self._ops = dict([(op.opcode(), op) for op in IntCodeOperation.getops()])
-		return self._ops[self._state[self._pos]]
-
-	def step(self):
-		op = self.nextop()
-		log.debug("position: {}".format(self._pos))
-		self._pos = op.eval((self._state, self._pos))
-		
-	def eval(self):
-		while self._pos < len(self._state):
-			self.step()
-			log.debug("state: {}".format(self._state))
+CHUNK = 500
+
+_image = None
+_found = None
+_trace = False
+_budget = None
+
+
+def _init_worker(image, found, trace=False, budget=None):
+	global _image, _found, _trace, _budget
+	_image = image
+	_found = found
+	_trace = trace
+	_budget = budget
+
+
+class NounVerbSearch(cluster.Search):
+	"""
+	Candidates of the space x space noun/verb grid, by index; a candidate
+	matches, as [noun, verb], when the program leaves target in address 0.
+	Candidates that fail or run more than budget instructions do not.
+	"""
+	def __init__(self, image, noun, verb, target, space=100, trace=False, budget=None):
+		self.image = image
+		self.noun = noun
+		self.verb = verb
+		self.target = target
+		self.space = space
+		self.budget = budget
+		self.evaluator = IntCode(list(image), trace=trace)
+
+	def check(self, idx, cancel=None):
+		n, v = divmod(idx, self.space)
+		self.evaluator.reset(self.image)
+		self.evaluator.state[self.noun] = n
+		self.evaluator.state[self.verb] = v
+		try:
+			self.evaluator.eval(budget=self.budget, cancel=cancel)
+		except Cancelled:
+			raise
+		except BudgetExceeded:
+			log.debug("noun: {}; verb: {}; over budget".format(n, v))
+			return None
+		except IntCodeError:
+			return None
+		log.debug("noun: {}; verb: {}; output: {}".format(n, v, self.evaluator.output))
+		if self.evaluator.output == self.target:
+			return [n, v]
+		return None
+
+
+def search_range(noun, verb, target, start, stop, space=100):
+	"""
+	Try candidates start..stop-1 of the space x space noun/verb grid against
+	the preloaded image; returns ((noun, verb) or None, candidates tried).
+	"""
+	search = NounVerbSearch(_image, noun, verb, target, space, _trace, _budget)
+	tried = 0
+	for idx in range(start, stop):
+		tried += 1
+		try:
+			match = search.check(idx, cancel=_found)
+		except Cancelled:
+			break
+		if match is not None:
+			if _found is not None:
+				_found.set()
+			return tuple(match), tried
+	return None, tried
+
+
+def _search_chunk(args):
+	return search_range(*args)
+
+
+def fuzz(data, noun, verb, target, space=100, jobs=None, trace=False, budget=None):
+	"""
+	Search the noun/verb grid across a process pool; returns
+	((noun, verb) or None, candidates tried, elapsed seconds). Candidates
+	that run more than budget instructions are skipped.
+	"""
+	jobs = jobs or os.cpu_count() or 1
+	total = space * space
+	chunks = [
+		(noun, verb, target, start, min(start + CHUNK, total), space)
+		for start in range(0, total, CHUNK)
+	]
+	start = time.perf_counter()
+	tried = 0
+	match = None
+	if jobs == 1:
+		_init_worker(data, None, trace, budget)
+		for chunk in chunks:
+			match, count = _search_chunk(chunk)
+			tried += count
+			if match is not None:
+				break
+	else:
+		found = multiprocessing.Event()
+		pool = multiprocessing.Pool(jobs, initializer=_init_worker, initargs=(data, found, trace, budget))
+		try:
+			for result, count in pool.imap_unordered(_search_chunk, chunks):
+				tried += count
+				if result is not None:
+					match = result
+					break
+		finally:
+			pool.terminate()
+			pool.join()
+	return match, tried, time.perf_counter() - start
+
+
+def fuzz_cluster(data, noun, verb, target, space=100, jobs=None, trace=False, budget=None, address=None):
+	"""
+	fuzz() through an intcode.cluster.Coordinator on address, with jobs
+	local workers and any started elsewhere (python -m intcode.cluster
+	ADDRESS); returns the same tuple as fuzz().
+	"""
+	jobs = jobs if jobs is not None else os.cpu_count() or 1
+	params = dict(noun=noun, verb=verb, target=target, space=space, trace=trace, budget=budget)
+	matches = []
+	start = time.perf_counter()
+	ranges = cluster.split(range(space * space), CHUNK)
+	with cluster.Coordinator("day2:NounVerbSearch", params, data, ranges, address=address, first=True) as coordinator:
+		if address is not None:
+			print("listening on {}".format(coordinator.address), file=sys.stderr)
+		coordinator.run(spawn=jobs, on_match=lambda idx, value: matches.append(tuple(value)))
+	return (matches[0] if matches else None), coordinator.tried, time.perf_counter() - start
+
+
+def fuzz_batch(data, noun, verb, target, space=100):
+	"""
+	Run the whole noun/verb grid as one lockstep batch; returns the same
+	tuple as fuzz().
+	"""
+	start = time.perf_counter()
+	lanes = batch.Batch.tile(data, space * space)
+	grid = range(space * space)
+	lanes.poke(noun, [idx // space for idx in grid])
+	lanes.poke(verb, [idx % space for idx in grid])
+	lanes.run()
+	log.debug("{} lockstep steps; {} lanes left lockstep".format(lanes.steps, len(lanes.scalar)))
+	match = None
+	for idx, output in enumerate(lanes.peek(0)):
+		if idx not in lanes.errors and output == target:
+			match = divmod(idx, space)
+			break
+	return match, len(lanes), time.perf_counter() - start
+
+
+def solve_symbolic(data, noun, verb, target, space=100):
+	"""
+	Evaluate the program once with symbolic noun/verb and solve data[0] ==
+	target directly; returns (noun, verb) or None.
+	"""
+	output = evaluate(data, (noun, verb))[0]
+	log.debug("output: {}".format(output))
+	for match in solve(output, target, space):
+		return match
+	return None
 
 
 def main():
@@ -116,33 +190,52 @@ def main():
 	parser.add_argument("-n", "--noun", type=int)
 	parser.add_argument("-v", "--verb", type=int)
 	parser.add_argument("-t", "--target", type=int)
+	parser.add_argument("-j", "--jobs", type=int, default=None)
+	parser.add_argument("--space", type=int, default=100)
+	parser.add_argument("-L", "--listen", type=str, default=None)
+	parser.add_argument("-s", "--symbolic", default=False, action="store_true")
+	parser.add_argument("-b", "--batch", default=False, action="store_true")
+	parser.add_argument("-B", "--budget", type=int, default=None)
 	parser.add_argument("-d", "--debug", default=False, action="store_true")
 	args = parser.parse_args()
+	if args.batch and batch.numpy is None:
+		parser.error("--batch needs numpy")
 	if args.debug:
 		logging.basicConfig(level=logging.DEBUG, stream=sys.stdout)
-	if args.path:
-		with open(args.path, "r") as f:
-			args.input = f.read()
-	data = [x for x in map(int, args.input.strip().split(","))]
-	if args.fuzz:
-		found = False
-		for n, v in itertools.product(range(100), repeat=2):
-			d = copy.deepcopy(data)
-			d[args.noun] = n
-			d[args.verb] = v
-			evaluator = IntCode(d)
-			evaluator.eval()
-			log.debug("noun: {}; verb: {}; output: {}".format(n, v, evaluator.output))
-			if evaluator.output == args.target:
-				print("noun: {}; verb: {}".format(n, v))
-				found = True
-				break
-		if not found:
+	data = load(args.path) if args.path else parse(args.input)
+	if args.fuzz and args.symbolic:
+		try:
+			match = solve_symbolic(data, args.noun, args.verb, args.target, args.space)
+		except NotStraightLine as e:
+			log.info("falling back to brute force: {}".format(e))
+			args.symbolic = False
+		else:
+			if match is None:
+				return 1
+			print("noun: {}; verb: {}".format(*match))
+	if args.fuzz and not args.symbolic:
+		if args.batch:
+			match, tried, elapsed = fuzz_batch(data, args.noun, args.verb, args.target, args.space)
+		elif args.listen:
+			match, tried, elapsed = fuzz_cluster(
+				data, args.noun, args.verb, args.target, args.space, jobs=args.jobs, trace=args.debug,
+				budget=args.budget, address=args.listen
+			)
+		else:
+			match, tried, elapsed = fuzz(
+				data, args.noun, args.verb, args.target, args.space, jobs=args.jobs, trace=args.debug,
+				budget=args.budget
+			)
+		print("searched {} candidates in {:.3f}s ({:.0f} candidates/s)".format(
+			tried, elapsed, tried / elapsed
+		), file=sys.stderr)
+		if match is None:
 			return 1
-	else:
-		evaluator = IntCode(data)
+		print("noun: {}; verb: {}".format(*match))
+	elif not args.fuzz:
+		evaluator = IntCode(data, trace=args.debug)
 		evaluator.eval()
-		log.debug(",".join(map(str, evaluator.state())))
+		log.debug(",".join(map(str, evaluator.state)))
 		print(evaluator.state[0])
 	return 0
 
@@ -3,380 +3,339 @@ https://adventofcode.com/2019/day/7
 """
 
 
-import abc
-import copy
-import time
-import queue
+import os
+import sys
+import math
 import logging
 import itertools
-import multiprocessing
-from collections import namedtuple, deque
 
+from intcode import IntCode, BudgetExceeded, NEEDS_INPUT, OUTPUT, parse, load
+from intcode.aio import Network, report
+from intcode import batch
+from intcode import replay
+from intcode import checkpoint
+from intcode import shared
+from intcode import cluster
 
-log = logging.getLogger(__name__)
-
-
-IntCodeArg = namedtuple("IntCodeArg", ("mode", "raw", "value"))
-
-
-class IntCodeOperation(abc.ABC):
-	@abc.abstractclassmethod
-	def opcode(cls):
-		pass
-
-	@abc.abstractclassmethod
-	def length(cls):
-		pass
-
-	@abc.abstractclassmethod
-	def _eval(cls, data, pos, *args):
-		pass
-
-	@classmethod
-	def eval(cls, state):
-		data, pos = state
-		opm = data[pos]
-		#op = opm % 100
-		f = (opm // 100) % 10
-		s = (opm // 1000) % 10
-		t = opm // 10000
-		args = []
-		for mode, arg in zip([f, s ,t], data[pos+1:pos+cls.length()]):
-			if mode == 0: # position
-				args.append(IntCodeArg(mode, arg, data[arg]))
-			elif mode == 1: # immediate
-				args.append(IntCodeArg(mode, arg, arg))
-			else:
-				raise RuntimeError("Invalid mode {} at {}".format(mode, pos))
-		return cls._eval(data, pos, *args)
-
-	@classmethod
-	def getops(cls):
-		for subclass in cls.__subclasses__():
-			yield from subclass.getops()
-			yield subclass
-
-
-class OneIntCode(IntCodeOperation):
-	@classmethod
-	def length(cls):
-		return 1
-
-
-class TwoIntCode(IntCodeOperation):
-	@classmethod
-	def length(cls):
-		return 2
-
-
-class ThreeIntCode(IntCodeOperation):
-	@classmethod
-	def length(cls):
-		return 3
-
-
-class FourIntCode(IntCodeOperation):
-	@classmethod
-	def length(cls):
-		return 4
-
-
-class EndOperation(OneIntCode):
-	@classmethod
-	def opcode(cls):
-		return 99
-
-	@classmethod
-	def _eval(cls, data, pos, *args):
-		log.debug("HALT")
-		return len(data)
-
-
-class AddOperation(FourIntCode):
-	@classmethod
-	def opcode(cls):
-		return 1
-
-	@classmethod
-	def _eval(cls, data, pos, *args):
-		a, b, loc = args
-		log.debug("ADD: data[{}] = {}({}) + {}({})".format(
-			loc.raw,
-			a.value,
-			"data[{}]".format(a.raw) if a.mode == 0 else "i",
-			b.value,
-			"data[{}]".format(b.raw) if b.mode == 0 else "i"
-		))
-		data[loc.raw] = a.value + b.value
-		return pos + cls.length()
-
-
-class MulOperation(FourIntCode):
-	@classmethod
-	def opcode(cls):
-		return 2
-
-	@classmethod
-	def _eval(cls, data, pos, *args):
-		a, b, loc = args
-		log.debug("MUL: data[{}] = {}({}) * {}({})".format(
-			loc.raw,
-			a.value,
-			"data[{}]".format(a.raw) if a.mode == 0 else "i",
-			b.value,
-			"data[{}]".format(b.raw) if b.mode == 0 else "i"
-		))
-		data[loc.raw] = a.value * b.value
-		return pos + cls.length()
 
+log = logging.getLogger(__name__)
 
-class InOperation(TwoIntCode):
-	@classmethod
-	def opcode(cls):
-		return 3
 
-	@classmethod
-	def _eval(cls, data, pos, *args):
-		loc = args[0]
-		raw = input("input: ")
-		if raw:
-			val = int(raw)
+def run_chain(data, phases, signal=0, trace=False, budget=None, recorder=None):
+	"""
+	Run one amplifier per phase setting in this process, each amplifier's
+	output feeding the next and the last one feeding back into the first.
+	Amplifiers are run round-robin until they block on input, handing over
+	their outputs in batches, until they all halt (or none can make
+	progress); returns the last output of the final amplifier. With budget,
+	an amplifier that runs more instructions than that gives up the chain
+	and None is returned. With recorder (intcode.replay.Recorder), every
+	amplifier's I/O is logged under "<phases>:<amp>". data may be an
+	intcode.shared.SharedImage, which amplifiers run copy-on-write.
+	"""
+	amps = []
+	left = [budget] * len(phases)
+	ids = []
+	for idx, phase in enumerate(phases):
+		if recorder is None:
+			amp = IntCode(shared.private(data), trace=trace)
 		else:
-			val = 0
-		log.debug("IN: data[{}] = {}(i)".format(loc.raw, val))
-		data[loc.raw] = val
-		return pos + cls.length()
-
-
-class InQueueOperation(TwoIntCode):
-	@classmethod
-	def opcode(cls):
-		return None
-
-	@classmethod
-	def _eval(cls, data, pos, *args):
-		loc = args[0]
-		raw = cls.inq.get()
-		if raw:
-			val = int(raw)
+			amp = IntCode(shared.private(data), trace=trace, count=True)
+			ids.append(recorder.machine("{}:{}".format("".join(phases), "ABCDEFGHIJ"[idx % 10])))
+		amp.feed(int(phase))
+		amps.append(amp)
+	amps[0].feed(signal)
+	last = None
+	progress = True
+	while progress:
+		progress = False
+		for idx, amp in enumerate(amps):
+			if amp.halted or (amp.status == NEEDS_INPUT and not amp.inputs):
+				continue
+			try:
+				if recorder is None:
+					amp.run(budget=left[idx])
+				else:
+					recorder.run(amp, ids[idx], budget=left[idx])
+			except BudgetExceeded as e:
+				log.warning("phases {}: amp {}: {}".format(phases, "ABCDEFGHIJ"[idx % 10], e))
+				last = progress = None
+				break
+			if budget is not None:
+				left[idx] = amp.budget_left
+			progress = True
+			out = amp.drain()
+			if out:
+				log.debug("amp {} output: {}".format("ABCDEFGHIJ"[idx % 10], out))
+				amps[(idx + 1) % len(amps)].feed(*out)
+				if idx == len(amps) - 1:
+					last = out[-1]
+	if recorder is not None:
+		for amp, mid in zip(amps, ids):
+			recorder.end(mid, amp.steps, amp.status)
+		recorder.flush()
+	return last
+
+
+def run_network(data, phases, signal=0, trace=False):
+	"""
+	run_chain on the asyncio runtime: one task per amplifier, linked in a
+	ring. Returns (last output of the final amplifier, per-amplifier stats).
+	"""
+	names = ["amp {}".format(chr(ord("A") + idx)) for idx in range(len(phases))]
+	net = Network()
+	for name, phase in zip(names, phases):
+		net.add(name, data, inputs=[int(phase)], trace=trace)
+	net.feed(names[0], signal)
+	net.ring(names)
+	stats = net.run()
+	outputs = stats[names[-1]].outputs
+	return (outputs[-1] if outputs else None), stats
+
+
+def run_amp(data, phase, signal, trace=False):
+	"""
+	Run a single amplifier up to its first output (no feedback).
+	"""
+	amp = IntCode(list(data), trace=trace)
+	amp.feed(int(phase), signal)
+	if amp.run(until_output=True) == OUTPUT:
+		return amp.outputs[0]
+	return None
+
+
+class AmpCache(object):
+	"""
+	Memoized run_amp: an amplifier's output depends only on its phase and
+	input signal. Each phase is run once up to the point where it waits for
+	its signal and later runs fork from there.
+	"""
+	def __init__(self, data, trace=False):
+		self._data = data
+		self._trace = trace
+		self._cache = {}
+		self._branches = {}
+		self.hits = 0
+		self.misses = 0
+
+	def _branch(self, phase):
+		if phase not in self._branches:
+			machine = IntCode(list(self._data), trace=self._trace)
+			machine.feed(int(phase))
+			if machine.run() != NEEDS_INPUT:
+				raise RuntimeError("amplifier did not ask for an input signal")
+			self._branches[phase] = machine
+		return self._branches[phase].fork()
+
+	def __call__(self, phase, signal):
+		key = (phase, signal)
+		if key in self._cache:
+			self.hits += 1
 		else:
-			val = 0
-		log.debug("INQ: data[{}] = {}(i)".format(loc.raw, val))
-		data[loc.raw] = val
-		return pos + cls.length()
-
-
-class OutOperation(TwoIntCode):
-	@classmethod
-	def opcode(cls):
-		return 4
-
-	@classmethod
-	def _eval(cls, data, pos, *args):
-		a = args[0]
-		log.debug("OUT: {}({})".format(
-			a.value,
-			"data[{}]".format(a.raw) if a.mode == 0 else "i"
-		))
-		if a.mode == 0:
-			print(data[a.raw])
+			self.misses += 1
+			amp = self._branch(phase)
+			amp.feed(signal)
+			value = None
+			if amp.run(until_output=True) == OUTPUT:
+				value = amp.outputs[0]
+			self._cache[key] = value
+		return self._cache[key]
+
+
+def sweep_cached(data, phases, trace=False):
+	"""
+	Non-feedback sweep that walks the permutations as a trie, so shared
+	prefixes are evaluated once, with every amplifier run memoized on (phase,
+	input signal). Returns ((highest signal, phases), cache).
+	"""
+	cache = AmpCache(data, trace)
+	highest = [0, None]
+
+	def walk(prefix, remaining, signal):
+		if not remaining:
+			log.debug("inputs: {}; output: {}".format(prefix, signal))
+			if signal is not None and signal > highest[0]:
+				highest[:] = [signal, prefix]
+			return
+		for idx, phase in enumerate(remaining):
+			walk(prefix + (phase,), remaining[:idx] + remaining[idx + 1:], cache(phase, signal))
+
+	walk((), tuple(phases), 0)
+	return highest, cache
+
+
+def permutation(phases, idx):
+	"""
+	The idx-th of itertools.permutations(phases), without making the ones
+	before it.
+	"""
+	pool = list(phases)
+	ret = []
+	for left in range(len(pool), 0, -1):
+		pos, idx = divmod(idx, math.factorial(left - 1))
+		ret.append(pool.pop(pos))
+	return tuple(ret)
+
+
+class PhaseSearch(cluster.Search):
+	"""
+	Feedback chains for the permutations of phases, by index. A candidate
+	matches when its signal beats the best this search has seen, as
+	[signal, phases].
+	"""
+	def __init__(self, image, phases, trace=False, asyncio=False, budget=None, record=None):
+		self.image = image
+		self.phases = phases
+		self.trace = trace
+		self.asyncio = asyncio
+		self.budget = budget
+		# the log is created by whoever starts the search; searches append
+		self.recorder = replay.Recorder(record) if record else None
+		self.best = None
+
+	def __len__(self):
+		return math.factorial(len(self.phases))
+
+	def check(self, idx):
+		phases = permutation(self.phases, idx)
+		if self.asyncio:
+			n, stats = run_network(self.image, phases, trace=self.trace)
+			if self.trace:
+				report(stats)
 		else:
-			print(a.value)
-		return pos + cls.length()
-
-
-class OutQueueOperation(TwoIntCode):
-	outq = None
-	@classmethod
-	def opcode(cls):
-		return None
-
-	@classmethod
-	def _eval(cls, data, pos, *args):
-		a = args[0]
-		log.debug("OUTQ: {}({})".format(
-			a.value,
-			"data[{}]".format(a.raw) if a.mode == 0 else "i"
-		))
-		if a.mode == 0:
-			cls.outq.put(data[a.raw])
+			n = run_chain(
+				self.image, phases, trace=self.trace, budget=self.budget, recorder=self.recorder
+			)
+		log.debug("inputs: {}; output: {}".format(phases, n))
+		if n is None or (self.best is not None and n <= self.best):
+			return None
+		self.best = n
+		return [n, "".join(phases)]
+
+	def close(self):
+		if self.recorder is not None:
+			self.recorder.close()
+
+
+def merge(ranges):
+	"""
+	Sorted (start, stop) ranges covering the same indexes as ranges, with
+	overlapping and adjacent ones joined.
+	"""
+	ret = []
+	for start, stop in sorted(map(tuple, ranges)):
+		if ret and start <= ret[-1][1]:
+			ret[-1] = (ret[-1][0], max(ret[-1][1], stop))
 		else:
-			cls.outq.put(a.value)
-		return pos + cls.length()
-
-
-class JumpIfTrueOperation(ThreeIntCode):
-	@classmethod
-	def opcode(cls):
-		return 5
-
-	@classmethod
-	def _eval(cls, data, pos, *args):
-		a, jmp = args
-		log.debug("JUMP IF TRUE: {}({}) != 0 ? IP += {}({})".format(
-			a.value,
-			"data[{}]".format(a.raw) if a.mode == 0 else "i",
-			jmp.value if a.value != 0 else cls.length(),
-			"data[{}]".format(jmp.raw) if jmp.mode == 0 and a.value != 0 else "i"
-		))
-		return jmp.value if a.value != 0 else pos + cls.length()
-
-
-class JumpIfFalseOperation(ThreeIntCode):
-	@classmethod
-	def opcode(cls):
-		return 6
-
-	@classmethod
-	def _eval(cls, data, pos, *args):
-		a, jmp = args
-		log.debug("JUMP IF FALSE: {}({}) == 0 ? IP += {}({})".format(
-			a.value,
-			"data[{}]".format(a.raw) if a.mode == 0 else "i",
-			jmp.value if a.value == 0 else cls.length(),
-			"data[{}]".format(jmp.raw) if jmp.mode == 0 and a.value == 0 else "i"
-		))
-		return jmp.value if a.value == 0 else pos + cls.length()
-
-
-class LessThanOperation(FourIntCode):
-	@classmethod
-	def opcode(cls):
-		return 7
-
-	@classmethod
-	def _eval(cls, data, pos, *args):
-		a, b, loc = args
-		log.debug("LESS THAN: data[{}] = {}({}) < {}({})".format(
-			loc.raw,
-			a.value,
-			"data[{}]".format(a.raw) if a.mode == 0 else "i",
-			b.value,
-			"data[{}]".format(b.raw) if b.mode == 0 else "i"
-		))
-		data[loc.raw] = 1 if a.value < b.value else 0
-		return pos + cls.length()
-
-
-class EqualsOperation(FourIntCode):
-	@classmethod
-	def opcode(cls):
-		return 8
-
-	@classmethod
-	def _eval(cls, data, pos, *args):
-		a, b, loc = args
-		log.debug("EQUALS: data[{}] = {}({}) == {}({})".format(
-			loc.raw,
-			a.value,
-			"data[{}]".format(a.raw) if a.mode == 0 else "i",
-			b.value,
-			"data[{}]".format(b.raw) if b.mode == 0 else "i"
-		))
-		data[loc.raw] = 1 if a.value == b.value else 0
-		return pos + cls.length()
-
-
-class IntCode(object):
-	def __init__(self, state, q=(None, None)):
-		self._state = state
-		self._pos = 0
-		self._ops = None
-		self._inst_buf = deque(maxlen=50)
-		self._state_buf = deque(maxlen=50)
-		self._inqueue = q[0]
-		self._outqueue = q[1]
-
-	@property
-	def output(self):
-		return self._state[0]
-
-	@property
-	def state(self):
-		return self._state
-
-	def nextop(self):
-		if not self._ops:
-			self._ops = dict([(op.opcode(), op) for op in IntCodeOperation.getops()])
-		op = self._state[self._pos] % 100
-		ret = self._ops[op]
-		if self._inqueue is not None and ret is InOperation:
-			ret = InQueueOperation
-		elif self._outqueue is not None and ret is OutOperation:
-			ret = OutQueueOperation
-		return ret
-
-	def step_forward(self):
-		op = self.nextop()
-		inst = self._state[self._pos:self._pos + op.length()]
-		log.debug("IP: {}; INST {}: {}".format(self._pos, len(self._inst_buf), inst))
-		self._inst_buf.append(inst)
-		self._state_buf.append((copy.deepcopy(self._state), self._pos))
-		if self._inqueue is not None:
-			op.inq = self._inqueue
-		if self._outqueue is not None:
-			op.outq = self._outqueue
-		self._pos = op.eval((self._state, self._pos))
-		
-	def step_backward(self):
-		if len(self._state_buf) > 0:
-			inst = self._inst_buf.pop()
-			state, pos = self._state_buf.pop()
-			self._pos = pos
-			self._state = state
-			log.debug("IP: {}; INST {}: {}".format(self._pos, len(self._inst_buf), inst))
-
-	def eval(self):
-		while self._pos < len(self._state):
-			self.step_forward()
-
-	def debug(self):
-		step = True
-		bps = []
+			ret.append((start, stop))
+	return ret
+
+
+def sweep(
+	data, phases, workers=0, trace=False, asyncio=False, budget=None, record=None,
+	checkpointer=None, progress=None, address=None
+):
+	"""
+	Evaluate every permutation of phases and return (highest signal,
+	phases). With workers, or an address for workers started elsewhere
+	(python -m intcode.cluster ADDRESS) to join, permutations are handed out
+	in ranges by an intcode.cluster.Coordinator with that many local
+	workers; results are reduced as they arrive. The rest of the arguments
+	are those of PhaseSearch. With checkpointer, the ranges of permutation
+	indexes done so far and the highest signal are checkpointed as ranges
+	finish; progress is that meta dict from an earlier checkpoint, whose
+	permutations are skipped.
+	"""
+	params = dict(phases=phases, trace=trace, asyncio=asyncio, budget=budget, record=record)
+	count = math.factorial(len(phases))
+	todo = range(count)
+	highest = [0, None]
+	# sorted, disjoint (start, stop) index ranges
+	done = []
+	if progress:
+		done = merge(progress["done"])
+		n, inputs = progress["highest"]
+		highest = [n, tuple(inputs) if inputs is not None else None]
+		todo = []
+		nxt = 0
+		for start, stop in done + [(count, count)]:
+			todo.extend(range(nxt, start))
+			nxt = stop
+		log.info("resuming with {} permutations done".format(count - len(todo)))
+
+	def save():
+		checkpointer.save([], {"done": list(done), "highest": list(highest)})
+
+	def found(idx, value):
+		n, inputs = value
+		if n > highest[0]:
+			log.debug("new highest: {}, inputs: {}".format(n, inputs))
+			highest[:] = [n, tuple(inputs)]
+
+	def finished(start, stop):
+		if checkpointer is not None:
+			done[:] = merge(done + [(start, stop)])
+			if checkpointer.due():
+				save()
+
+	ranges = cluster.split(todo, max(1, min(1000, count // (max(workers, 1) * 4))))
+	if not workers and address is None:
+		search = PhaseSearch(data, **params)
 		try:
-			while self._pos < len(self._state):
-				if step:
-					d = input(">> ")
-					if d.lower() == "n" or len(d) == 0:
-						self.step_forward()
-					elif d.lower() == "b":
-						self.step_backward()
-					elif d.lower() == "c":
-						step = False
-					elif d.lower().startswith("p"):
-						data = d.split(" ")
-						if len(data) == 1:
-							print("state: {}".format(self._state))
-						if len(data) == 2:
-							idx = int(data[1])
-							print("state[{}]: {}".format(idx, self._state[idx]))
-						elif len(data) == 3:
-							sidx = int(data[1])
-							eidx = int(data[2])
-							print("state[{}:{}]: {}".format(sidx, eidx, self._state[sidx:eidx]))
-					elif d.lower().startswith("bp"):
-						data = d.split(" ")
-						if len(data) == 1:
-							print("breakpoints: {}".format(bps))
-						elif len(data) == 2:
-							loc = int(d.split(" ")[1])
-							if loc not in bps:
-								bps.append(loc)
-					else:
-						print("please enter (n)ext, (b)ack, (c)ontinue, (p)rint, or (bp)reakpoint")
-				else:
-					self.step_forward()
-					for bp in bps:
-						if self._pos >= bp:
-							step = True
-							bps.remove(bp)
-		except KeyboardInterrupt:
-			pass
-
-
-def amp_harness(data, q):
-	evaluator = IntCode(data, q)
-	evaluator.eval()
+			for start, stop in ranges:
+				for idx in range(start, stop):
+					value = search.check(idx)
+					if value is not None:
+						found(idx, value)
+				finished(start, stop)
+		finally:
+			search.close()
+	else:
+		with cluster.Coordinator("day7:PhaseSearch", params, data, ranges, address=address) as coordinator:
+			if address is not None:
+				print("listening on {}".format(coordinator.address), file=sys.stderr)
+			coordinator.run(spawn=workers, on_match=found, on_done=finished)
+		log.info("{} workers joined, {} lost".format(coordinator.joined, coordinator.lost))
+	if checkpointer is not None:
+		save()
+	return highest
+
+
+def sweep_batch(data, phases, signal=0):
+	"""
+	sweep() with every permutation as a lane: amplifier slot k of every
+	chain is one lockstep Batch. Returns [highest signal, phases].
+	"""
+	perms = list(itertools.permutations(phases))
+	amps = [batch.Batch.tile(data, len(perms)) for _ in phases]
+	for slot, amp in enumerate(amps):
+		for lane, perm in enumerate(perms):
+			amp.feed(lane, int(perm[slot]))
+	for lane in range(len(perms)):
+		amps[0].feed(lane, signal)
+	last = [None] * len(perms)
+	progress = True
+	while progress:
+		progress = False
+		for idx, amp in enumerate(amps):
+			amp.run()
+			nxt = amps[(idx + 1) % len(amps)]
+			for lane in range(len(perms)):
+				out = amp.drain(lane)
+				if out:
+					progress = True
+					nxt.feed(lane, *out)
+					if idx == len(amps) - 1:
+						last[lane] = out[-1]
+	for idx, amp in enumerate(amps):
+		log.debug("amp {}: {} lockstep steps; {} lanes left lockstep".format(
+			"ABCDEFGHIJ"[idx % 10], amp.steps, len(amp.scalar)
+		))
+	highest = [None, None]
+	for n, perm in zip(last, perms):
+		if n is not None and (highest[0] is None or n > highest[0]):
+			highest[:] = [n, perm]
+	return highest
 
 
 def main():
@@ -389,73 +348,84 @@ def main():
 	parser.add_argument("-s", "--step", default=False, action="store_true")
 	parser.add_argument("-a", "--amp", default=False, action="store_true")
 	parser.add_argument("-e", "--phase", default="01234")
+	parser.add_argument("-c", "--cache", default=False, action="store_true")
+	parser.add_argument("-y", "--asyncio", default=False, action="store_true")
+	parser.add_argument("-b", "--batch", default=False, action="store_true")
+	parser.add_argument("-B", "--budget", type=int, default=None)
+	parser.add_argument("-R", "--record", type=str, default=None)
+	parser.add_argument("-S", "--shared", default=False, action="store_true")
+	parser.add_argument("-C", "--checkpoint", type=str, default=None)
+	parser.add_argument("--interval", type=float, default=1.0)
+	parser.add_argument("--resume", default=False, action="store_true")
+	parser.add_argument("-w", "--workers", type=int, nargs="?", default=0, const=os.cpu_count())
+	parser.add_argument("-L", "--listen", type=str, default=None)
 	args = parser.parse_args()
+	if args.batch and batch.numpy is None:
+		parser.error("--batch needs numpy")
+	if args.resume and not args.checkpoint:
+		parser.error("--resume needs --checkpoint")
+	if args.shared and shared.shared_memory is None:
+		parser.error("--shared needs Python 3.8 or later")
+	if args.cache and any(int(phase) >= 5 for phase in args.phase):
+		# phases 5-9 run the amplifiers in a feedback loop, which the memoized
+		# sweep does not model
+		parser.error("--cache only works with phases 0-4")
 	if args.debug:
 		logging.basicConfig(
 			format="[%(levelname)s %(filename)s:(%(lineno)d)] %(message)s",
 			level=logging.DEBUG,
 			stream=sys.stdout
 		)
-	if args.path:
-		with open(args.path, "r") as f:
-			args.input = f.read()
-	data = list(map(int, args.input.strip().split(",")))
+	data = load(args.path) if args.path else parse(args.input)
 	if args.step:
-		evaluator = IntCode(data)
+		evaluator = IntCode(data, trace=True)
 		logging.basicConfig(
 			format="[%(levelname)s %(filename)s:(%(lineno)d)] %(message)s",
 			level=logging.DEBUG,
 			stream=sys.stdout
 		)
 		evaluator.debug()
+	elif args.amp and args.cache:
+		highest, cache = sweep_cached(data, args.phase, trace=args.debug)
+		naive = len(args.phase) * len(list(itertools.permutations(args.phase)))
+		lookups = cache.hits + cache.misses
+		print("cache hit rate: {:.1%} ({}/{}); VM runs: {}; saved: {}".format(
+			cache.hits / lookups, cache.hits, lookups, cache.misses, naive - cache.misses
+		), file=sys.stderr)
+		print("highest: {}, inputs: {}".format(highest[0], highest[1]))
+	elif args.amp and args.batch:
+		highest = sweep_batch(data, args.phase)
+		print("highest: {}, inputs: {}".format(highest[0], highest[1]))
 	elif args.amp:
-		highest = [0, None]
-		for inputs in itertools.permutations(args.phase, 5):
-			n = 0
-			log.debug(inputs)
-			amps = []
-			for l in "ABCDE":
-				inq = multiprocessing.Queue()
-				outq = multiprocessing.Queue()
-				p = multiprocessing.Process(
-					name="Amp {}".format(l),
-					target=amp_harness,
-					args=(copy.deepcopy(data), (inq, outq))
-				)
-				amps.append({ "proc": p, "inq": inq, "outq": outq })
-				p.start()
-			# initial run for inputting phase settings
-			for idx, i in enumerate(inputs):
-				log.debug("phase setting: {}; input signal: {}".format(i, n))
-				amps[idx]["inq"].put(i)
-				amps[idx]["inq"].put(n)
-				n = amps[idx]["outq"].get()
-				log.debug("output: {}".format(n))
-			stop = False
-			while not stop:
-				for amp in amps:
-					if not amp["proc"].is_alive():
-						stop = True
-						break
-					log.debug("{} receives input signal {}".format(amp["proc"].name, n))
-					amp["inq"].put(n, False)
-					time.sleep(0.25)
-					try:
-						n = amp["outq"].get(1)
-						log.debug("{} output: {}".format(amp["proc"].name, n))
-					except queue.Empty:
-						stop = True
-						break
-			if n > highest[0]:
-				log.debug("new highest: {}, inputs: {}".format(n, inputs))
-				highest = [n, inputs]
+		if (args.budget is not None or args.record) and args.asyncio:
+			parser.error("--budget and --record do not work with --asyncio")
+		# write the log header before any worker opens the log
+		recorder = replay.Recorder(args.record) if args.record else None
+		progress = None
+		if args.resume and os.path.exists(args.checkpoint):
+			progress = checkpoint.load(args.checkpoint)[1]
+		checkpointer = checkpoint.Checkpointer(args.checkpoint, args.interval) if args.checkpoint else None
+		# workers map the one copy of the program instead of each getting one
+		image = shared.SharedImage(data) if args.shared else None
+		try:
+			highest = sweep(
+				image if image is not None else data, args.phase, workers=args.workers,
+				trace=args.debug, asyncio=args.asyncio, budget=args.budget,
+				record=args.record, checkpointer=checkpointer, progress=progress, address=args.listen
+			)
+		finally:
+			if recorder is not None:
+				recorder.close()
+			if checkpointer is not None:
+				checkpointer.close()
+			if image is not None:
+				image.unlink()
 		print("highest: {}, inputs: {}".format(highest[0], highest[1]))
 	else:
-		evaluator = IntCode(data)
+		evaluator = IntCode(data, trace=args.debug)
 		evaluator.eval()
 	return 0
 
 
 if __name__ == "__main__":
-	import sys
 	sys.exit(main())
@@ -0,0 +1,26 @@
+"""
+Shared IntCode engine.
+"""
+
+
+from .engine import (
+	IntCode,
+	IntCodeError,
+	Interrupted,
+	BudgetExceeded,
+	DeadlineExceeded,
+	Cancelled,
+	DECODE,
+	LENGTHS,
+	NAMES,
+	NEEDS_INPUT,
+	OUTPUT,
+	HALTED,
+	build,
+	decode,
+	log_trace,
+	parse,
+	load,
+)
+from .snapshot import Snapshot, PAGE_SIZE
+from .tracking import Bitset, Tracker
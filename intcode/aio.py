@@ -0,0 +1,151 @@
+"""
+asyncio runtime for networks of IntCode machines.
+
+Every machine is a task that runs until it blocks on input and then awaits
+its asyncio.Queue; outputs are fanned out to the queues of the machines it
+is linked to. The network stops when every machine has halted or when all
+of the remaining ones are waiting on empty queues.
+"""
+
+
+import time
+import asyncio
+import logging
+
+from .engine import IntCode, NEEDS_INPUT, HALTED
+
+
+log = logging.getLogger(__name__)
+
+
+class MachineStats(object):
+	__slots__ = ("steps", "waiting", "outputs")
+
+	def __init__(self):
+		self.steps = 0
+		self.waiting = 0.0
+		self.outputs = []
+
+	def __repr__(self):
+		return "MachineStats(steps={}, waiting={:.6f}s, outputs={})".format(
+			self.steps, self.waiting, len(self.outputs)
+		)
+
+
+class Network(object):
+	"""
+	Declares machines and the links between them, then runs them all in one
+	event loop with Network.run().
+	"""
+	def __init__(self):
+		self._machines = {}
+		self._links = {}
+		self._inputs = {}
+
+	def add(self, name, program, inputs=(), trace=False, compact=False):
+		self._machines[name] = IntCode(list(program), trace=trace, count=True, compact=compact)
+		self._links[name] = []
+		self._inputs[name] = list(inputs)
+		return self._machines[name]
+
+	def machine(self, name):
+		return self._machines[name]
+
+	def connect(self, src, dst):
+		self._links[src].append(dst)
+
+	def chain(self, names):
+		for src, dst in zip(names, names[1:]):
+			self.connect(src, dst)
+
+	def ring(self, names):
+		self.chain(names)
+		self.connect(names[-1], names[0])
+
+	def mesh(self, names):
+		for src in names:
+			for dst in names:
+				if src != dst:
+					self.connect(src, dst)
+
+	def feed(self, name, *values):
+		self._inputs[name].extend(values)
+
+	def run(self):
+		"""
+		Run the network to completion; returns {name: MachineStats}.
+		"""
+		return asyncio.run(self.run_async())
+
+	async def run_async(self):
+		queues = {name: asyncio.Queue() for name in self._machines}
+		stats = {name: MachineStats() for name in self._machines}
+		for name, values in self._inputs.items():
+			for value in values:
+				queues[name].put_nowait(value)
+		# machines not currently blocked on an input; once it drops to zero
+		# with nothing queued, the network is deadlocked and is shut down
+		active = [len(self._machines)]
+		idle = asyncio.Event()
+		# values sent to a machine that has halted are never read
+		halted = set()
+
+		def blocked():
+			active[0] -= 1
+			if active[0] == 0 and all(q.empty() for name, q in queues.items() if name not in halted):
+				idle.set()
+
+		async def drive(name):
+			machine = self._machines[name]
+			queue = queues[name]
+			stat = stats[name]
+			try:
+				while True:
+					while not queue.empty():
+						machine.feed(queue.get_nowait())
+					status = machine.run()
+					for value in machine.drain():
+						stat.outputs.append(value)
+						for dst in self._links[name]:
+							queues[dst].put_nowait(value)
+					if status == HALTED:
+						halted.add(name)
+						break
+					if status == NEEDS_INPUT:
+						start = time.perf_counter()
+						blocked()
+						try:
+							value = await queue.get()
+						finally:
+							stat.waiting += time.perf_counter() - start
+						active[0] += 1
+						machine.feed(value)
+					await asyncio.sleep(0)
+			finally:
+				stat.steps = machine.steps
+			blocked()
+
+		tasks = [asyncio.ensure_future(drive(name)) for name in self._machines]
+		done = asyncio.ensure_future(asyncio.gather(*tasks))
+		stop = asyncio.ensure_future(idle.wait())
+		try:
+			await asyncio.wait((done, stop), return_when=asyncio.FIRST_COMPLETED)
+			if done.done():
+				done.result()
+			else:
+				log.debug("network deadlocked; cancelling {} machines".format(
+					sum(1 for t in tasks if not t.done())
+				))
+		finally:
+			stop.cancel()
+			for task in tasks:
+				task.cancel()
+			await asyncio.gather(done, *tasks, return_exceptions=True)
+		return stats
+
+
+def report(stats, stream=None):
+	for name, stat in sorted(stats.items(), key=lambda item: str(item[0])):
+		print("{:>8}: {:>10,} instructions; {:.6f}s waiting; {} outputs".format(
+			str(name), stat.steps, stat.waiting, len(stat.outputs)
+		), file=stream)
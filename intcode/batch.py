@@ -0,0 +1,272 @@
+"""
+Lockstep evaluation of many copies of one IntCode program with NumPy.
+
+Every lane is a machine whose memory is a row of one 2-D int64 array. Lanes
+are kept in groups that share an IP, and each group executes one
+instruction for all of its lanes with a handful of array operations. When
+a jump, an instruction word or missing input splits a group, each part
+carries on as its own group. Parts smaller than min_lanes, and any lane
+whose next step the vector code cannot express exactly (out-of-range
+addresses, values that may leave 64 bits, invalid instructions), continue
+on an ordinary IntCode machine.
+
+NumPy is in the Pipfile, but only this module needs it; Batch raises
+ImportError without it.
+"""
+
+
+import logging
+from collections import deque
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+from .engine import (
+	IntCode,
+	IntCodeError,
+	DECODE,
+	LENGTHS,
+	IMMEDIATE,
+	ADD,
+	MUL,
+	IN,
+	OUT,
+	JUMP_IF_TRUE,
+	JUMP_IF_FALSE,
+	LESS_THAN,
+	EQUALS,
+	NEEDS_INPUT,
+	HALTED,
+)
+
+
+log = logging.getLogger(__name__)
+
+
+MIN_LANES = 4
+# operands at or above these magnitudes may overflow int64
+_ADD_LIMIT = 1 << 62
+_MUL_LIMIT = 1 << 31
+
+
+class _Scalar(Exception):
+	"""
+	Raised before an instruction changes anything when some lanes (all of
+	them if bad is None) need the scalar engine to run it.
+	"""
+	def __init__(self, bad=None):
+		super().__init__()
+		self.bad = bad
+
+
+class Batch(object):
+	"""
+	N machines running the same program from the given images (all the same
+	length). Feed, run and drain them like IntCode, one lane at a time.
+	"""
+	def __init__(self, images, min_lanes=MIN_LANES):
+		if numpy is None:
+			raise ImportError("intcode.batch needs numpy")
+		self._mem = numpy.array(images, dtype=numpy.int64)
+		if self._mem.ndim != 2:
+			raise ValueError("Batch images must all have the same length")
+		self._min_lanes = min_lanes
+		self.inputs = [deque() for _ in range(len(self._mem))]
+		self.outputs = [deque() for _ in range(len(self._mem))]
+		self._status = [None] * len(self._mem)
+		# (lanes, ip) of the groups to run next
+		self._groups = [(numpy.arange(len(self._mem)), 0)]
+		self._machines = {}
+		# lane -> IntCodeError for lanes that failed; their status stays None
+		self.errors = {}
+		# instructions executed by groups, and lane-instructions they covered
+		self.steps = 0
+		self.lane_steps = 0
+
+	@classmethod
+	def tile(cls, image, lanes, **kwargs):
+		"""
+		Batch of lanes copies of one image.
+		"""
+		if numpy is None:
+			raise ImportError("intcode.batch needs numpy")
+		return cls(numpy.tile(numpy.array(image, dtype=numpy.int64), (lanes, 1)), **kwargs)
+
+	def __len__(self):
+		return len(self._mem)
+
+	def poke(self, addr, values):
+		"""
+		Set addr in every lane, values holding one value per lane. Only valid
+		before the first run().
+		"""
+		self._mem[:, addr] = values
+
+	def peek(self, addr):
+		"""
+		Value at addr in every lane.
+		"""
+		ret = self._mem[:, addr].tolist()
+		for lane, machine in self._machines.items():
+			ret[lane] = machine.state[addr]
+		return ret
+
+	def feed(self, lane, *values):
+		self.inputs[lane].extend(values)
+
+	def drain(self, lane):
+		ret = list(self.outputs[lane])
+		self.outputs[lane].clear()
+		return ret
+
+	def status(self, lane):
+		return self._status[lane]
+
+	def memory(self, lane):
+		if lane in self._machines:
+			return self._machines[lane].state
+		return self._mem[lane].tolist()
+
+	def output(self, lane):
+		return self.memory(lane)[0]
+
+	@property
+	def scalar(self):
+		"""
+		Lanes that have left lockstep for an IntCode machine.
+		"""
+		return sorted(self._machines)
+
+	def _demote(self, lanes, ip):
+		for lane in lanes.tolist():
+			machine = IntCode(self._mem[lane].tolist())
+			machine._pos = ip
+			machine.inputs = self.inputs[lane]
+			machine.outputs = self.outputs[lane]
+			self._machines[lane] = machine
+		log.debug("{} lanes left lockstep at {}".format(len(lanes), ip))
+
+	def _queue(self, lanes, ip, pending):
+		if len(lanes) >= self._min_lanes:
+			pending.append((lanes, ip))
+		else:
+			self._demote(lanes, ip)
+
+	def run(self):
+		"""
+		Run every lane until it halts or needs input; returns the status of
+		each lane.
+		"""
+		pending = self._groups
+		self._groups = []
+		while pending:
+			lanes, ip = pending.pop()
+			self._run_group(lanes, ip, pending)
+		for lane, machine in self._machines.items():
+			if lane in self.errors:
+				continue
+			try:
+				self._status[lane] = machine.run()
+			except IntCodeError as e:
+				self._status[lane] = None
+				self.errors[lane] = e
+		return list(self._status)
+
+	def _run_group(self, lanes, ip, pending):
+		mem = self._mem
+		size = mem.shape[1]
+		while True:
+			if ip >= size:
+				for lane in lanes.tolist():
+					self._status[lane] = HALTED
+				return
+			words = mem[lanes, ip]
+			if (words != words[0]).any():
+				# lanes have rewritten this instruction differently
+				for word in numpy.unique(words):
+					self._queue(lanes[words == word], ip, pending)
+				return
+			entry = DECODE.get(int(words[0]))
+			try:
+				if ip < 0 or entry is None or ip + LENGTHS[entry[0]] > size:
+					raise _Scalar()
+				nxt = self._step(lanes, ip, entry, pending)
+			except _Scalar as e:
+				if e.bad is None or e.bad.all():
+					self._demote(lanes, ip)
+				else:
+					self._demote(lanes[e.bad], ip)
+					self._queue(lanes[~e.bad], ip, pending)
+				return
+			if nxt is None:
+				return
+			self.steps += 1
+			self.lane_steps += len(lanes)
+			if (nxt != nxt[0]).any():
+				for target in numpy.unique(nxt):
+					self._queue(lanes[nxt == target], int(target), pending)
+				return
+			ip = int(nxt[0])
+
+	def _load(self, lanes, addr):
+		bad = (addr < 0) | (addr >= self._mem.shape[1])
+		if bad.any():
+			raise _Scalar(bad)
+		return self._mem[lanes, addr]
+
+	def _step(self, lanes, ip, entry, pending):
+		"""
+		Execute the instruction at ip for every lane. Returns the next IP of
+		each lane, or None if the group stopped.
+		"""
+		mem = self._mem
+		op, f, s = entry
+		params = [mem[lanes, ip + i] for i in range(1, LENGTHS[op])]
+		nxt = numpy.full(len(lanes), ip + LENGTHS[op])
+		if op in (ADD, MUL, LESS_THAN, EQUALS):
+			a = params[0] if f == IMMEDIATE else self._load(lanes, params[0])
+			b = params[1] if s == IMMEDIATE else self._load(lanes, params[1])
+			self._load(lanes, params[2])
+			if op in (ADD, MUL):
+				limit = _ADD_LIMIT if op == ADD else _MUL_LIMIT
+				bad = (numpy.abs(a) >= limit) | (numpy.abs(b) >= limit)
+				if bad.any():
+					raise _Scalar(bad)
+				value = a + b if op == ADD else a * b
+			elif op == LESS_THAN:
+				value = (a < b).astype(numpy.int64)
+			else:
+				value = (a == b).astype(numpy.int64)
+			mem[lanes, params[2]] = value
+			return nxt
+		if op in (JUMP_IF_TRUE, JUMP_IF_FALSE):
+			a = params[0] if f == IMMEDIATE else self._load(lanes, params[0])
+			target = params[1] if s == IMMEDIATE else self._load(lanes, params[1])
+			taken = a != 0 if op == JUMP_IF_TRUE else a == 0
+			return numpy.where(taken, target, nxt)
+		if op == IN:
+			self._load(lanes, params[0])
+			ready = numpy.array([bool(self.inputs[lane]) for lane in lanes.tolist()])
+			if not ready.all():
+				for lane in lanes[~ready].tolist():
+					self._status[lane] = NEEDS_INPUT
+				# resumed by the next run()
+				self._groups.append((lanes[~ready], ip))
+				if ready.any():
+					self._queue(lanes[ready], ip, pending)
+				return None
+			bad = numpy.array([abs(self.inputs[lane][0]) >= _ADD_LIMIT for lane in lanes.tolist()])
+			if bad.any():
+				raise _Scalar(bad)
+			mem[lanes, params[0]] = [self.inputs[lane].popleft() for lane in lanes.tolist()]
+			return nxt
+		if op == OUT:
+			a = params[0] if f == IMMEDIATE else self._load(lanes, params[0])
+			for lane, value in zip(lanes.tolist(), a.tolist()):
+				self.outputs[lane].append(value)
+			return nxt
+		for lane in lanes.tolist():
+			self._status[lane] = HALTED
+		return None
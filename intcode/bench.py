@@ -0,0 +1,326 @@
+"""
+IntCode engine benchmarks.
+
+python -m intcode.bench
+"""
+
+
+import sys
+import time
+import logging
+import tracemalloc
+
+from .engine import IntCode, load, parse, log_trace
+
+
+log = logging.getLogger(__name__)
+
+
+def countdown(n):
+	# loops n times through add / less than / add / jump; outputs n // 2
+	return [
+		1001, 30, -1, 30,
+		7, 30, 32, 33,
+		1, 31, 33, 31,
+		1005, 30, 0,
+		4, 31,
+		99,
+	] + [0] * 12 + [n, 0, n // 2, 0]
+
+
+def relay(limit):
+	# reads x, outputs x + 1 and halts once that reaches limit
+	return [
+		3, 100,
+		1001, 100, 1, 100,
+		4, 100,
+		1007, 100, limit, 101,
+		1005, 101, 0,
+		99,
+	] + [0] * 86
+
+
+def timeit(fn, repeat=3):
+	best = None
+	for _ in range(repeat):
+		start = time.perf_counter()
+		fn()
+		elapsed = time.perf_counter() - start
+		if best is None or elapsed < best:
+			best = elapsed
+	return best
+
+
+def report(name, elapsed, count, unit="inst"):
+	print("{:<40} {:>10.4f}s {:>14,.0f} {}/s".format(name, elapsed, count / elapsed, unit))
+
+
+def bench_eval(n):
+	program = countdown(n)
+	out = []
+	elapsed = timeit(lambda: IntCode(list(program), write=out.append).eval())
+	report("eval (countdown {})".format(n), elapsed, 4 * n)
+	elapsed = timeit(lambda: IntCode(list(program), write=out.append, profile=True).eval())
+	report("eval, profiled (countdown {})".format(n), elapsed, 4 * n)
+
+
+def bench_trace(path, runs):
+	program = load(path)
+
+	def run(**kwargs):
+		for _ in range(runs):
+			IntCode(list(program), read=lambda: 5, write=lambda v: None, **kwargs).eval()
+
+	steps = []
+	IntCode(list(program), read=lambda: 5, write=lambda v: None, trace=True,
+		tracer=lambda *args: steps.append(args)).eval()
+	count = len(steps) * runs
+	report("{} trace off".format(path), timeit(run), count)
+	report("{} trace on, no-op tracer".format(path),
+		timeit(lambda: run(trace=True, tracer=lambda *args: None)), count)
+	report("{} trace on, logging disabled".format(path),
+		timeit(lambda: run(trace=True, tracer=log_trace)), count)
+
+
+def bench_step(n):
+	# the countdown loop single-stepped, decoding through the per-IP cache
+	# and with it turned off
+	program = countdown(n)
+
+	def step(cached):
+		machine = IntCode(list(program), write=lambda v: None)
+		if not cached:
+			machine.decoded = None
+		while not machine.halted:
+			machine.step_forward()
+		return machine
+
+	report("step_forward, decode every step", timeit(lambda: step(False)), 4 * n)
+	report("step_forward, DecodeCache", timeit(lambda: step(True)), 4 * n)
+	print("{:<40} {!r}".format("", step(True).decoded))
+
+
+def _allocated(fn):
+	tracemalloc.start()
+	try:
+		keep = fn()
+		size = tracemalloc.get_traced_memory()[0]
+	finally:
+		tracemalloc.stop()
+	del keep
+	return size
+
+
+def bench_fork(size, forks):
+	# a countdown loop followed by a large data segment; each branch only
+	# touches the loop's few variables
+	program = countdown(100)
+	program += [0] * (size - len(program))
+	machine = IntCode(list(program), write=lambda v: None)
+	machine.eval()
+	# the first fork moves the parent onto shared pages too
+	machine.fork()
+
+	def copies():
+		ret = [IntCode(list(machine.state)) for _ in range(forks)]
+		for idx, child in enumerate(ret):
+			child.state[30] = idx
+		return ret
+
+	def children():
+		ret = [machine.fork() for _ in range(forks)]
+		for idx, child in enumerate(ret):
+			child.state[30] = idx
+		return ret
+
+	report("list copy + IntCode ({} words)".format(size), timeit(copies), forks, "fork")
+	report("fork ({} words)".format(size), timeit(children), forks, "fork")
+	full = _allocated(copies)
+	paged = _allocated(children)
+	print("{:<40} {:>10,} bytes/branch".format("list copy memory (one word written)", full // forks))
+	print("{:<40} {:>10,} bytes/branch".format("fork memory (one word written)", paged // forks))
+
+
+def bench_memory(machines, day7):
+	with open(day7, "r") as f:
+		text = f.read()
+	# every machine parses its own image, as the day scripts do
+	for compact in (False, True):
+		size = _allocated(lambda: [IntCode(parse(text), compact=compact) for _ in range(machines)])
+		print("{:<40} {:>10,} bytes/machine".format(
+			"{} memory".format("array('q')" if compact else "list"), size // machines
+		))
+
+
+def bench_load(words):
+	import os
+	import tempfile
+	from . import image
+	program = countdown(words)
+	program += [0] * (words - len(program))
+	with tempfile.TemporaryDirectory() as tmp:
+		text = os.path.join(tmp, "program.txt")
+		binary = os.path.join(tmp, "program.icb")
+		with open(text, "w") as f:
+			f.write(",".join(map(str, program)))
+		image.write(binary, program)
+
+		def mapped():
+			with load(binary) as img:
+				return img[len(img) - 1]
+
+		report("load text ({} words)".format(words), timeit(lambda: load(text)), 1, "load")
+		report("load image ({} words)".format(words), timeit(mapped), 1, "load")
+		with load(binary) as img:
+			report("IntCode from image ({} words)".format(words), timeit(lambda: IntCode(img)), 1, "machine")
+
+
+def bench_network(machines, laps):
+	from .aio import Network
+	program = relay(machines * laps)
+	names = list(range(machines))
+	stats = {}
+
+	def run():
+		net = Network()
+		for name in names:
+			net.add(name, program)
+		net.feed(0, 0)
+		net.ring(names)
+		stats.update(net.run())
+
+	elapsed = timeit(run, 1)
+	steps = sum(stat.steps for stat in stats.values())
+	waiting = sum(stat.waiting for stat in stats.values())
+	report("asyncio ring ({} machines)".format(machines), elapsed, steps)
+	print("{:<40} {:>10,} inst/machine {:>10.6f}s waiting/machine".format(
+		"", steps // machines, waiting / machines
+	))
+
+
+def bench_checkpoint(n):
+	import os
+	import tempfile
+	from .checkpoint import Checkpointer
+	program = countdown(n)
+	with tempfile.TemporaryDirectory() as tmp:
+		path = os.path.join(tmp, "countdown.icp")
+
+		def run(interval):
+			machine = IntCode(list(program), write=lambda v: None)
+			if interval is not None:
+				machine.checkpointer = Checkpointer(path, interval)
+			machine.eval()
+			if interval is not None:
+				machine.checkpointer.close()
+
+		report("eval (countdown {})".format(n), timeit(lambda: run(None)), 4 * n)
+		report("eval, checkpoint every 0.1s", timeit(lambda: run(0.1)), 4 * n)
+
+
+_worker_image = None
+
+
+def _started(image):
+	global _worker_image
+	_worker_image = image
+
+
+def _private_rss(_):
+	from .engine import BudgetExceeded
+	from .shared import private
+	machine = IntCode(private(_worker_image))
+	try:
+		machine.run(budget=10000)
+	except BudgetExceeded:
+		pass
+	# resident memory of this worker's own, not counting shared pages
+	# (Linux only)
+	try:
+		with open("/proc/self/status") as f:
+			for line in f:
+				if line.startswith("RssAnon:"):
+					return int(line.split()[1])
+	except OSError:
+		pass
+	return 0
+
+
+def bench_shared(words, workers, n):
+	import multiprocessing
+	from . import shared
+	program = countdown(words)
+	# distinct large words, which cost a list an int object each
+	program += [(1 << 40) + idx for idx in range(words - len(program))]
+	ctx = multiprocessing.get_context("spawn")
+	# doubling worker counts: a shared image should keep both the start-up
+	# time and the private memory of each worker flat
+	counts = sorted(set([2 ** k for k in range(workers.bit_length()) if 2 ** k <= workers] + [workers]))
+	with shared.SharedImage(program) as image:
+		for name, data in (("list", program), ("shared", image)):
+			for count in counts:
+				start = time.perf_counter()
+				with ctx.Pool(count, initializer=_started, initargs=(data,)) as pool:
+					rss = pool.map(_private_rss, range(count), 1)
+				elapsed = time.perf_counter() - start
+				print("{:<40} {:>10.4f}s/worker {:>10,} KiB private/worker".format(
+					"spawn {} {} image ({} words)".format(count, name, words), elapsed / count, max(rss)
+				))
+	# what the overlay costs a machine per instruction
+	program = countdown(n)
+	with shared.SharedImage(program) as image:
+		for name, memory in (("list", lambda: list(program)), ("shared", lambda: shared.private(image))):
+			elapsed = timeit(lambda: IntCode(memory(), write=lambda v: None).eval())
+			report("eval on {} image (countdown {})".format(name, n), elapsed, 4 * n)
+
+
+def bench_fuse(n, path):
+	from . import fusion
+	# countdown with its compare moved next to the jump on its flag
+	program = [
+		1001, 20, 1, 20,
+		1007, 20, n, 21,
+		1005, 21, 0,
+		4, 20,
+		99,
+	] + [0] * 6 + [0, 0]
+	for fuse, elide in ((False, False), (True, False), (True, True)):
+		elapsed = timeit(lambda: IntCode(list(program), write=lambda v: None, fuse=fuse, elide=elide).eval())
+		report("eval, fuse={}, elide={} (cmp/jump loop {})".format(fuse, elide, n), elapsed, 3 * n)
+	program = load(path)
+	_, steps, before = fusion.dispatches(program, [5], False)
+	_, _, after = fusion.dispatches(program, [5], True)
+	print("{:<40} {:>10,} inst {:>10,} -> {:,} dispatches".format(
+		"{} fused (input 5)".format(path), steps, before, after
+	))
+
+
+def main():
+	from argparse import ArgumentParser
+	parser = ArgumentParser()
+	parser.add_argument("-n", "--count", type=int, default=200000)
+	parser.add_argument("-r", "--runs", type=int, default=2000)
+	parser.add_argument("--day5", type=str, default="day5.txt")
+	parser.add_argument("--day7", type=str, default="day7.txt")
+	parser.add_argument("--size", type=int, default=10000)
+	parser.add_argument("--forks", type=int, default=200)
+	parser.add_argument("--machines", type=int, default=500)
+	parser.add_argument("--laps", type=int, default=20)
+	parser.add_argument("--words", type=int, default=1000000)
+	parser.add_argument("--workers", type=int, default=4)
+	args = parser.parse_args()
+	bench_eval(args.count)
+	bench_trace(args.day5, args.runs)
+	bench_step(args.count // 4)
+	bench_fork(args.size, args.forks)
+	bench_memory(args.machines, args.day7)
+	bench_load(args.words)
+	bench_shared(args.words, args.workers, args.count)
+	bench_network(args.machines, args.laps)
+	bench_fuse(args.count, args.day5)
+	bench_checkpoint(args.count)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
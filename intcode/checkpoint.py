@@ -0,0 +1,281 @@
+"""
+On-disk checkpoints of IntCode machines.
+
+A checkpoint holds any number of machines (memory, IP, status, instruction
+count and pending inputs and outputs) and a small JSON dict for whatever
+drives them. It is a 12 byte header followed by a zlib stream; int lists
+inside are packed as int64 and fall back to decimal text when a value does
+not fit.
+
+A Checkpointer copies the machines on the caller's thread, which is the
+only cost to the run, and encodes, compresses and writes them on a
+background thread. Files are replaced atomically, so the latest complete
+checkpoint survives a crash at any point. A machine with a checkpointer
+attached is ticked every CHECK_INTERVAL instructions, through the same
+check as run limits, and saves itself once interval seconds have passed.
+"""
+
+
+import os
+import sys
+import json
+import zlib
+import struct
+import threading
+from array import array
+from time import perf_counter
+
+from .engine import IntCode, NEEDS_INPUT, OUTPUT, HALTED
+from .memory import SparseMemory
+
+
+MAGIC = b"ICCP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHI")
+STATE = struct.Struct("<qQB")
+
+STATUSES = (None, NEEDS_INPUT, OUTPUT, HALTED)
+# int list encodings
+PACKED = 0
+TEXT = 1
+
+
+class CheckpointError(ValueError):
+	pass
+
+
+def _put_ints(out, values):
+	try:
+		words = array("q", values)
+	except OverflowError:
+		raw = ",".join(map(str, values)).encode("ascii")
+		out += struct.pack("<BQ", TEXT, len(raw))
+		out += raw
+		return
+	if sys.byteorder != "little":
+		words.byteswap()
+	out += struct.pack("<BQ", PACKED, len(words))
+	out += words.tobytes()
+
+
+def _get_ints(raw, pos):
+	kind, count = struct.unpack_from("<BQ", raw, pos)
+	pos += 9
+	if kind == TEXT:
+		text = raw[pos:pos + count].decode("ascii")
+		return [int(x) for x in text.split(",")] if text else [], pos + count
+	words = array("q")
+	words.frombytes(raw[pos:pos + 8 * count])
+	if sys.byteorder != "little":
+		words.byteswap()
+	return words.tolist(), pos + 8 * count
+
+
+class Saved(object):
+	"""
+	One machine as captured in a checkpoint. memory is a list, or (base,
+	size, {page: words}) for sparse memory.
+	"""
+	__slots__ = ("memory", "ip", "steps", "status", "inputs", "outputs")
+
+	def __init__(self, memory, ip, steps, status, inputs, outputs):
+		self.memory = memory
+		self.ip = ip
+		self.steps = steps
+		self.status = status
+		self.inputs = inputs
+		self.outputs = outputs
+
+	@classmethod
+	def capture(cls, machine):
+		state = machine.state
+		if isinstance(state, SparseMemory):
+			mem = (list(state.base), state.size, {key: list(page) for key, page in state.pages.items()})
+		else:
+			mem = list(state)
+		return cls(
+			mem, machine.ip, machine.steps, machine.status, list(machine.inputs), list(machine.outputs)
+		)
+
+	def restore(self, read=None, write=None, **kwargs):
+		"""
+		IntCode machine in this state; kwargs are as for IntCode (use grow
+		for sparse memory).
+		"""
+		if isinstance(self.memory, tuple):
+			base, size, pages = self.memory
+			ret = IntCode(list(base), read, write, **kwargs)
+			ret._state = SparseMemory(ret.state, size)
+			for key, words in pages.items():
+				ret._state.pages[key] = array("q", words) if kwargs.get("compact") else list(words)
+		else:
+			ret = IntCode(list(self.memory), read, write, **kwargs)
+		ret._pos = self.ip
+		ret.steps = self.steps
+		ret._status = self.status
+		ret.feed(*self.inputs)
+		ret.outputs.extend(self.outputs)
+		return ret
+
+
+def encode(saved, meta=None):
+	body = bytearray()
+	raw = json.dumps(meta or {}).encode("utf-8")
+	body += struct.pack("<I", len(raw))
+	body += raw
+	for item in saved:
+		body += STATE.pack(item.ip, item.steps, STATUSES.index(item.status))
+		if isinstance(item.memory, tuple):
+			base, size, pages = item.memory
+			body += struct.pack("<BQI", 1, size, len(pages))
+			_put_ints(body, base)
+			for key in sorted(pages):
+				body += struct.pack("<Q", key)
+				_put_ints(body, pages[key])
+		else:
+			body += struct.pack("<B", 0)
+			_put_ints(body, item.memory)
+		_put_ints(body, item.inputs)
+		_put_ints(body, item.outputs)
+	return HEADER.pack(MAGIC, VERSION, 0, len(saved)) + zlib.compress(bytes(body))
+
+
+def decode(raw, path="checkpoint"):
+	"""
+	([Saved], meta) from the bytes of a checkpoint.
+	"""
+	if len(raw) < HEADER.size:
+		raise CheckpointError("{}: not an IntCode checkpoint".format(path))
+	magic, version, _, count = HEADER.unpack_from(raw)
+	if magic != MAGIC:
+		raise CheckpointError("{}: not an IntCode checkpoint".format(path))
+	if version != VERSION:
+		raise CheckpointError("{}: unsupported checkpoint version {}".format(path, version))
+	try:
+		body = zlib.decompress(raw[HEADER.size:])
+		size, = struct.unpack_from("<I", body)
+		meta = json.loads(body[4:4 + size].decode("utf-8"))
+		pos = 4 + size
+		saved = []
+		for _ in range(count):
+			ip, steps, status = STATE.unpack_from(body, pos)
+			pos += STATE.size
+			sparse, = struct.unpack_from("<B", body, pos)
+			pos += 1
+			if sparse:
+				total, npages = struct.unpack_from("<QI", body, pos)
+				pos += 12
+				base, pos = _get_ints(body, pos)
+				pages = {}
+				for _ in range(npages):
+					key, = struct.unpack_from("<Q", body, pos)
+					pages[key], pos = _get_ints(body, pos + 8)
+				mem = (base, total, pages)
+			else:
+				mem, pos = _get_ints(body, pos)
+			inputs, pos = _get_ints(body, pos)
+			outputs, pos = _get_ints(body, pos)
+			saved.append(Saved(mem, ip, steps, STATUSES[status], inputs, outputs))
+	except (zlib.error, struct.error, ValueError) as e:
+		raise CheckpointError("{}: corrupt checkpoint: {}".format(path, e))
+	return saved, meta
+
+
+def load(path):
+	"""
+	([Saved], meta) from the checkpoint at path.
+	"""
+	with open(path, "rb") as f:
+		return decode(f.read(), path)
+
+
+def write(path, data):
+	tmp = "{}.tmp".format(path)
+	with open(tmp, "wb") as f:
+		f.write(data)
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(tmp, path)
+
+
+class Checkpointer(object):
+	"""
+	Background writer of checkpoints to path. save() returns at once; if
+	checkpoints come faster than they can be written, only the latest is.
+	"""
+	def __init__(self, path, interval=1.0):
+		self.path = path
+		self.interval = interval
+		# driver state saved with every checkpoint from tick()
+		self.meta = {}
+		self.written = 0
+		self.error = None
+		self._last = perf_counter()
+		self._pending = None
+		# sequence numbers of the last checkpoint saved and of the last one
+		# the writer finished with
+		self._saved = 0
+		self._finished = 0
+		self._closed = False
+		self._cond = threading.Condition()
+		self._thread = threading.Thread(target=self._writer, name="checkpoint", daemon=True)
+		self._thread.start()
+
+	def _writer(self):
+		while True:
+			with self._cond:
+				while self._pending is None and not self._closed:
+					self._cond.wait()
+				if self._pending is None:
+					return
+				seq, saved, meta = self._pending
+				self._pending = None
+			try:
+				write(self.path, encode(saved, meta))
+				self.written += 1
+			except Exception as e:
+				self.error = e
+			with self._cond:
+				self._finished = seq
+				self._cond.notify_all()
+
+	def due(self):
+		return perf_counter() - self._last >= self.interval
+
+	def save(self, machines, meta=None):
+		"""
+		Capture machines (and meta, a JSON-able dict) now and write them in
+		the background.
+		"""
+		saved = [Saved.capture(machine) for machine in machines]
+		self._last = perf_counter()
+		with self._cond:
+			self._saved += 1
+			self._pending = (self._saved, saved, dict(meta if meta is not None else self.meta))
+			self._cond.notify_all()
+
+	def tick(self, machine):
+		if perf_counter() - self._last >= self.interval:
+			self.save([machine])
+
+	def wait(self):
+		"""
+		Block until every checkpoint saved so far is on disk.
+		"""
+		with self._cond:
+			while self._finished < self._saved:
+				self._cond.wait()
+
+	def close(self):
+		with self._cond:
+			self._closed = True
+			self._cond.notify_all()
+		self._thread.join()
+		if self.error is not None:
+			raise self.error
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
@@ -0,0 +1,502 @@
+"""
+Brute-force searches spread over worker processes through sockets.
+
+A Coordinator holds one search: a program image, a Search subclass named
+"module:Class" with its parameters, and ranges of candidate indexes. It
+listens on a TCP ("host:port") or Unix socket (a path) address and sends
+every worker that connects the job, image included, once, then a few
+ranges at a time. Workers stream back matches as they find them, how many
+candidates they have tried, and each range they finish. Workers may join
+at any point; one that disconnects or dies has its unfinished ranges
+handed to the others, so a range can report some matches twice. With
+first, the search stops at the first match.
+
+Messages are JSON objects, each prefixed by its length as a little-endian
+uint32. There is no authentication, and workers import whatever module
+the job names: only run them against coordinators you trust.
+
+python -m intcode.cluster ADDRESS [-d]
+"""
+
+
+import os
+import abc
+import sys
+import json
+import time
+import shutil
+import select
+import socket
+import struct
+import logging
+import tempfile
+import selectors
+import importlib
+import subprocess
+from collections import deque
+
+
+log = logging.getLogger(__name__)
+
+
+LENGTH = struct.Struct("<I")
+# ranges a worker is sent beyond the one it is on
+PREFETCH = 1
+# seconds between a worker's progress reports, and between its checks for
+# a stop from the coordinator
+POLL_INTERVAL = 0.25
+# seconds between the coordinator's progress log lines
+REPORT_INTERVAL = 2.0
+
+
+class ClusterError(RuntimeError):
+	pass
+
+
+class Search(abc.ABC):
+	"""
+	Base for what workers run: built from the image and the parameters of
+	the job, it checks one candidate index at a time.
+	"""
+	@abc.abstractmethod
+	def check(self, idx):
+		"""
+		A JSON-able match for candidate idx, or None.
+		"""
+		pass
+
+	def close(self):
+		pass
+
+
+def parse_address(text):
+	"""
+	(family, address) of "host:port", or else of a Unix socket path.
+	"""
+	host, sep, port = text.rpartition(":")
+	if sep and port.isdigit() and os.sep not in host:
+		host = host.strip("[]") or "127.0.0.1"
+		family = socket.getaddrinfo(host, int(port), type=socket.SOCK_STREAM)[0][0]
+		return family, (host, int(port))
+	if not hasattr(socket, "AF_UNIX"):
+		raise ClusterError("{}: not host:port, and this platform has no Unix sockets".format(text))
+	return socket.AF_UNIX, text
+
+
+def format_address(family, addr):
+	if family == getattr(socket, "AF_UNIX", None):
+		return addr
+	return "{}:{}".format(addr[0], addr[1])
+
+
+def split(indexes, size):
+	"""
+	(start, stop) ranges of at most size candidates covering the sorted
+	indexes; each range is a run of consecutive ones.
+	"""
+	if isinstance(indexes, range) and indexes.step == 1:
+		return [(start, min(start + size, indexes.stop)) for start in range(indexes.start, indexes.stop, size)]
+	ret = []
+	for idx in indexes:
+		if ret and ret[-1][1] == idx and idx - ret[-1][0] < size:
+			ret[-1][1] += 1
+		else:
+			ret.append([idx, idx + 1])
+	return [tuple(r) for r in ret]
+
+
+def send(sock, msg):
+	raw = json.dumps(msg).encode("utf-8")
+	sock.sendall(LENGTH.pack(len(raw)) + raw)
+
+
+class Reader(object):
+	"""
+	Splits the bytes of a stream into messages.
+	"""
+	def __init__(self):
+		self._buf = bytearray()
+
+	def feed(self, raw):
+		"""
+		Messages completed by raw.
+		"""
+		self._buf += raw
+		ret = []
+		while len(self._buf) >= LENGTH.size:
+			size, = LENGTH.unpack_from(self._buf)
+			end = LENGTH.size + size
+			if len(self._buf) < end:
+				break
+			ret.append(json.loads(self._buf[LENGTH.size:end].decode("utf-8")))
+			del self._buf[:end]
+		return ret
+
+
+class _Peer(object):
+	__slots__ = ("sock", "name", "reader", "ranges")
+
+	def __init__(self, sock, name):
+		self.sock = sock
+		self.name = name
+		self.reader = Reader()
+		# range id -> (start, stop) sent and not yet done
+		self.ranges = {}
+
+
+class Coordinator(object):
+	"""
+	Hands out the ranges of one search to the workers that connect to
+	address, by default a Unix socket in a private directory (or a free
+	localhost port where there are none), and collects what they report.
+	image may be an intcode.shared.SharedImage, which workers on this host
+	attach to instead of being sent the words.
+	"""
+	def __init__(self, search, params, image, ranges, address=None, first=False):
+		self.search = search
+		self.params = params
+		self.image = image
+		self.first = first
+		self.total = sum(stop - start for start, stop in ranges)
+		# candidates reported tried, matches reported, workers that
+		# connected, and workers that went away with ranges unfinished
+		self.tried = 0
+		self.matches = 0
+		self.joined = 0
+		self.lost = 0
+		self.error = None
+		self._todo = deque(ranges)
+		self._peers = {}
+		self._ids = 0
+		self._stopped = False
+		self._on_match = None
+		self._on_done = None
+		# only workers spawned by run() can reach a private address
+		self._private = address is None
+		self._tmp = None
+		if address is None:
+			if hasattr(socket, "AF_UNIX"):
+				self._tmp = tempfile.mkdtemp(prefix="intcode-")
+				address = os.path.join(self._tmp, "cluster.sock")
+			else:
+				address = "127.0.0.1:0"
+		family, addr = parse_address(address)
+		self._server = socket.socket(family, socket.SOCK_STREAM)
+		if family != getattr(socket, "AF_UNIX", None):
+			self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+		self._server.bind(addr)
+		self._server.listen()
+		self._family = family
+		self.address = format_address(family, self._server.getsockname())
+		self._selector = selectors.DefaultSelector()
+		self._selector.register(self._server, selectors.EVENT_READ)
+
+	def _job(self):
+		from .shared import SharedImage
+		if isinstance(self.image, SharedImage):
+			image = {"shared": [self.image.name, len(self.image)]}
+		else:
+			image = list(self.image)
+		return {"type": "job", "search": self.search, "params": self.params, "image": image}
+
+	def spawn(self):
+		"""
+		Start a worker process on this host.
+		"""
+		cmd = [sys.executable, "-m", "intcode.cluster", self.address]
+		if logging.getLogger().isEnabledFor(logging.DEBUG):
+			cmd.append("-d")
+		# the worker imports this package and the module of the search,
+		# which is normally next to the script that started the coordinator
+		root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+		env = dict(os.environ)
+		env["PYTHONPATH"] = os.pathsep.join(
+			[root, sys.path[0] or os.getcwd()] + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else [])
+		)
+		return subprocess.Popen(cmd, env=env)
+
+	def _accept(self):
+		sock, addr = self._server.accept()
+		if self._family != getattr(socket, "AF_UNIX", None):
+			sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+		peer = _Peer(sock, format_address(self._family, addr) if addr else "worker {}".format(self.joined))
+		self._peers[sock] = peer
+		self._selector.register(sock, selectors.EVENT_READ, peer)
+		self.joined += 1
+		if self._send(peer, self._job()):
+			self._assign(peer)
+
+	def _send(self, peer, msg):
+		try:
+			send(peer.sock, msg)
+		except OSError as e:
+			# the worker has gone; reading up to its end of stream picks up
+			# what it sent last and then drops it
+			log.debug("{}: {}".format(peer.name, e))
+			return False
+		return True
+
+	def _assign(self, peer):
+		while not self._stopped and self._todo and len(peer.ranges) <= PREFETCH:
+			start, stop = self._todo.popleft()
+			self._ids += 1
+			peer.ranges[self._ids] = (start, stop)
+			if not self._send(peer, {"type": "range", "id": self._ids, "start": start, "stop": stop}):
+				return
+
+	def _drop(self, peer):
+		if peer.sock not in self._peers:
+			return
+		del self._peers[peer.sock]
+		self._selector.unregister(peer.sock)
+		peer.sock.close()
+		if not peer.ranges or self._stopped:
+			log.info("{} left".format(peer.name))
+			return
+		self.lost += 1
+		log.warning("{} left with {} ranges unfinished; handing them out again".format(
+			peer.name, len(peer.ranges)
+		))
+		self._todo.extendleft(reversed(sorted(peer.ranges.values())))
+		peer.ranges.clear()
+		for other in list(self._peers.values()):
+			self._assign(other)
+
+	def _handle(self, peer, msg):
+		kind = msg.get("type")
+		if kind == "hello":
+			peer.name = "{}:{}".format(msg["host"], msg["pid"])
+			log.info("{} joined".format(peer.name))
+		elif kind == "match":
+			self.matches += 1
+			if self._on_match is not None:
+				self._on_match(msg["index"], msg["value"])
+			if self.first:
+				self._stopped = True
+		elif kind == "progress":
+			self.tried += msg["tried"]
+		elif kind == "done":
+			self.tried += msg["tried"]
+			start, stop = peer.ranges.pop(msg["id"])
+			if self._on_done is not None:
+				self._on_done(start, stop)
+			self._assign(peer)
+		elif kind == "error":
+			self.error = "{}: {}".format(peer.name, msg["message"])
+			log.error(self.error)
+		else:
+			log.warning("{}: unknown message {}".format(peer.name, kind))
+
+	def _receive(self, peer):
+		try:
+			raw = peer.sock.recv(1 << 16)
+		except OSError:
+			raw = b""
+		if not raw:
+			self._drop(peer)
+			return
+		for msg in peer.reader.feed(raw):
+			self._handle(peer, msg)
+			if peer.sock not in self._peers:
+				return
+
+	def _busy(self):
+		return not self._stopped and (self._todo or any(peer.ranges for peer in self._peers.values()))
+
+	def run(self, spawn=0, on_match=None, on_done=None):
+		"""
+		Start spawn local workers and run the search until every range is
+		done, or with first until a match. on_match(index, value) is called
+		for every match and on_done(start, stop) for every range finished.
+		"""
+		self._on_match = on_match
+		self._on_done = on_done
+		procs = [self.spawn() for _ in range(spawn)]
+		if not procs:
+			log.info("waiting for workers on {}".format(self.address))
+		reported = time.perf_counter()
+		waiting = False
+		try:
+			while self._busy():
+				if not self._peers and all(proc.poll() is not None for proc in procs):
+					if self._private:
+						raise ClusterError("every worker exited with work left{}".format(
+							"; last error: {}".format(self.error) if self.error else ""
+						))
+					if not waiting and self.joined:
+						log.warning("every worker has left; waiting for more on {}".format(self.address))
+					waiting = True
+				else:
+					waiting = False
+				for key, _ in self._selector.select(POLL_INTERVAL):
+					if key.fileobj is self._server:
+						self._accept()
+					elif key.data.sock in self._peers:
+						self._receive(key.data)
+				if time.perf_counter() - reported >= REPORT_INTERVAL:
+					reported = time.perf_counter()
+					log.info("{:,}/{:,} candidates tried; {} workers".format(self.tried, self.total, len(self._peers)))
+		finally:
+			for peer in list(self._peers.values()):
+				try:
+					send(peer.sock, {"type": "stop"})
+				except OSError:
+					pass
+				self._selector.unregister(peer.sock)
+				peer.sock.close()
+			self._peers.clear()
+			for proc in procs:
+				try:
+					proc.wait(5)
+				except subprocess.TimeoutExpired:
+					proc.kill()
+					proc.wait()
+
+	def close(self):
+		self._selector.close()
+		self._server.close()
+		if self._family == getattr(socket, "AF_UNIX", None):
+			try:
+				os.unlink(self.address)
+			except OSError:
+				pass
+		if self._tmp is not None:
+			shutil.rmtree(self._tmp, ignore_errors=True)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+
+class Worker(object):
+	"""
+	Runs the ranges a coordinator at address hands it until told to stop.
+	"""
+	def __init__(self, address):
+		family, addr = parse_address(address)
+		self._sock = socket.socket(family, socket.SOCK_STREAM)
+		self._sock.connect(addr)
+		self._reader = Reader()
+		self._inbox = deque()
+
+	def _receive(self, block):
+		"""
+		Queue whatever messages have arrived; False once the coordinator has
+		gone.
+		"""
+		if not block and not select.select([self._sock], [], [], 0)[0]:
+			return True
+		try:
+			raw = self._sock.recv(1 << 16)
+		except OSError:
+			return False
+		if not raw:
+			return False
+		self._inbox.extend(self._reader.feed(raw))
+		return True
+
+	def _send(self, msg):
+		"""
+		False once the coordinator has gone.
+		"""
+		try:
+			send(self._sock, msg)
+		except OSError:
+			return False
+		return True
+
+	def _next(self):
+		while not self._inbox:
+			if not self._receive(True):
+				return None
+		return self._inbox.popleft()
+
+	def _load(self, job):
+		module, _, name = job["search"].partition(":")
+		cls = getattr(importlib.import_module(module), name)
+		image = job["image"]
+		if isinstance(image, dict):
+			from .shared import SharedImage
+			image = SharedImage.attach(*image["shared"])
+		return cls(image, **job["params"])
+
+	def _range(self, search, msg):
+		"""
+		Run one range; False if the coordinator stopped the search meanwhile.
+		"""
+		tried = 0
+		last = time.perf_counter()
+		for idx in range(msg["start"], msg["stop"]):
+			value = search.check(idx)
+			tried += 1
+			if value is not None:
+				if not self._send({"type": "match", "id": msg["id"], "index": idx, "value": value}):
+					return False
+			if time.perf_counter() - last >= POLL_INTERVAL:
+				last = time.perf_counter()
+				if not self._send({"type": "progress", "id": msg["id"], "tried": tried}):
+					return False
+				tried = 0
+				if not self._receive(False) or any(m["type"] == "stop" for m in self._inbox):
+					return False
+		return self._send({"type": "done", "id": msg["id"], "tried": tried})
+
+	def run(self):
+		search = None
+		try:
+			if not self._send({"type": "hello", "host": socket.gethostname(), "pid": os.getpid()}):
+				return
+			job = self._next()
+			if job is None or job["type"] != "job":
+				return
+			search = self._load(job)
+			while True:
+				msg = self._next()
+				if msg is None or msg["type"] == "stop":
+					return
+				if not self._range(search, msg):
+					return
+		except Exception as e:
+			self._send({"type": "error", "message": "{}: {}".format(type(e).__name__, e)})
+			raise
+		finally:
+			if search is not None:
+				search.close()
+			self._close()
+
+	def _close(self):
+		# closing with unread messages resets the connection, which can lose
+		# the ones this worker sent last
+		self._sock.setblocking(False)
+		try:
+			while self._sock.recv(1 << 16):
+				pass
+		except OSError:
+			pass
+		self._sock.close()
+
+
+def main():
+	from argparse import ArgumentParser
+	parser = ArgumentParser()
+	parser.add_argument("address", type=str)
+	parser.add_argument("-d", "--debug", default=False, action="store_true")
+	args = parser.parse_args()
+	logging.basicConfig(
+		format="[%(levelname)s %(filename)s:(%(lineno)d)] %(message)s",
+		level=logging.DEBUG if args.debug else logging.WARNING,
+		stream=sys.stdout
+	)
+	try:
+		worker = Worker(args.address)
+	except OSError as e:
+		print("{}: {}".format(args.address, e), file=sys.stderr)
+		return 1
+	worker.run()
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Disassembler and static control-flow graph for IntCode images.
+
+Decoding starts from the entry point and follows fall-through and
+immediate-mode jump targets, so data words after a HALT are not mistaken
+for code. Jumps through a position-mode target are dynamic: the graph
+records them but cannot know where they go. Programs that patch their own
+code before running it can also be decoded with a linear sweep, which
+decodes every word that forms a valid instruction.
+
+python -m intcode.disasm day5.txt [--sweep] [--graph] [--dot]
+"""
+
+
+import sys
+import logging
+from collections import Counter
+
+from .engine import (
+	DECODE,
+	LENGTHS,
+	NAMES,
+	IMMEDIATE,
+	ADD,
+	MUL,
+	IN,
+	OUT,
+	JUMP_IF_TRUE,
+	JUMP_IF_FALSE,
+	LESS_THAN,
+	EQUALS,
+	HALT,
+	load,
+)
+
+
+log = logging.getLogger(__name__)
+
+
+JUMPS = (JUMP_IF_TRUE, JUMP_IF_FALSE)
+STORES = (ADD, MUL, LESS_THAN, EQUALS)
+
+
+class Instruction(object):
+	__slots__ = ("pos", "words", "op", "modes", "params")
+
+	def __init__(self, pos, words, op, modes):
+		self.pos = pos
+		# the instruction as it is in memory, opcode word first
+		self.words = words
+		self.op = op
+		# all three mode digits, whatever the instruction length
+		self.modes = modes
+		self.params = tuple(words[1:])
+
+	def __len__(self):
+		return LENGTHS[self.op]
+
+	@property
+	def end(self):
+		return self.pos + LENGTHS[self.op]
+
+	@property
+	def target(self):
+		"""
+		Static jump target, or None for other instructions and jumps through
+		memory.
+		"""
+		if self.op in JUMPS and self.modes[1] == IMMEDIATE:
+			return self.params[1]
+		return None
+
+	@property
+	def dynamic(self):
+		return self.op in JUMPS and self.modes[1] != IMMEDIATE
+
+	def reads(self):
+		"""
+		Addresses read through position-mode operands.
+		"""
+		count = {IN: 0, OUT: 1, HALT: 0}.get(self.op, 2)
+		return [p for m, p in zip(self.modes, self.params[:count]) if m != IMMEDIATE]
+
+	def writes(self):
+		if self.op in STORES:
+			return [self.params[2]]
+		if self.op == IN:
+			return [self.params[0]]
+		return []
+
+	def __str__(self):
+		args = []
+		for idx, param in enumerate(self.params):
+			write = (self.op in STORES and idx == 2) or self.op == IN
+			if write or self.modes[idx] != IMMEDIATE:
+				args.append("[{}]".format(param))
+			else:
+				args.append(str(param))
+		if self.op in STORES:
+			text = "{} {}, {} -> {}".format(NAMES[self.op], *args)
+		elif args:
+			text = "{} {}".format(NAMES[self.op], ", ".join(args))
+		else:
+			text = NAMES[self.op]
+		return "{:>6}: {}".format(self.pos, text)
+
+
+def decode_at(data, pos):
+	"""
+	The Instruction at pos, or None if the word there is not an
+	instruction or its parameters run past the end.
+	"""
+	entry = DECODE.get(data[pos]) if 0 <= pos < len(data) else None
+	if entry is None:
+		return None
+	op, f, s = entry
+	end = pos + LENGTHS[op]
+	if end > len(data):
+		return None
+	return Instruction(pos, list(data[pos:end]), op, (f, s, data[pos] // 10000 % 10))
+
+
+def disassemble(data, entries=(0,), sweep=False):
+	"""
+	Decode every instruction reachable from entries, and with sweep every
+	other run of valid instructions too; returns {pos: Instruction}.
+	"""
+	ret = {}
+	if sweep:
+		pos = 0
+		while pos < len(data):
+			inst = decode_at(data, pos)
+			if inst is None:
+				pos += 1
+				continue
+			ret[pos] = inst
+			pos = inst.end
+	todo = list(entries)
+	while todo:
+		pos = todo.pop()
+		while pos not in ret:
+			inst = decode_at(data, pos)
+			if inst is None:
+				break
+			ret[pos] = inst
+			if inst.target is not None:
+				todo.append(inst.target)
+			if inst.op == HALT:
+				break
+			pos = inst.end
+	return ret
+
+
+def listing(data, entries=(0,), sweep=False):
+	"""
+	Lines of text for the image: decoded instructions, with the words in
+	between shown as data.
+	"""
+	insts = disassemble(data, entries, sweep)
+	ret = []
+	pos = 0
+	while pos < len(data):
+		inst = insts.get(pos)
+		if inst is not None:
+			ret.append(str(inst))
+			pos = inst.end
+		else:
+			ret.append("{:>6}: DATA {}".format(pos, data[pos]))
+			pos += 1
+	return ret
+
+
+class Block(object):
+	"""
+	Basic block: instructions from a leader to the next leader or control
+	transfer. succ holds static successors; dynamic is set when the block
+	ends in a jump through memory.
+	"""
+	__slots__ = ("start", "insts", "succ", "pred", "dynamic")
+
+	def __init__(self, start):
+		self.start = start
+		self.insts = []
+		self.succ = []
+		self.pred = []
+		self.dynamic = False
+
+	@property
+	def end(self):
+		return self.insts[-1].end if self.insts else self.start
+
+	def stats(self):
+		writes = [a for inst in self.insts for a in inst.writes()]
+		return {
+			"instructions": len(self.insts),
+			"words": self.end - self.start,
+			"ops": Counter(NAMES[inst.op] for inst in self.insts),
+			"reads": sum(len(inst.reads()) for inst in self.insts),
+			"writes": len(writes),
+		}
+
+
+class Graph(object):
+	def __init__(self, data, entries=(0,), sweep=False):
+		self.data = data
+		self.entries = tuple(entries)
+		self.insts = disassemble(data, entries, sweep)
+		self.blocks = {}
+		self._build()
+
+	def _leaders(self):
+		leaders = set(pos for pos in self.entries if pos in self.insts)
+		# instructions no other instruction falls through to
+		falls = set(inst.end for inst in self.insts.values() if inst.op != HALT)
+		leaders.update(pos for pos in self.insts if pos not in falls)
+		for inst in self.insts.values():
+			if inst.op in JUMPS or inst.op in (IN, OUT):
+				if inst.end in self.insts:
+					leaders.add(inst.end)
+			if inst.target is not None and inst.target in self.insts:
+				leaders.add(inst.target)
+		return leaders
+
+	def _build(self):
+		leaders = self._leaders()
+		for start in sorted(leaders):
+			block = Block(start)
+			pos = start
+			while pos in self.insts:
+				inst = self.insts[pos]
+				block.insts.append(inst)
+				pos = inst.end
+				if inst.op in JUMPS or inst.op in (IN, OUT, HALT) or pos in leaders:
+					break
+			self.blocks[start] = block
+		for block in self.blocks.values():
+			last = block.insts[-1]
+			if last.op != HALT and last.end in self.blocks:
+				block.succ.append(last.end)
+			if last.target is not None and last.target in self.blocks and last.target not in block.succ:
+				block.succ.append(last.target)
+			block.dynamic = last.dynamic
+			for succ in block.succ:
+				self.blocks[succ].pred.append(block.start)
+
+	def code(self):
+		"""
+		Addresses covered by decoded instructions.
+		"""
+		ret = set()
+		for inst in self.insts.values():
+			ret.update(range(inst.pos, inst.end))
+		return ret
+
+	def self_modifying(self):
+		"""
+		Instructions with a static store into decoded code.
+		"""
+		code = self.code()
+		return [inst for inst in self.insts.values() if any(a in code for a in inst.writes())]
+
+	def report(self, stream=None):
+		print("{} instructions in {} blocks".format(len(self.insts), len(self.blocks)), file=stream)
+		for start in sorted(self.blocks):
+			block = self.blocks[start]
+			stats = block.stats()
+			print("block {}-{}: {} instructions; {} reads; {} writes; -> {}{}".format(
+				start, block.end - 1, stats["instructions"], stats["reads"], stats["writes"],
+				block.succ, " + dynamic" if block.dynamic else ""
+			), file=stream)
+		patched = self.self_modifying()
+		if patched:
+			print("stores into code at: {}".format([inst.pos for inst in patched]), file=stream)
+
+	def dot(self):
+		"""
+		Graphviz source for the graph.
+		"""
+		lines = ["digraph intcode {", "\tnode [shape=box, fontname=monospace];"]
+		for start in sorted(self.blocks):
+			block = self.blocks[start]
+			label = "\\l".join(str(inst).strip() for inst in block.insts) + "\\l"
+			lines.append("\tb{} [label=\"{}\"];".format(start, label))
+			for succ in block.succ:
+				lines.append("\tb{} -> b{};".format(start, succ))
+			if block.dynamic:
+				lines.append("\tb{} -> dynamic [style=dashed];".format(start))
+		lines.append("}")
+		return "\n".join(lines)
+
+
+def main():
+	from argparse import ArgumentParser
+	parser = ArgumentParser()
+	parser.add_argument("path", type=str)
+	parser.add_argument("-s", "--sweep", default=False, action="store_true")
+	parser.add_argument("-g", "--graph", default=False, action="store_true")
+	parser.add_argument("--dot", default=False, action="store_true")
+	args = parser.parse_args()
+	data = load(args.path)
+	if args.dot:
+		print(Graph(data, sweep=args.sweep).dot())
+	elif args.graph:
+		Graph(data, sweep=args.sweep).report()
+	else:
+		for line in listing(data, sweep=args.sweep):
+			print(line)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,1034 @@
+"""
+IntCode virtual machine shared by day 2, day 5 and day 7.
+"""
+
+
+import itertools
+import logging
+from time import perf_counter
+from collections import deque
+
+from . import snapshot
+from .tracking import Tracker
+from . import memory
+
+
+log = logging.getLogger(__name__)
+
+
+POSITION = 0
+IMMEDIATE = 1
+MODES = (POSITION, IMMEDIATE)
+
+ADD = 1
+MUL = 2
+IN = 3
+OUT = 4
+JUMP_IF_TRUE = 5
+JUMP_IF_FALSE = 6
+LESS_THAN = 7
+EQUALS = 8
+HALT = 99
+
+# opcode -> instruction length (opcode word plus parameters)
+LENGTHS = {
+	ADD: 4,
+	MUL: 4,
+	IN: 2,
+	OUT: 2,
+	JUMP_IF_TRUE: 3,
+	JUMP_IF_FALSE: 3,
+	LESS_THAN: 4,
+	EQUALS: 4,
+	HALT: 1,
+}
+
+NAMES = {
+	ADD: "ADD",
+	MUL: "MUL",
+	IN: "IN",
+	OUT: "OUT",
+	JUMP_IF_TRUE: "JUMP IF TRUE",
+	JUMP_IF_FALSE: "JUMP IF FALSE",
+	LESS_THAN: "LESS THAN",
+	EQUALS: "EQUALS",
+	HALT: "HALT",
+}
+
+
+# instructions between checks of a run's deadline and cancel token
+CHECK_INTERVAL = 1024
+
+# events yielded by IntCode.coroutine()
+NEEDS_INPUT = "NEEDS_INPUT"
+OUTPUT = "OUTPUT"
+HALTED = "HALTED"
+
+
+class IntCodeError(RuntimeError):
+	pass
+
+
+class Interrupted(IntCodeError):
+	"""
+	A run stopped by one of its limits before the instruction at the IP;
+	the machine can be run again from there.
+	"""
+	pass
+
+
+class BudgetExceeded(Interrupted):
+	pass
+
+
+class DeadlineExceeded(Interrupted):
+	pass
+
+
+class Cancelled(Interrupted):
+	pass
+
+
+def _build_decode():
+	# every opcode is accepted with any combination of the three mode digits,
+	# matching the old IntCodeOperation.eval which always split out f/s/t
+	table = {}
+	for op in LENGTHS:
+		for f, s, t in itertools.product(MODES, repeat=3):
+			table[op + 100 * f + 1000 * s + 10000 * t] = (op, f, s)
+	return table
+
+
+# full instruction word (opcode plus mode digits) -> (opcode, mode 1, mode 2)
+DECODE = _build_decode()
+
+
+def _alu(fn, f, s):
+	def handler(data, inst, pos):
+		a = inst[1] if f else data[inst[1]]
+		b = inst[2] if s else data[inst[2]]
+		result = data[inst[3]] = fn(a, b)
+		return (a, b), result, pos + 4
+	return handler
+
+
+def _jump(taken, f, s):
+	def handler(data, inst, pos):
+		a = inst[1] if f else data[inst[1]]
+		if (a != 0) == taken:
+			nxt = inst[2] if s else data[inst[2]]
+		else:
+			nxt = pos + 3
+		return (a,), nxt, nxt
+	return handler
+
+
+def _halt(data, inst, pos):
+	return (), None, len(data)
+
+
+def _build_handlers():
+	# full instruction word -> handler(data, inst, pos) returning (args,
+	# result, next IP) for step_forward; IN and OUT need the machine's I/O
+	# and are run by step_forward itself
+	alu = {
+		ADD: lambda a, b: a + b,
+		MUL: lambda a, b: a * b,
+		LESS_THAN: lambda a, b: 1 if a < b else 0,
+		EQUALS: lambda a, b: 1 if a == b else 0,
+	}
+	table = {}
+	for opm, (op, f, s) in DECODE.items():
+		if op in alu:
+			table[opm] = _alu(alu[op], f, s)
+		elif op in (JUMP_IF_TRUE, JUMP_IF_FALSE):
+			table[opm] = _jump(op == JUMP_IF_TRUE, f, s)
+		elif op == HALT:
+			table[opm] = _halt
+		else:
+			table[opm] = None
+	return table
+
+
+HANDLERS = _build_handlers()
+
+
+def decode(opm):
+	try:
+		return DECODE[opm]
+	except KeyError:
+		raise IntCodeError("Invalid instruction {}".format(opm))
+
+
+def reach(data, pos):
+	"""
+	One past the highest address the instruction at pos reads or writes,
+	treating words past the end as zeros; None if it is not an instruction.
+	"""
+	size = len(data)
+	entry = DECODE.get(data[pos]) if 0 <= pos < size else None
+	if entry is None:
+		return None
+	op, f, s = entry
+	length = LENGTHS[op]
+	params = [data[i] if i < size else 0 for i in range(pos + 1, pos + length)]
+	ret = pos + length
+	for mode, param in zip((f, s), params):
+		if mode != IMMEDIATE and param >= 0:
+			ret = max(ret, param + 1)
+	if op == IN or length == 4:
+		ret = max(ret, params[-1] + 1)
+	return ret
+
+
+
+
+def parse(text):
+	return [x for x in map(int, text.strip().split(","))]
+
+
+def load(path):
+	"""
+	Program at path: a binary image (see intcode.image), mapped rather
+	than read, or comma-separated text.
+	"""
+	from .image import Image, is_image
+	if is_image(path):
+		return Image(path)
+	with open(path, "r") as f:
+		return parse(f.read())
+
+
+def prompt():
+	raw = input("input: ")
+	if raw:
+		return int(raw)
+	return 0
+
+
+# Source of the interpreter loop.  Lines tagged "#@<feature>" are only kept
+# when the engine is built with that feature and lines tagged "#@!<feature>"
+# only when it is not (several conditions are joined with commas, and
+# "a|b" holds when either does), so a production build carries no trace
+# calls or argument construction at all.
+_EVAL_SOURCE = """
+def _eval(self):
+	data = self._state
+	pos = self._pos
+	table = DECODE
+	read = self._read
+	write = self._write
+	#@trace trace = self._tracer
+	#@channels inputs = self.inputs
+	#@channels outputs = self.outputs
+	#@channels until_output = self._until_output
+	#@count steps = self.steps
+	#@fuse fused = self._fused
+	#@fuse,count merged = self.merged
+	#@track executed = self.tracker.executed
+	#@track written = self.tracker.written
+	#@track lengths = LENGTHS
+	#@profile hits = self.profile.ips
+	#@profile ops = self.profile.ops
+	#@profile codes = self.profile.codes
+	#@profile close = self.profile.close
+	#@profile clock = perf_counter
+	#@profile block = pos
+	#@profile t0 = clock()
+	#@budget left = self._check()
+	#@checkpoint ticks = CHECK_INTERVAL
+	while True:
+		try:
+			while True:
+				#@budget if left <= 0:
+				#@budget 	self._pos = pos
+				#@budget,count 	self.steps = steps
+				#@budget 	left = self._check()
+				#@budget left -= 1
+				op, f, s = table[data[pos]]
+				#@count steps += 1
+				#@track executed.mark(pos, pos + lengths[op])
+				#@profile hits[pos] += 1
+				#@profile ops[op] += 1
+				#@profile codes[pos].add(op)
+				#@trace ip = pos
+				if op == ADD:
+					a = data[pos + 1]
+					if not f:
+						a = data[a]
+					b = data[pos + 2]
+					if not s:
+						b = data[b]
+					data[data[pos + 3]] = a + b
+					#@track written.add(data[pos + 3])
+					#@trace trace(ip, op, data[ip:ip + 4], (a, b), data[data[ip + 3]])
+					pos += 4
+				elif op == MUL:
+					a = data[pos + 1]
+					if not f:
+						a = data[a]
+					b = data[pos + 2]
+					if not s:
+						b = data[b]
+					data[data[pos + 3]] = a * b
+					#@track written.add(data[pos + 3])
+					#@trace trace(ip, op, data[ip:ip + 4], (a, b), data[data[ip + 3]])
+					pos += 4
+				elif op == LESS_THAN:
+					a = data[pos + 1]
+					if not f:
+						a = data[a]
+					b = data[pos + 2]
+					if not s:
+						b = data[b]
+					#@fuse if pos in fused:
+					#@fuse 	# one dispatch for this compare, the jump on its flag and the
+					#@fuse 	# ADD or MUL between them, if any; see intcode.fusion
+					#@fuse 	jump, word, dead, when, mid = fused[pos]
+					#@fuse 	flag = data[pos + 3]
+					#@fuse 	if data[jump] == word and data[jump + 1] == flag:
+					#@fuse 		a = a < b
+					#@fuse 		if mid is None:
+					#@fuse 			if not dead:
+					#@fuse 				data[flag] = 1 if a else 0
+					#@fuse 		else:
+					#@fuse 			data[flag] = 1 if a else 0
+					#@fuse 			pos += 4
+					#@fuse 			mword, mdest, mop, mf, ms = mid
+					#@fuse 			if data[pos] != mword or data[pos + 3] != mdest or mdest == flag:
+					#@fuse 				continue
+					#@fuse,count 			steps += 1
+					#@fuse 			b = data[pos + 1]
+					#@fuse 			if not mf:
+					#@fuse 				b = data[b]
+					#@fuse 			c = data[pos + 2]
+					#@fuse 			if not ms:
+					#@fuse 				c = data[c]
+					#@fuse 			data[mdest] = b + c if mop == ADD else b * c
+					#@fuse,count 			merged += 1
+					#@fuse,budget 			left -= 1
+					#@fuse,count 		steps += 1
+					#@fuse,count 		merged += 1
+					#@fuse,budget 		left -= 1
+					#@fuse 		pos = data[jump + 2] if a == when else jump + 3
+					#@fuse,checkpoint 		ticks -= 1
+					#@fuse,checkpoint 		if not ticks:
+					#@fuse,checkpoint 			self._pos = pos
+					#@fuse,checkpoint,count 			self.steps = steps
+					#@fuse,checkpoint 			ticks = self._tick()
+					#@fuse 		continue
+					data[data[pos + 3]] = 1 if a < b else 0
+					#@track written.add(data[pos + 3])
+					#@trace trace(ip, op, data[ip:ip + 4], (a, b), data[data[ip + 3]])
+					pos += 4
+				elif op == EQUALS:
+					a = data[pos + 1]
+					if not f:
+						a = data[a]
+					b = data[pos + 2]
+					if not s:
+						b = data[b]
+					#@fuse if pos in fused:
+					#@fuse 	# one dispatch for this compare, the jump on its flag and the
+					#@fuse 	# ADD or MUL between them, if any; see intcode.fusion
+					#@fuse 	jump, word, dead, when, mid = fused[pos]
+					#@fuse 	flag = data[pos + 3]
+					#@fuse 	if data[jump] == word and data[jump + 1] == flag:
+					#@fuse 		a = a == b
+					#@fuse 		if mid is None:
+					#@fuse 			if not dead:
+					#@fuse 				data[flag] = 1 if a else 0
+					#@fuse 		else:
+					#@fuse 			data[flag] = 1 if a else 0
+					#@fuse 			pos += 4
+					#@fuse 			mword, mdest, mop, mf, ms = mid
+					#@fuse 			if data[pos] != mword or data[pos + 3] != mdest or mdest == flag:
+					#@fuse 				continue
+					#@fuse,count 			steps += 1
+					#@fuse 			b = data[pos + 1]
+					#@fuse 			if not mf:
+					#@fuse 				b = data[b]
+					#@fuse 			c = data[pos + 2]
+					#@fuse 			if not ms:
+					#@fuse 				c = data[c]
+					#@fuse 			data[mdest] = b + c if mop == ADD else b * c
+					#@fuse,count 			merged += 1
+					#@fuse,budget 			left -= 1
+					#@fuse,count 		steps += 1
+					#@fuse,count 		merged += 1
+					#@fuse,budget 		left -= 1
+					#@fuse 		pos = data[jump + 2] if a == when else jump + 3
+					#@fuse,checkpoint 		ticks -= 1
+					#@fuse,checkpoint 		if not ticks:
+					#@fuse,checkpoint 			self._pos = pos
+					#@fuse,checkpoint,count 			self.steps = steps
+					#@fuse,checkpoint 			ticks = self._tick()
+					#@fuse 		continue
+					data[data[pos + 3]] = 1 if a == b else 0
+					#@track written.add(data[pos + 3])
+					#@trace trace(ip, op, data[ip:ip + 4], (a, b), data[data[ip + 3]])
+					pos += 4
+				elif op == JUMP_IF_TRUE:
+					a = data[pos + 1]
+					if not f:
+						a = data[a]
+					if a != 0:
+						# read the target before moving, so a fault reading it
+						# is not taken for running off the end
+						b = data[pos + 2]
+						if not s:
+							b = data[b]
+						pos = b
+					else:
+						pos += 3
+					#@profile t0 = close(block, t0)
+					#@profile block = pos
+					#@trace trace(ip, op, data[ip:ip + 3], (a,), pos)
+					#@checkpoint ticks -= 1
+					#@checkpoint if not ticks:
+					#@checkpoint 	self._pos = pos
+					#@checkpoint,count 	self.steps = steps
+					#@checkpoint 	ticks = self._tick()
+				elif op == JUMP_IF_FALSE:
+					a = data[pos + 1]
+					if not f:
+						a = data[a]
+					if a == 0:
+						# read the target before moving, so a fault reading it
+						# is not taken for running off the end
+						b = data[pos + 2]
+						if not s:
+							b = data[b]
+						pos = b
+					else:
+						pos += 3
+					#@profile t0 = close(block, t0)
+					#@profile block = pos
+					#@trace trace(ip, op, data[ip:ip + 3], (a,), pos)
+					#@checkpoint ticks -= 1
+					#@checkpoint if not ticks:
+					#@checkpoint 	self._pos = pos
+					#@checkpoint,count 	self.steps = steps
+					#@checkpoint 	ticks = self._tick()
+				elif op == IN:
+					# None until the input is taken, for _fault
+					a = None
+					#@profile t0 = close(block, t0)
+					#@!coroutine,!channels a = read()
+					#@coroutine self._pos = pos
+					#@coroutine,count self.steps = steps - 1
+					#@coroutine,fuse,count self.merged = merged
+					#@coroutine a = yield NEEDS_INPUT, None
+					#@channels if not inputs:
+					#@channels 	self._pos = pos
+					#@channels,count 	steps -= 1
+					#@channels,budget 	left += 1
+					#@channels 	return NEEDS_INPUT
+					#@channels a = inputs.popleft()
+					data[data[pos + 1]] = a
+					#@track written.add(data[pos + 1])
+					#@profile block = pos
+					#@profile t0 = clock()
+					#@trace trace(ip, op, data[ip:ip + 2], (), data[data[ip + 1]])
+					pos += 2
+				elif op == OUT:
+					a = data[pos + 1]
+					if not f:
+						a = data[a]
+					#@trace trace(ip, op, data[ip:ip + 2], (a,), a)
+					#@profile close(block, t0)
+					#@!coroutine,!channels write(a)
+					#@coroutine self._pos = pos + 2
+					#@coroutine,count self.steps = steps
+					#@coroutine,fuse,count self.merged = merged
+					#@coroutine yield OUTPUT, a
+					#@coroutine,profile t0 = clock()
+					#@channels outputs.append(a)
+					#@!coroutine,profile t0 = clock()
+					#@profile block = pos + 2
+					#@channels if until_output:
+					#@channels 	self._pos = pos + 2
+					#@channels 	return OUTPUT
+					pos += 2
+				else:
+					#@trace trace(ip, op, data[ip:ip + 1], (), None)
+					#@profile close(block, t0)
+					pos = len(data)
+					break
+		except (IndexError, OverflowError, ValueError) as exc:
+			if pos >= len(data):
+				#@profile close(block, t0)
+				pos = len(data)
+				break
+			# the instruction at pos stopped before changing anything except
+			# for an input already taken; fix the memory and carry on
+			data = self._fault(pos, exc, op == IN and a is None)
+			if data is None:
+				self._pos = pos
+				raise IntCodeError("Address out of range at {}".format(pos))
+			if op == IN:
+				data = self._poke(data[pos + 1], a)
+				#@track written.add(data[pos + 1])
+				#@trace trace(pos, op, data[pos:pos + 2], (), a)
+				pos += 2
+			#@count else:
+			#@count 	steps -= 1
+			continue
+		except KeyError:
+			self._pos = pos
+			raise IntCodeError("Invalid instruction {} at {}".format(data[pos], pos))
+		#@count|budget finally:
+		#@count 	self.steps = steps
+		#@fuse,count 	self.merged = merged
+		#@budget 	self._refund(left)
+		break
+	self._pos = pos
+	#@channels return HALTED
+"""
+
+
+FEATURES = (
+	"trace", "count", "track", "profile", "budget", "checkpoint", "fuse", "coroutine", "channels"
+)
+
+_built = {}
+
+
+def build(**features):
+	"""
+	Return the interpreter loop compiled with the given features enabled.
+	"""
+	key = tuple(sorted(name for name, on in features.items() if on))
+	for name in key:
+		if name not in FEATURES:
+			raise ValueError("Unknown engine feature {}".format(name))
+	if "coroutine" in key and "channels" in key:
+		raise ValueError("coroutine and channels builds are exclusive")
+	if "fuse" in key and ("trace" in key or "track" in key or "profile" in key):
+		# these observe every instruction, which a fused pair hides
+		raise ValueError("fuse builds cannot trace, track or profile")
+	if key in _built:
+		return _built[key]
+	lines = []
+	for line in _EVAL_SOURCE.splitlines():
+		stripped = line.lstrip("\t")
+		if stripped.startswith("#@"):
+			tag, _, code = stripped[2:].partition(" ")
+			if not all(
+				any(
+					alt[1:] not in key if alt.startswith("!") else alt in key
+					for alt in cond.split("|")
+				)
+				for cond in tag.split(",")
+			):
+				continue
+			line = line[:len(line) - len(stripped)] + code
+		lines.append(line)
+	namespace = {}
+	source = "\n".join(lines)
+	code = compile(source, "<intcode {}>".format("+".join(key) or "base"), "exec")
+	exec(code, globals(), namespace)
+	_built[key] = namespace["_eval"]
+	return namespace["_eval"]
+
+
+def decode_record(data, pos):
+	"""
+	(opcode, instruction words, handler, address it stores to or None) of
+	the instruction at pos.
+	"""
+	op = decode(data[pos])[0]
+	inst = data[pos:pos + LENGTHS[op]]
+	if op in (ADD, MUL, LESS_THAN, EQUALS):
+		store = inst[3]
+	elif op == IN:
+		store = inst[1]
+	else:
+		store = None
+	return op, inst, HANDLERS[inst[0]], store
+
+
+class DecodeCache(object):
+	"""
+	Decoded instructions by IP for step_forward: entries maps an IP to
+	(opcode, instruction words, handler, address it stores to or None).
+	Every write to memory must be passed to invalidate(), which drops the
+	instructions covering it.
+	"""
+	def __init__(self):
+		self.entries = {}
+		# address -> IPs of the cached instructions covering it
+		self.owners = {}
+		self.hits = 0
+		self.misses = 0
+		self.invalidated = 0
+
+	def __len__(self):
+		return len(self.entries)
+
+	def fill(self, data, pos):
+		self.misses += 1
+		rec = self.entries[pos] = decode_record(data, pos)
+		inst = rec[1]
+		for addr in range(pos, pos + len(inst)):
+			self.owners.setdefault(addr, []).append(pos)
+		return rec
+
+	def invalidate(self, addr):
+		for pos in self.owners.pop(addr, ()):
+			rec = self.entries.pop(pos, None)
+			if rec is None:
+				continue
+			self.invalidated += 1
+			for other in range(pos, pos + len(rec[1])):
+				owners = self.owners.get(other)
+				if owners is not None and pos in owners:
+					owners.remove(pos)
+
+	def clear(self):
+		self.entries.clear()
+		self.owners.clear()
+
+	def __repr__(self):
+		return "DecodeCache({} entries, {} hits, {} misses, {} invalidated)".format(
+			len(self), self.hits, self.misses, self.invalidated
+		)
+
+
+def log_trace(ip, op, inst, args, result):
+	log.debug("IP: {}; {}: {} args={} -> {}".format(ip, NAMES[op], inst, args, result))
+
+
+class IntCode(object):
+	def __init__(
+		self, state, read=None, write=None, trace=False, tracer=None, count=False, track=False,
+		compact=False, grow=False, profile=False, fuse=False, elide=False
+	):
+		# compact memory is an array('q') that turns into a list on overflow;
+		# grow extends memory with zeros instead of failing out of range
+		self._compact = compact
+		self._grow = grow
+		from .image import Image
+		# a mapped image is read-only; run a copy of it. Paged memory is
+		# kept as it is, since its pages are shared with other machines
+		if (compact and not isinstance(state, memory.PagedMemory)) or isinstance(state, Image):
+			state = memory.allocate(state, compact)
+		self._state = state
+		self._pos = 0
+		self._read = read if read is not None else prompt
+		self._write = write if write is not None else print
+		self._tracer = None
+		if trace:
+			self._tracer = tracer if tracer is not None else log_trace
+		# constructor options carried over to forks
+		self._options = dict(
+			trace=trace, tracer=tracer, count=count, track=track, compact=compact, grow=grow,
+			profile=profile, fuse=fuse, elide=elide
+		)
+		self._features = dict(trace=trace, count=count, track=track, profile=profile, fuse=fuse)
+		self._eval = build(**self._features)
+		self._run = build(channels=True, **self._features)
+		# instructions executed; only maintained when built with count
+		self.steps = 0
+		# executed/written addresses; only maintained when built with track
+		self.tracker = Tracker(len(state)) if track else None
+		# per-IP/opcode counts and block times; only kept when built with profile
+		self.profile = None
+		if profile:
+			from .profiler import Profile
+			self.profile = Profile()
+		# compare/jump sequences run in one dispatch (intcode.fusion), and
+		# the instructions that ran without a dispatch of their own; merged
+		# is only maintained when built with count. elide also skips the
+		# flag stores fusion proves dead, leaving those words stale
+		self._fused = None
+		self._elide = elide
+		self.merged = 0
+		if fuse:
+			from . import fusion
+			self._fused = fusion.find_cached(self._state, elide)
+		# channels used by run(); eval() uses read/write instead
+		self.inputs = deque()
+		self.outputs = deque()
+		self._until_output = False
+		self._status = None
+		# limits of the current run; see eval()
+		self._budget = None
+		self._deadline = None
+		self._cancel = None
+		# intcode.checkpoint.Checkpointer ticked every CHECK_INTERVAL jumps;
+		# setting one runs the machine on the checkpoint build
+		self.checkpointer = None
+		# snapshot this machine was forked from or last snapshotted to; new
+		# snapshots share its unchanged pages
+		self._base = None
+		# reverse-execution journal of (address, old value, old IP); only
+		# kept while debug() is stepping
+		self._journal = None
+		# instructions decoded by step_forward, or None to decode every
+		# step; the compiled loops write memory without telling it, so
+		# every other way of running the machine clears it
+		self.decoded = DecodeCache()
+
+	@property
+	def output(self):
+		return self._state[0]
+
+	@property
+	def state(self):
+		return self._state
+
+	@property
+	def ip(self):
+		return self._pos
+
+	@property
+	def status(self):
+		"""
+		Result of the last run(), or None before the first and after one
+		that was interrupted.
+		"""
+		return self._status
+
+	@property
+	def halted(self):
+		return self._pos >= len(self._state)
+
+	@classmethod
+	def from_snapshot(cls, snap, read=None, write=None, **kwargs):
+		ret = cls(snap.memory(), read, write, **kwargs)
+		ret._pos = snap.ip
+		ret._base = snap
+		return ret
+
+	def snapshot(self):
+		self._base = snapshot.take(self._state, self._pos, self._base)
+		return self._base
+
+	def fork(self, read=None, write=None):
+		"""
+		Clone this machine at its current IP and memory. Both then run on
+		copy-on-write pages (intcode.memory.PagedMemory) shared until one of
+		them writes to a page, so after this machine's first fork a fork
+		costs a copy of the page table and of the pages written since.
+		"""
+		snap = self.snapshot()
+		if not isinstance(self._state, (memory.PagedMemory, memory.SparseMemory)):
+			self._state = snap.memory()
+		return self.from_snapshot(
+			snap,
+			read if read is not None else self._read,
+			write if write is not None else self._write,
+			**self._options
+		)
+
+	def _forget_decoded(self):
+		# memory is about to change behind step_forward's back
+		if self.decoded is not None:
+			self.decoded.clear()
+
+	def reset(self, image):
+		"""
+		Start over on a copy of image, with no pending input or output and
+		no status or counts from earlier runs.
+		"""
+		if isinstance(self._state, list) and not self._compact:
+			self._state[:] = image
+		else:
+			self._state = memory.allocate(image, self._compact)
+		self._pos = 0
+		self._status = None
+		self.steps = 0
+		self.merged = 0
+		self.inputs.clear()
+		self.outputs.clear()
+		self._forget_decoded()
+		if self.tracker is not None:
+			self.tracker.clear()
+		if self.profile is not None:
+			self.profile.clear()
+		if self._fused is not None:
+			from . import fusion
+			self._fused = fusion.find_cached(self._state, self._elide)
+
+	@property
+	def self_modifying(self):
+		"""
+		Whether the program has written an address it executes; None unless
+		the machine was built with track.
+		"""
+		if self.tracker is None:
+			return None
+		return self.tracker.self_modifying
+
+	def _fault(self, pos, exc, unread=False):
+		"""
+		Memory that lets the instruction at pos run after it raised exc, or
+		None when it cannot. unread is whether pos is an IN that raised
+		before it took its input.
+		"""
+		if isinstance(exc, ValueError):
+			# only a store into memoryview memory means a word that does not
+			# fit; otherwise the read() of an IN failed
+			if not isinstance(self._state, memoryview) or unread:
+				raise exc
+			self._state = memory.widen(self._state)
+		elif isinstance(exc, OverflowError):
+			self._state = memory.widen(self._state)
+		elif self._grow:
+			need = reach(self._state, pos)
+			if need is None or need <= len(self._state):
+				return None
+			self._state = memory.grow(self._state, need)
+		else:
+			return None
+		return self._state
+
+	def _poke(self, addr, value):
+		try:
+			self._state[addr] = value
+		except (OverflowError, ValueError):
+			# ValueError is how memoryview memory refuses a word
+			self._state = memory.widen(self._state)
+			self._state[addr] = value
+		return self._state
+
+	def _limit(self, budget, timeout, cancel):
+		"""
+		Arm the limits of one run; returns whether any is set.
+		"""
+		self._budget = budget
+		self._deadline = perf_counter() + timeout if timeout is not None else None
+		self._cancel = cancel
+		return budget is not None or timeout is not None or cancel is not None
+
+	def _check(self):
+		# called by budget builds every CHECK_INTERVAL instructions (fewer
+		# near the end of the budget); returns how many may run until the
+		# next check
+		if self._cancel is not None and self._cancel.is_set():
+			raise Cancelled("Cancelled at {}".format(self._pos))
+		if self._deadline is not None and perf_counter() >= self._deadline:
+			raise DeadlineExceeded("Deadline passed at {}".format(self._pos))
+		if self._budget is None:
+			return CHECK_INTERVAL
+		if self._budget <= 0:
+			raise BudgetExceeded("Instruction budget exhausted at {}".format(self._pos))
+		grant = min(self._budget, CHECK_INTERVAL)
+		self._budget -= grant
+		return grant
+
+	def _tick(self):
+		# called by checkpoint builds every CHECK_INTERVAL jumps, with the
+		# machine stopped between instructions
+		self.checkpointer.tick(self)
+		return CHECK_INTERVAL
+
+	def _variant(self, limited, **features):
+		"""
+		Interpreter loop for a run with limits or a checkpointer.
+		"""
+		return build(
+			budget=limited, checkpoint=self.checkpointer is not None, **features, **self._features
+		)
+
+	def _refund(self, left):
+		if self._budget is not None:
+			self._budget += left
+
+	@property
+	def budget_left(self):
+		"""
+		Instructions left of the budget given to the last run, or None.
+		"""
+		return self._budget
+
+	def eval(self, budget=None, timeout=None, cancel=None):
+		"""
+		Run to completion on read/write. budget caps the instructions run,
+		timeout the seconds spent, and cancel (anything with is_set(), such
+		as a threading or multiprocessing Event) stops the run once set. A
+		limit raises an Interrupted subclass and leaves the machine ready to
+		run again from the same instruction.
+		"""
+		limited = self._limit(budget, timeout, cancel)
+		self._forget_decoded()
+		if limited or self.checkpointer is not None:
+			self._variant(limited)(self)
+		else:
+			self._eval(self)
+
+	def run(self, until_output=False, budget=None, timeout=None, cancel=None):
+		"""
+		Run on the input/output channels until the machine blocks. Returns
+		NEEDS_INPUT when inputs is empty at an input instruction, OUTPUT after
+		each output if until_output is set, or HALTED. Limits are as for
+		eval().
+		"""
+		if self.halted:
+			self._status = HALTED
+		else:
+			self._until_output = until_output
+			limited = self._limit(budget, timeout, cancel)
+			self._forget_decoded()
+			# cleared first, so a run cut short by a limit leaves no status
+			self._status = None
+			if limited or self.checkpointer is not None:
+				self._status = self._variant(limited, channels=True)(self)
+			else:
+				self._status = self._run(self)
+		return self._status
+
+	def feed(self, *values):
+		self.inputs.extend(values)
+
+	def drain(self):
+		"""
+		Remove and return every pending output.
+		"""
+		ret = list(self.outputs)
+		self.outputs.clear()
+		return ret
+
+	def coroutine(self, budget=None, timeout=None, cancel=None):
+		"""
+		Generator that runs the machine until it needs input or produces
+		output. It yields (NEEDS_INPUT, None), expecting the input value to be
+		sent back, or (OUTPUT, value), and returns when the machine halts.
+		Limits are as for eval() and cover the generator's whole life.
+		"""
+		limited = self._limit(budget, timeout, cancel)
+		self._forget_decoded()
+		return self._variant(limited, coroutine=True)(self)
+
+	def instruction(self, pos=None):
+		if pos is None:
+			pos = self._pos
+		op = decode(self._state[pos])[0]
+		return self._state[pos:pos + LENGTHS[op]]
+
+	def step_forward(self):
+		"""
+		Run one instruction. Instructions are decoded through decoded, so
+		code that writes to state directly must pass the addresses to
+		decoded.invalidate() (or clear it) before stepping again.
+		"""
+		data = self._state
+		pos = self._pos
+		decoded = self.decoded
+		if decoded is None:
+			rec = decode_record(data, pos)
+		else:
+			rec = decoded.entries.get(pos)
+			if rec is None:
+				rec = decoded.fill(data, pos)
+			else:
+				decoded.hits += 1
+		op, inst, handler, store = rec
+		self.steps += 1
+		if self.profile is not None:
+			self.profile.ips[pos] += 1
+			self.profile.ops[op] += 1
+			self.profile.codes[pos].add(op)
+		if self.tracker is not None:
+			self.tracker.executed.mark(pos, pos + len(inst))
+			if store is not None:
+				self.tracker.written.add(store)
+		if self._journal is not None:
+			self._journal.append((store, None if store is None else data[store], pos))
+		if op == IN:
+			args = ()
+			result = self._read()
+			self._poke(inst[1], result)
+			self._pos = pos + 2
+		elif op == OUT:
+			result = inst[1] if decode(inst[0])[1] else data[inst[1]]
+			args = (result,)
+			self._write(result)
+			self._pos = pos + 2
+		else:
+			args, result, self._pos = handler(data, inst, pos)
+		if decoded is not None and store in decoded.owners:
+			decoded.invalidate(store)
+		if self._tracer is not None:
+			self._tracer(pos, op, inst, args, result)
+
+	def step_backward(self):
+		if self._journal:
+			addr, value, pos = self._journal.pop()
+			self.steps -= 1
+			if addr is not None:
+				self._state[addr] = value
+				if self.decoded is not None:
+					self.decoded.invalidate(addr)
+			self._pos = pos
+			if self._tracer is not None:
+				log.debug("BACK: IP: {}; INST {}: {}".format(
+					self._pos, len(self._journal), self.instruction()
+				))
+
+	def disassemble(self, count=5):
+		"""
+		Print the next count instructions from the IP as they are in memory
+		now.
+		"""
+		from .disasm import decode_at
+		pos = self._pos
+		for _ in range(count):
+			inst = decode_at(self._state, pos)
+			if inst is None:
+				if 0 <= pos < len(self._state):
+					print("{:>6}: DATA {}".format(pos, self._state[pos]))
+				break
+			print(inst)
+			pos = inst.end
+
+	def debug(self):
+		step = True
+		bps = []
+		self._journal = []
+		try:
+			while self._pos < len(self._state):
+				if step:
+					d = input(">> ")
+					if d.lower() == "n" or len(d) == 0:
+						self.step_forward()
+					elif d.lower() == "b":
+						self.step_backward()
+					elif d.lower() == "c":
+						step = False
+					elif d.lower().startswith("bp"):
+						data = d.split(" ")
+						if len(data) == 1:
+							print("breakpoints: {}".format(bps))
+						elif len(data) == 2:
+							loc = int(data[1])
+							if loc not in bps:
+								bps.append(loc)
+					elif d.lower().startswith("d"):
+						data = d.split(" ")
+						self.disassemble(int(data[1]) if len(data) == 2 else 5)
+					elif d.lower().startswith("p"):
+						data = d.split(" ")
+						if len(data) == 1:
+							print("state: {}".format(self._state))
+						if len(data) == 2:
+							idx = int(data[1])
+							print("state[{}]: {}".format(idx, self._state[idx]))
+						elif len(data) == 3:
+							sidx = int(data[1])
+							eidx = int(data[2])
+							print("state[{}:{}]: {}".format(sidx, eidx, self._state[sidx:eidx]))
+					else:
+						print("please enter (n)ext, (b)ack, (c)ontinue, (d)isassemble, (p)rint, or (bp)reakpoint")
+				else:
+					self.step_forward()
+					for bp in bps:
+						if self._pos >= bp:
+							step = True
+							bps.remove(bp)
+		except KeyboardInterrupt:
+			pass
+		finally:
+			log.debug("decode cache: {!r}".format(self.decoded))
+			self._journal = None
@@ -0,0 +1,167 @@
+"""
+Superinstructions for IntCode.
+
+Compare-then-jump is the commonest control sequence in the day5 program: a
+LESS_THAN or EQUALS stores a flag that a JUMP_IF_TRUE or JUMP_IF_FALSE
+with an immediate target tests right after it, often with one unrelated
+ADD or MUL in between. A machine built with fuse=True finds these pairs
+and triples in its memory when it is created (or reset) and runs each one
+as a single dispatch. The jump and the middle instruction are checked
+against memory every time, so a program that rewrites them falls back to
+running them one by one. Sequences with a word the program stores into
+are not fused at all. A budget may be overrun by the up to two
+instructions a fused dispatch adds.
+
+With elide as well, the flag store of a pair is skipped when it is
+provably dead: the program does not store into its own code, has no jumps
+through memory, and reads the flag address nowhere but in fused jumps
+that are only reached from their compare. Those flag words are left
+stale, so elide is only for runs judged by their outputs rather than
+their final memory.
+
+python -m intcode.fusion day5.txt -i 5
+"""
+
+
+import sys
+import logging
+import functools
+from collections import Counter, defaultdict
+
+from .engine import IntCode, NAMES, ADD, MUL, LESS_THAN, EQUALS, load
+from .disasm import Graph
+
+
+log = logging.getLogger(__name__)
+
+
+# position-mode flag, immediate target; value is whether the jump is
+# taken on a true flag
+JUMP_WORDS = {1005: True, 1006: False}
+
+
+def _fusable(cmp, mid, jump):
+	if jump is None or jump.words[0] not in JUMP_WORDS or jump.params[0] != cmp.params[2]:
+		return False
+	if mid is None:
+		return True
+	# the ADD or MUL in between must leave the flag and the jump alone
+	dest = mid.params[2]
+	return dest != cmp.params[2] and not jump.pos <= dest < jump.end
+
+
+@functools.lru_cache(maxsize=16)
+def _find_words(words, elide):
+	return find(words, elide)
+
+
+def find_cached(data, elide=False):
+	"""
+	find(data, elide), shared with the machines created from or reset to
+	the same words recently; the result must not be changed.
+	"""
+	return _find_words(tuple(data), elide)
+
+
+def find(data, elide=False):
+	"""
+	Fusable sequences in data, by compare IP: (jump IP, jump word, dead,
+	taken when, middle), where the jump is taken when the comparison equals
+	taken when and middle is None or the word, destination, opcode and
+	modes of the ADD or MUL in between. dead, whether the flag store may be
+	skipped, is only ever set with elide.
+	"""
+	graph = Graph(data, sweep=True)
+	code = graph.code()
+	patched = set(addr for inst in graph.insts.values() for addr in inst.writes() if addr in code)
+	seqs = {}
+	for inst in graph.insts.values():
+		if inst.op not in (LESS_THAN, EQUALS):
+			continue
+		nxt = graph.insts.get(inst.end)
+		if _fusable(inst, None, nxt):
+			seqs[inst.pos] = (None, nxt)
+		elif nxt is not None and nxt.op in (ADD, MUL):
+			jump = graph.insts.get(nxt.end)
+			if _fusable(inst, nxt, jump):
+				seqs[inst.pos] = (nxt, jump)
+	for pos, (mid, jump) in list(seqs.items()):
+		if not patched.isdisjoint(range(pos, jump.end)):
+			del seqs[pos]
+	static = elide and not patched and not any(b.dynamic for b in graph.blocks.values())
+	# jumps of pairs only reached by falling through from their compare;
+	# a flag read by nothing else need not be stored
+	pairs = set(jump.pos for mid, jump in seqs.values() if mid is None and jump.pos not in graph.blocks)
+	readers = defaultdict(set)
+	for inst in graph.insts.values():
+		for addr in inst.reads():
+			readers[addr].add(inst.pos)
+	ret = {}
+	for pos, (mid, jump) in seqs.items():
+		flag = jump.params[0]
+		when = JUMP_WORDS[jump.words[0]]
+		if mid is None:
+			dead = static and readers[flag] <= pairs
+			ret[pos] = (jump.pos, jump.words[0], dead, when, None)
+		else:
+			ret[pos] = (jump.pos, jump.words[0], False, when, (
+				mid.words[0], mid.params[2], mid.op, mid.modes[0], mid.modes[1]
+			))
+	return ret
+
+
+def sequences(data, length):
+	"""
+	Counter of the opcode sequences of the given length that run straight
+	through, by name, over the static graph of data.
+	"""
+	ret = Counter()
+	for block in Graph(data, sweep=True).blocks.values():
+		ops = [NAMES[inst.op] for inst in block.insts]
+		for idx in range(len(ops) - length + 1):
+			ret[tuple(ops[idx:idx + length])] += 1
+	return ret
+
+
+def dispatches(data, inputs, fuse, elide=False):
+	"""
+	Run a copy of data on inputs; returns (outputs, instructions,
+	dispatches).
+	"""
+	machine = IntCode(list(data), count=True, fuse=fuse, elide=elide)
+	machine.feed(*inputs)
+	machine.run()
+	return list(machine.outputs), machine.steps, machine.steps - machine.merged
+
+
+def report(data, inputs, top=5, stream=None):
+	for length in (2, 3):
+		print("frequent {}-instruction sequences:".format(length), file=stream)
+		for seq, count in sequences(data, length).most_common(top):
+			print("{:>6} {}".format(count, " ".join(seq)), file=stream)
+	seqs = find(data, elide=True)
+	triples = sum(1 for entry in seqs.values() if entry[4] is not None)
+	print("{} fused pairs, {} fused triples, {} dead flag stores (with elide)".format(
+		len(seqs) - triples, triples, sum(1 for entry in seqs.values() if entry[2])
+	), file=stream)
+	out, steps, before = dispatches(data, inputs, False)
+	fout, fsteps, after = dispatches(data, inputs, True)
+	if fout != out or fsteps != steps:
+		raise RuntimeError("fused run differs: {} in {} steps, not {} in {}".format(fout, fsteps, out, steps))
+	print("{:,} instructions: {:,} dispatches unfused, {:,} fused ({:.1%} fewer)".format(
+		steps, before, after, (before - after) / (before or 1)
+	), file=stream)
+
+
+def main():
+	from argparse import ArgumentParser
+	parser = ArgumentParser()
+	parser.add_argument("path", type=str)
+	parser.add_argument("-i", "--inputs", type=int, nargs="*", default=[])
+	args = parser.parse_args()
+	report(load(args.path), args.inputs)
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Binary IntCode program images.
+
+An image is a 16 byte header (magic, format version, flags, word count)
+followed by the program as little-endian int64 words. Image maps the file
+read-only, so opening it costs the same whatever its size, words are only
+paged in when read, and every process that opens the same file shares the
+one copy in the OS page cache. Machines still copy the words they run into
+memory of their own.
+
+Images pickle as their path: a pool worker given an Image maps the file
+itself instead of receiving a copy of the program.
+
+python -m intcode.image day5.txt day5.icb
+"""
+
+
+import os
+import sys
+import mmap
+import struct
+from array import array
+
+
+MAGIC = b"ICIM"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+WORD = 8
+
+
+class ImageError(ValueError):
+	pass
+
+
+def is_image(path):
+	with open(path, "rb") as f:
+		return f.read(len(MAGIC)) == MAGIC
+
+
+def write(path, words):
+	"""
+	Write words to path as an image; raises OverflowError if a word does not
+	fit in 64 bits.
+	"""
+	body = array("q", words)
+	if sys.byteorder != "little":
+		body.byteswap()
+	with open(path, "wb") as f:
+		f.write(HEADER.pack(MAGIC, VERSION, 0, len(body)))
+		body.tofile(f)
+
+
+def convert(src, dst):
+	"""
+	Write the comma-separated program in src to dst as an image; returns
+	the number of words.
+	"""
+	from .engine import load
+	words = load(src)
+	write(dst, words)
+	return len(words)
+
+
+class Image(object):
+	"""
+	Read-only sequence of the words of an image file.
+	"""
+	__slots__ = ("path", "_file", "_map", "_words")
+
+	def __init__(self, path):
+		self.path = path
+		self._file = open(path, "rb")
+		try:
+			self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		except ValueError:
+			# mmap refuses empty files
+			self._file.close()
+			raise ImageError("{}: not an IntCode image".format(path))
+		try:
+			self._words = self._view()
+		except Exception:
+			self._map.close()
+			self._file.close()
+			raise
+
+	def _view(self):
+		if len(self._map) < HEADER.size:
+			raise ImageError("{}: not an IntCode image".format(self.path))
+		magic, version, _, count = HEADER.unpack_from(self._map)
+		if magic != MAGIC:
+			raise ImageError("{}: not an IntCode image".format(self.path))
+		if version != VERSION:
+			raise ImageError("{}: unsupported image version {}".format(self.path, version))
+		if len(self._map) < HEADER.size + count * WORD:
+			raise ImageError("{}: truncated image".format(self.path))
+		view = memoryview(self._map)[HEADER.size:HEADER.size + count * WORD]
+		if sys.byteorder == "little":
+			return view.cast("q")
+		# big-endian hosts pay for a swapped copy
+		ret = array("q", view.tobytes())
+		view.release()
+		ret.byteswap()
+		return ret
+
+	def __len__(self):
+		return len(self._words)
+
+	def __getitem__(self, idx):
+		if isinstance(idx, slice):
+			return self._words[idx].tolist()
+		return self._words[idx]
+
+	def __iter__(self):
+		return iter(self._words)
+
+	def tolist(self):
+		return self._words.tolist()
+
+	def close(self):
+		if isinstance(self._words, memoryview):
+			self._words.release()
+		self._map.close()
+		self._file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def __getstate__(self):
+		return os.path.abspath(self.path)
+
+	def __setstate__(self, path):
+		self.__init__(path)
+
+
+def main():
+	from argparse import ArgumentParser
+	parser = ArgumentParser()
+	parser.add_argument("src", type=str)
+	parser.add_argument("dst", type=str)
+	args = parser.parse_args()
+	count = convert(args.src, args.dst)
+	print("{}: {} words, {} bytes".format(args.dst, count, os.path.getsize(args.dst)))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+Memory backends for IntCode machines.
+
+A plain list of ints costs a pointer plus, for most values, an int object
+per word. compact memory packs words into an array('q') (8 bytes each) and
+is swapped for a list the first time a store does not fit in 64 bits.
+Memory that grows past SPARSE_GAP beyond its end switches to SparseMemory,
+which only allocates the pages that are actually written. Memory can also
+be a memoryview of int64 words, such as a private mapping of an
+intcode.shared.SharedImage; a store that does not fit one raises
+ValueError rather than OverflowError. Forked machines run on PagedMemory,
+whose pages are shared between them until one writes to a page; each
+access goes through Python code, so it runs several times slower than a
+list.
+"""
+
+
+import itertools
+from array import array
+
+
+# growth larger than this many words goes to sparse pages instead of
+# extending the dense memory
+SPARSE_GAP = 1 << 16
+PAGE_BITS = 6
+PAGE_SIZE = 1 << PAGE_BITS
+PAGE_MASK = PAGE_SIZE - 1
+
+
+def allocate(image, compact=False):
+	if not compact:
+		return list(image)
+	try:
+		return array("q", image)
+	except OverflowError:
+		return list(image)
+
+
+def widen(data):
+	"""
+	Memory holding the same words as data that accepts any int.
+	"""
+	if isinstance(data, (SparseMemory, PagedMemory)):
+		return data
+	return list(data)
+
+
+def grow(data, size):
+	"""
+	Memory holding data extended with zeros to size words. Small gaps extend
+	data in place; large ones return a SparseMemory over it.
+	"""
+	if size <= len(data):
+		return data
+	if isinstance(data, memoryview):
+		data = array("q", data)
+	if isinstance(data, SparseMemory):
+		data.size = size
+		return data
+	if isinstance(data, PagedMemory):
+		data.resize(size)
+		return data
+	if size - len(data) > SPARSE_GAP:
+		return SparseMemory(data, size)
+	data.extend([0] * (size - len(data)))
+	return data
+
+
+class SparseMemory(object):
+	"""
+	Dense base memory followed by zero-filled pages that are only allocated
+	when written.
+	"""
+	__slots__ = ("base", "pages", "size")
+
+	def __init__(self, base, size):
+		self.base = base
+		self.pages = {}
+		self.size = size
+
+	def __len__(self):
+		return self.size
+
+	def _index(self, idx):
+		if idx < 0:
+			idx += self.size
+		if not 0 <= idx < self.size:
+			raise IndexError("memory index out of range")
+		return idx
+
+	def __getitem__(self, idx):
+		if isinstance(idx, slice):
+			return [self[i] for i in range(*idx.indices(self.size))]
+		idx = self._index(idx)
+		if idx < len(self.base):
+			return self.base[idx]
+		page = self.pages.get(idx // PAGE_SIZE)
+		if page is None:
+			return 0
+		return page[idx % PAGE_SIZE]
+
+	def __setitem__(self, idx, value):
+		if isinstance(idx, slice):
+			for i, v in zip(range(*idx.indices(self.size)), value):
+				self[i] = v
+			return
+		idx = self._index(idx)
+		if idx < len(self.base):
+			try:
+				self.base[idx] = value
+			except OverflowError:
+				self.base = list(self.base)
+				self.base[idx] = value
+			return
+		key = idx // PAGE_SIZE
+		page = self.pages.get(key)
+		if page is None:
+			page = self.pages[key] = array("q", bytes(8 * PAGE_SIZE))
+		try:
+			page[idx % PAGE_SIZE] = value
+		except OverflowError:
+			page = self.pages[key] = list(page)
+			page[idx % PAGE_SIZE] = value
+
+	def __iter__(self):
+		for idx in range(self.size):
+			yield self[idx]
+
+
+
+class PagedMemory(object):
+	"""
+	Memory in pages of PAGE_SIZE words that may be shared with other
+	machines. Shared pages are tuples, which nothing writes to; the first
+	store into one replaces it with a private list for this memory only.
+	"""
+	__slots__ = ("pages", "size")
+
+	def __init__(self, pages, size):
+		self.pages = list(pages)
+		self.size = size
+
+	@classmethod
+	def of(cls, data):
+		return cls(
+			[tuple(data[start:start + PAGE_SIZE]) for start in range(0, len(data), PAGE_SIZE)], len(data)
+		)
+
+	def __len__(self):
+		return self.size
+
+	def __getitem__(self, idx):
+		# the common case first: a word at a non-negative address; past the
+		# end, either its page or the word in the last page is missing
+		try:
+			if idx >= 0:
+				return self.pages[idx >> PAGE_BITS][idx & PAGE_MASK]
+		except TypeError:
+			return [self[i] for i in range(*idx.indices(self.size))]
+		idx += self.size
+		if idx < 0:
+			raise IndexError("memory index out of range")
+		return self.pages[idx >> PAGE_BITS][idx & PAGE_MASK]
+
+	def __setitem__(self, idx, value):
+		if isinstance(idx, slice):
+			for i, v in zip(range(*idx.indices(self.size)), value):
+				self[i] = v
+			return
+		if idx < 0:
+			idx += self.size
+			if idx < 0:
+				raise IndexError("memory index out of range")
+		key = idx >> PAGE_BITS
+		page = self.pages[key]
+		if type(page) is tuple:
+			page = self.pages[key] = list(page)
+		page[idx & PAGE_MASK] = value
+
+	def __iter__(self):
+		return itertools.chain.from_iterable(self.pages)
+
+	def freeze(self):
+		"""
+		Tuple of the pages, each of which is shared from now on; this memory
+		copies a page again before its next write to it.
+		"""
+		pages = self.pages
+		for key, page in enumerate(pages):
+			if type(page) is not tuple:
+				pages[key] = tuple(page)
+		return tuple(pages)
+
+	def resize(self, size):
+		"""
+		Extend with zeros to size words.
+		"""
+		if self.pages and len(self.pages[-1]) < PAGE_SIZE and size > self.size:
+			fill = min(PAGE_SIZE - len(self.pages[-1]), size - self.size)
+			self.pages[-1] = tuple(self.pages[-1]) + (0,) * fill
+			self.size += fill
+		while self.size < size:
+			count = min(PAGE_SIZE, size - self.size)
+			self.pages.append((0,) * count)
+			self.size += count
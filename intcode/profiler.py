@@ -0,0 +1,105 @@
+"""
+Instruction-level profile of an IntCode run.
+
+A machine built with profile=True counts executions per IP and per opcode
+and times every dynamic basic block: the run of instructions from one
+control transfer (jump, input, output) to the next. Time spent waiting for
+input is not charged to any block.
+"""
+
+
+import bisect
+import time
+from collections import defaultdict
+
+from .engine import NAMES
+
+
+class Profile(object):
+	__slots__ = ("ips", "ops", "codes", "blocks")
+
+	def __init__(self):
+		self.ips = defaultdict(int)
+		self.ops = defaultdict(int)
+		# IP -> opcodes executed there, which code patches can make several
+		self.codes = defaultdict(set)
+		# block start -> [entries, seconds]
+		self.blocks = {}
+
+	def close(self, start, since):
+		"""
+		Charge the block at start with the time since; returns now.
+		"""
+		now = time.perf_counter()
+		entry = self.blocks.get(start)
+		if entry is None:
+			self.blocks[start] = [1, now - since]
+		else:
+			entry[0] += 1
+			entry[1] += now - since
+		return now
+
+	def clear(self):
+		self.ips.clear()
+		self.ops.clear()
+		self.codes.clear()
+		self.blocks.clear()
+
+	@property
+	def total(self):
+		return sum(self.ips.values())
+
+	def hot(self, top=10):
+		"""
+		The top (ip, count) pairs, most executed first.
+		"""
+		return sorted(self.ips.items(), key=lambda item: (-item[1], item[0]))[:top]
+
+	def _block_of(self, ip, starts):
+		idx = bisect.bisect_right(starts, ip) - 1
+		return starts[idx] if idx >= 0 else None
+
+	def _describe(self, ip):
+		return "/".join(NAMES[op] for op in sorted(self.codes.get(ip, ()))) or "?"
+
+	def report(self, top=20, stream=None):
+		"""
+		Print the hottest instructions, the opcode mix and the slowest
+		blocks.
+		"""
+		total = self.total or 1
+		print("{:,} instructions".format(self.total), file=stream)
+		print("hot spots:", file=stream)
+		for ip, count in self.hot(top):
+			print("{:>8} {:<14} {:>12,} {:>6.1%}".format(
+				ip, self._describe(ip), count, count / total
+			), file=stream)
+		print("opcodes:", file=stream)
+		for op, count in sorted(self.ops.items(), key=lambda item: -item[1]):
+			print("{:>8} {:<14} {:>12,} {:>6.1%}".format(
+				op, NAMES[op], count, count / total
+			), file=stream)
+		print("blocks:", file=stream)
+		blocks = sorted(self.blocks.items(), key=lambda item: -item[1][1])[:top]
+		for start, (entries, seconds) in blocks:
+			print("{:>8} {:>12,} entries {:>12.6f}s".format(start, entries, seconds), file=stream)
+
+	def collapsed(self, name="intcode"):
+		"""
+		Lines of collapsed stacks (name;block;instruction count), as read by
+		flamegraph.pl and speedscope. Instructions are grouped under the
+		nearest block start at or below them.
+		"""
+		starts = sorted(self.blocks)
+		ret = []
+		for ip, count in sorted(self.ips.items()):
+			block = self._block_of(ip, starts)
+			ret.append("{};block {};{} {} {}".format(
+				name, block if block is not None else "?", ip, self._describe(ip), count
+			))
+		return ret
+
+	def write_collapsed(self, path, name="intcode"):
+		with open(path, "w") as f:
+			for line in self.collapsed(name):
+				f.write(line + "\n")
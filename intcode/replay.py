@@ -0,0 +1,256 @@
+"""
+Record and replay the I/O of IntCode machines.
+
+A Recorder appends every value a machine consumes or produces, with the
+instruction count at the end of the run() that did so, to a binary log.
+A machine's run is a pure function of its program and its inputs, so
+feeding the recorded inputs to a single fresh machine reproduces it
+exactly, without the amplifiers, processes or queues around it.
+
+The log is an 8 byte header followed by records of a kind byte, a machine
+id, an instruction count and a value (little-endian "<BHQq"). A NAME
+record gives the machine its name and is followed by that many bytes of
+UTF-8. Values that do not fit in 64 bits set BIG in the kind and are
+followed by value bytes of signed little-endian int. Records are buffered
+and written by flush() in one append, so concurrent recorders on one file
+interleave whole flushes; ids are only meaningful after the NAME record
+that binds them.
+
+python -m intcode.replay day7.txt run.icr [-m NAME] [-P]
+"""
+
+
+import os
+import sys
+import struct
+import logging
+
+from .engine import IntCode, Interrupted, NEEDS_INPUT, OUTPUT, HALTED, load
+
+
+log = logging.getLogger(__name__)
+
+
+MAGIC = b"ICRL"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+RECORD = struct.Struct("<BHQq")
+
+NAME = 0
+INPUT = 1
+OUTPUT_VALUE = 2
+END = 3
+BIG = 0x80
+
+STATUSES = (None, NEEDS_INPUT, OUTPUT, HALTED)
+_INT64 = 1 << 63
+
+
+class ReplayError(ValueError):
+	pass
+
+
+class Recorder(object):
+	"""
+	Append-only log of machine I/O at path. Pickles as its path, so pool
+	workers can share one.
+	"""
+	def __init__(self, path):
+		self.path = path
+		self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+		if os.fstat(self._fd).st_size == 0:
+			os.write(self._fd, HEADER.pack(MAGIC, VERSION, 0))
+		self._buf = bytearray()
+		self._ids = 0
+
+	def _record(self, kind, mid, steps, value):
+		if -_INT64 <= value < _INT64:
+			self._buf += RECORD.pack(kind, mid, steps, value)
+			return
+		raw = value.to_bytes((value.bit_length() + 8) // 8, "little", signed=True)
+		self._buf += RECORD.pack(kind | BIG, mid, steps, len(raw))
+		self._buf += raw
+
+	def machine(self, name):
+		"""
+		Id for a new machine called name.
+		"""
+		mid = self._ids
+		self._ids = (self._ids + 1) & 0xffff
+		raw = name.encode("utf-8")
+		self._buf += RECORD.pack(NAME, mid, 0, len(raw))
+		self._buf += raw
+		return mid
+
+	def input(self, mid, steps, value):
+		self._record(INPUT, mid, steps, value)
+
+	def output(self, mid, steps, value):
+		self._record(OUTPUT_VALUE, mid, steps, value)
+
+	def end(self, mid, steps, status):
+		self._record(END, mid, steps, STATUSES.index(status))
+
+	def run(self, machine, mid, **kwargs):
+		"""
+		machine.run(**kwargs), logging the inputs it took and the outputs it
+		made; the machine must be built with count.
+		"""
+		pending = list(machine.inputs)
+		produced = len(machine.outputs)
+		try:
+			return machine.run(**kwargs)
+		finally:
+			for value in pending[:len(pending) - len(machine.inputs)]:
+				self.input(mid, machine.steps, value)
+			for value in list(machine.outputs)[produced:]:
+				self.output(mid, machine.steps, value)
+
+	def flush(self):
+		if self._buf:
+			os.write(self._fd, bytes(self._buf))
+			self._buf.clear()
+
+	def close(self):
+		self.flush()
+		os.close(self._fd)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def __getstate__(self):
+		return os.path.abspath(self.path)
+
+	def __setstate__(self, path):
+		self.__init__(path)
+
+
+class Track(object):
+	"""
+	Recorded I/O of one machine: inputs and outputs are lists of
+	(instruction count, value). status is None if the run was interrupted
+	(by a budget, say) or never ended.
+	"""
+	__slots__ = ("name", "inputs", "outputs", "steps", "status")
+
+	def __init__(self, name):
+		self.name = name
+		self.inputs = []
+		self.outputs = []
+		self.steps = None
+		self.status = None
+
+
+def read(path):
+	"""
+	Tracks of every machine in the log at path, in the order they were
+	named.
+	"""
+	with open(path, "rb") as f:
+		raw = f.read()
+	if len(raw) < HEADER.size:
+		raise ReplayError("{}: not an IntCode replay log".format(path))
+	magic, version, _ = HEADER.unpack_from(raw)
+	if magic != MAGIC:
+		raise ReplayError("{}: not an IntCode replay log".format(path))
+	if version != VERSION:
+		raise ReplayError("{}: unsupported log version {}".format(path, version))
+	tracks = []
+	bound = {}
+	pos = HEADER.size
+	while pos < len(raw):
+		if pos + RECORD.size > len(raw):
+			raise ReplayError("{}: truncated record at {}".format(path, pos))
+		kind, mid, steps, value = RECORD.unpack_from(raw, pos)
+		pos += RECORD.size
+		if kind == NAME or kind & BIG:
+			extra = raw[pos:pos + value]
+			if len(extra) != value:
+				raise ReplayError("{}: truncated record at {}".format(path, pos))
+			pos += value
+			if kind == NAME:
+				bound[mid] = Track(extra.decode("utf-8"))
+				tracks.append(bound[mid])
+				continue
+			kind &= ~BIG
+			value = int.from_bytes(extra, "little", signed=True)
+		track = bound.get(mid)
+		if track is None:
+			raise ReplayError("{}: record for unnamed machine {}".format(path, mid))
+		if kind == INPUT:
+			track.inputs.append((steps, value))
+		elif kind == OUTPUT_VALUE:
+			track.outputs.append((steps, value))
+		elif kind == END:
+			track.steps = steps
+			track.status = STATUSES[value]
+		else:
+			raise ReplayError("{}: unknown record kind {}".format(path, kind))
+	return tracks
+
+
+def replay(image, track, **kwargs):
+	"""
+	Run a fresh machine on image with the recorded inputs of track; returns
+	(machine, None) if it reproduces the recorded outputs and instruction
+	count, else (machine, description of the first difference). kwargs go
+	to IntCode, e.g. profile=True.
+	"""
+	machine = IntCode(list(image), count=True, **kwargs)
+	machine.feed(*[value for _, value in track.inputs])
+	# an interrupted run is replayed up to the same instruction
+	budget = track.steps if track.status is None else None
+	try:
+		status = machine.run(budget=budget)
+	except Interrupted:
+		status = None
+	outputs = list(machine.outputs)
+	expected = [value for _, value in track.outputs]
+	for idx, (got, want) in enumerate(zip(outputs, expected)):
+		if got != want:
+			return machine, "output {} is {}, recorded {} (at {} instructions)".format(
+				idx, got, want, track.outputs[idx][0]
+			)
+	if len(outputs) != len(expected):
+		return machine, "{} outputs, recorded {}".format(len(outputs), len(expected))
+	if track.steps is not None and machine.steps != track.steps:
+		return machine, "{} instructions, recorded {}".format(machine.steps, track.steps)
+	if track.status is not None and status != track.status:
+		return machine, "ended {}, recorded {}".format(status, track.status)
+	return machine, None
+
+
+def main():
+	from argparse import ArgumentParser
+	parser = ArgumentParser()
+	parser.add_argument("program", type=str)
+	parser.add_argument("log", type=str)
+	parser.add_argument("-m", "--machine", type=str, default=None)
+	parser.add_argument("-P", "--profile", default=False, action="store_true")
+	args = parser.parse_args()
+	tracks = read(args.log)
+	if args.machine is None:
+		for track in tracks:
+			print("{}: {} inputs, {} outputs, {} instructions, {}".format(
+				track.name, len(track.inputs), len(track.outputs), track.steps,
+				track.status or "interrupted"
+			))
+		return 0
+	matches = [track for track in tracks if track.name == args.machine]
+	if not matches:
+		print("no machine {} in {}".format(args.machine, args.log), file=sys.stderr)
+		return 1
+	if len(matches) > 1:
+		log.warning("{} machines named {}; replaying the first".format(len(matches), args.machine))
+	machine, diff = replay(load(args.program), matches[0], profile=args.profile)
+	print("{}: {}".format(args.machine, diff or "reproduced"))
+	if args.profile:
+		machine.profile.report()
+	return 0 if diff is None else 1
+
+
+if __name__ == "__main__":
+	sys.exit(main())
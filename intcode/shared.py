@@ -0,0 +1,188 @@
+"""
+IntCode program images in shared memory.
+
+A SharedImage copies a program once into a multiprocessing.shared_memory
+segment as native int64 words. It pickles as the segment name, so pool
+workers given one attach to the same pages instead of each unpickling a
+copy of the program, and every worker sees them through a read-only view.
+private(image) maps the segment copy-on-write for one machine: the OS
+copies a page for that machine the first time it writes to it, and every
+other page stays the one shared copy. Worker start-up cost and resident
+memory then stay about flat in the number of workers. Machines run on
+int64 memory, as with compact, until a word does not fit; they then carry
+on with a private list of the words.
+
+The process that made the image owns the segment and must unlink() it
+when the workers are done. shared_memory needs Python 3.8; SharedImage
+raises ImportError without it.
+
+python -m intcode.shared day7.txt -w 4
+"""
+
+
+import os
+import sys
+import mmap
+from array import array
+
+try:
+	from multiprocessing import shared_memory
+except ImportError:
+	shared_memory = None
+
+
+WORD = 8
+# where POSIX shared memory segments show up as files
+SHM_DIR = "/dev/shm"
+
+
+class SharedImage(object):
+	"""
+	Read-only sequence of the words of a program in shared memory; raises
+	OverflowError if a word does not fit in 64 bits.
+	"""
+	__slots__ = ("name", "count", "owner", "_shm", "words")
+
+	def __init__(self, data):
+		if shared_memory is None:
+			raise ImportError("intcode.shared needs Python 3.8 or later")
+		words = array("q", data)
+		# shared_memory refuses empty segments
+		self._shm = shared_memory.SharedMemory(create=True, size=max(WORD, len(words) * WORD))
+		self._shm.buf[:len(words) * WORD] = words.tobytes()
+		self.owner = True
+		self._attach(self._shm.name, len(words))
+
+	@classmethod
+	def attach(cls, name, count):
+		"""
+		Image of a segment made by a process this one was not started from
+		by multiprocessing; unlike unpickling, this also keeps the resource
+		tracker of this process from unlinking the segment when it exits.
+		"""
+		if shared_memory is None:
+			raise ImportError("intcode.shared needs Python 3.8 or later")
+		ret = cls.__new__(cls)
+		ret._shm = shared_memory.SharedMemory(name=name)
+		if os.name == "posix":
+			from multiprocessing import resource_tracker
+			# the tracker knows POSIX segments by their name with the slash
+			resource_tracker.unregister("/" + ret._shm.name, "shared_memory")
+		ret.owner = False
+		ret._attach(name, count)
+		return ret
+
+	def _attach(self, name, count):
+		self.name = name
+		self.count = count
+		self.words = self._shm.buf[:count * WORD].cast("q").toreadonly()
+
+	def __len__(self):
+		return self.count
+
+	def __getitem__(self, idx):
+		if isinstance(idx, slice):
+			return self.words[idx].tolist()
+		return self.words[idx]
+
+	def __iter__(self):
+		return iter(self.words)
+
+	def tolist(self):
+		return self.words.tolist()
+
+	def close(self):
+		if self.words is not None:
+			self.words.release()
+			self.words = None
+			self._shm.close()
+
+	def __del__(self):
+		# the view has to go before the segment's own finalizer unmaps it
+		self.close()
+
+	def unlink(self):
+		"""
+		Close the image and free the segment; only for the process that made
+		it.
+		"""
+		self.close()
+		if self.owner:
+			self._shm.unlink()
+			self.owner = False
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.unlink()
+
+	def __getstate__(self):
+		return self.name, self.count
+
+	def __setstate__(self, state):
+		if shared_memory is None:
+			raise ImportError("intcode.shared needs Python 3.8 or later")
+		name, count = state
+		# pool workers share the resource tracker of the process that made
+		# the segment, which keeps it registered until that one unlinks it
+		self._shm = shared_memory.SharedMemory(name=name)
+		self.owner = False
+		self._attach(name, count)
+
+
+def private(image):
+	"""
+	Memory for one machine to run image in: a copy-on-write mapping of a
+	SharedImage, or a private copy of anything else.
+	"""
+	if not isinstance(image, SharedImage):
+		return list(image)
+	# reopen the segment by name to map it privately; where segments are
+	# not files (Windows, macOS) machines get a copy instead
+	try:
+		fd = os.open(os.path.join(SHM_DIR, image.name.lstrip("/")), os.O_RDONLY)
+	except OSError:
+		return array("q", image.words)
+	try:
+		mapped = mmap.mmap(fd, image._shm.size, access=mmap.ACCESS_COPY)
+	finally:
+		os.close(fd)
+	# the view keeps the mapping alive, and unmaps it when it goes
+	return memoryview(mapped)[:len(image) * WORD].cast("q")
+
+
+def _probe(image):
+	import os
+	from .engine import IntCode
+	# an amplifier's inputs; any program that asks for more just stops
+	machine = IntCode(private(image))
+	machine.feed(0, 0)
+	machine.run()
+	return os.getpid(), machine.status, type(machine.state).__name__
+
+
+def main():
+	import multiprocessing
+	from argparse import ArgumentParser
+	from time import perf_counter
+	from .engine import load
+	parser = ArgumentParser()
+	parser.add_argument("path", type=str)
+	parser.add_argument("-w", "--workers", type=int, default=4)
+	args = parser.parse_args()
+	data = load(args.path)
+	with SharedImage(data) as image:
+		start = perf_counter()
+		with multiprocessing.Pool(args.workers) as pool:
+			results = pool.map(_probe, [image] * args.workers)
+		print("{} words in {}; {} workers in {:.3f}s".format(
+			len(image), image.name, args.workers, perf_counter() - start
+		))
+		for pid, status, kind in results:
+			print("worker {}: {} on {} memory".format(pid, status, kind))
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+Paged snapshots of IntCode memory.
+
+Memory is frozen into fixed-size pages (tuples). A snapshot taken from a
+machine that started from an earlier snapshot reuses every page that has
+not changed since, so a tree of stored snapshots only pays for the pages
+each branch actually wrote. Machines restored from a snapshot run on
+intcode.memory.PagedMemory over its pages, and only copy the pages they
+write to.
+"""
+
+
+from .memory import PagedMemory, PAGE_SIZE
+
+
+class Snapshot(object):
+	__slots__ = ("pages", "ip")
+
+	def __init__(self, pages, ip):
+		self.pages = pages
+		self.ip = ip
+
+	def __len__(self):
+		return sum(len(page) for page in self.pages)
+
+	def memory(self):
+		"""
+		Copy-on-write memory over the pages.
+		"""
+		return PagedMemory(self.pages, len(self))
+
+	def shared(self, other):
+		"""
+		Number of pages this snapshot shares with other.
+		"""
+		ids = set(map(id, other.pages))
+		return sum(1 for page in self.pages if id(page) in ids)
+
+
+def take(data, ip, base=None):
+	"""
+	Freeze data, reusing the pages of base that are unchanged.
+	"""
+	if isinstance(data, PagedMemory):
+		# pages it has not written to are still the ones it shares
+		return Snapshot(data.freeze(), ip)
+	basepages = base.pages if base is not None else ()
+	pages = []
+	for idx, start in enumerate(range(0, len(data), PAGE_SIZE)):
+		page = tuple(data[start:start + PAGE_SIZE])
+		if idx < len(basepages) and basepages[idx] == page:
+			page = basepages[idx]
+		pages.append(page)
+	return Snapshot(tuple(pages), ip)
@@ -0,0 +1,195 @@
+"""
+Symbolic evaluation of straight-line IntCode programs.
+
+Cells holding a symbol are tracked as integer polynomials over the
+symbols, so one run of an ADD/MUL program yields every output as a closed
+form instead of a number.
+"""
+
+
+import logging
+
+from .engine import IntCodeError, ADD, MUL, HALT, IMMEDIATE, DECODE, NAMES
+
+
+log = logging.getLogger(__name__)
+
+
+class NotStraightLine(IntCodeError):
+	pass
+
+
+class Poly(object):
+	"""
+	Integer polynomial; terms maps a tuple of exponents (one per variable)
+	to its coefficient.
+	"""
+	def __init__(self, nvars, terms=None):
+		self.nvars = nvars
+		self.terms = {k: c for k, c in (terms or {}).items() if c != 0}
+
+	@classmethod
+	def var(cls, idx, nvars):
+		exps = [0] * nvars
+		exps[idx] = 1
+		return cls(nvars, {tuple(exps): 1})
+
+	@classmethod
+	def const(cls, value, nvars):
+		return cls(nvars, {(0,) * nvars: value})
+
+	def _coerce(self, other):
+		if isinstance(other, Poly):
+			return other
+		return Poly.const(other, self.nvars)
+
+	def __add__(self, other):
+		other = self._coerce(other)
+		terms = dict(self.terms)
+		for k, c in other.terms.items():
+			terms[k] = terms.get(k, 0) + c
+		return Poly(self.nvars, terms)
+
+	__radd__ = __add__
+
+	def __mul__(self, other):
+		other = self._coerce(other)
+		terms = {}
+		for k1, c1 in self.terms.items():
+			for k2, c2 in other.terms.items():
+				k = tuple(a + b for a, b in zip(k1, k2))
+				terms[k] = terms.get(k, 0) + c1 * c2
+		return Poly(self.nvars, terms)
+
+	__rmul__ = __mul__
+
+	def is_constant(self):
+		return all(not any(k) for k in self.terms)
+
+	def constant(self):
+		return self.terms.get((0,) * self.nvars, 0)
+
+	def degree(self, idx):
+		return max((k[idx] for k in self.terms), default=0)
+
+	def __call__(self, *values):
+		total = 0
+		for k, c in self.terms.items():
+			term = c
+			for value, exp in zip(values, k):
+				term *= value ** exp
+			total += term
+		return total
+
+	def substitute(self, idx, value):
+		terms = {}
+		for k, c in self.terms.items():
+			nk = list(k)
+			nk[idx] = 0
+			nk = tuple(nk)
+			terms[nk] = terms.get(nk, 0) + c * value ** k[idx]
+		return Poly(self.nvars, terms)
+
+	def __repr__(self):
+		if not self.terms:
+			return "0"
+		parts = []
+		for k, c in sorted(self.terms.items(), reverse=True):
+			names = "*".join(
+				"x{}".format(i) if e == 1 else "x{}^{}".format(i, e)
+				for i, e in enumerate(k) if e
+			)
+			if not names:
+				parts.append(str(c))
+			elif c == 1:
+				parts.append(names)
+			else:
+				parts.append("{}*{}".format(c, names))
+		return " + ".join(parts)
+
+
+class _Unknown(object):
+	def __repr__(self):
+		return "?"
+
+
+# value loaded through a symbolic address; harmless unless something uses it
+UNKNOWN = _Unknown()
+
+
+def _concrete(value, what, pos):
+	if value is UNKNOWN:
+		raise NotStraightLine("Unknown {} at {}".format(what, pos))
+	if isinstance(value, Poly):
+		if not value.is_constant():
+			raise NotStraightLine("Symbolic {} at {}".format(what, pos))
+		return value.constant()
+	return value
+
+
+def _load(mem, addr, pos):
+	if isinstance(addr, Poly) and not addr.is_constant():
+		return UNKNOWN
+	return mem[_concrete(addr, "address", pos)]
+
+
+def evaluate(data, symbols):
+	"""
+	Run data with the cells at the addresses in symbols replaced by
+	variables x0, x1, ... (in that order). Returns the final memory, where
+	cells that depend on a variable hold a Poly and cells loaded through a
+	symbolic address hold UNKNOWN.
+	"""
+	mem = list(data)
+	nvars = len(symbols)
+	for idx, addr in enumerate(symbols):
+		mem[addr] = Poly.var(idx, nvars)
+	pos = 0
+	while pos < len(mem):
+		opm = _concrete(mem[pos], "instruction", pos)
+		try:
+			op, f, s = DECODE[opm]
+		except KeyError:
+			raise IntCodeError("Invalid instruction {} at {}".format(opm, pos))
+		if op == HALT:
+			break
+		if op not in (ADD, MUL):
+			raise NotStraightLine("{} at {}".format(NAMES[op], pos))
+		x, y, z = mem[pos + 1:pos + 4]
+		z = _concrete(z, "write address", pos)
+		a = x if f == IMMEDIATE else _load(mem, x, pos)
+		b = y if s == IMMEDIATE else _load(mem, y, pos)
+		if a is UNKNOWN or b is UNKNOWN:
+			value = UNKNOWN
+		else:
+			value = a + b if op == ADD else a * b
+			if isinstance(value, Poly) and value.is_constant():
+				value = value.constant()
+		mem[z] = value
+		pos += 4
+	return mem
+
+
+def solve(poly, target, space=100):
+	"""
+	Yield every (x0, x1) in range(space) ** 2 with poly(x0, x1) == target.
+	"""
+	if poly is UNKNOWN:
+		raise NotStraightLine("Output loaded through a symbolic address")
+	for x0 in range(space):
+		p = poly.substitute(0, x0) if isinstance(poly, Poly) else poly
+		if not isinstance(p, Poly) or p.is_constant():
+			value = p.constant() if isinstance(p, Poly) else p
+			if value == target:
+				for x1 in range(space):
+					yield x0, x1
+			continue
+		if p.degree(1) == 1:
+			c1 = p.terms.get((0, 1), 0)
+			rem = target - p.constant()
+			if rem % c1 == 0 and 0 <= rem // c1 < space:
+				yield x0, rem // c1
+		else:
+			for x1 in range(space):
+				if p(0, x1) == target:
+					yield x0, x1
@@ -0,0 +1,98 @@
+"""
+Code and data tracking for IntCode memory.
+
+A machine built with track=True marks every word it executes (opcode and
+parameters) and every address it writes in two bitsets. A program is
+self-modifying when the two overlap: it wrote an address that was, or later
+became, part of an executed instruction.
+"""
+
+
+class Bitset(object):
+	"""
+	Fixed-size set of addresses packed eight to a byte.
+	"""
+	__slots__ = ("size", "bits")
+
+	def __init__(self, size):
+		self.size = size
+		self.bits = bytearray((size + 7) >> 3)
+
+	def add(self, addr):
+		if 0 <= addr < self.size:
+			self.bits[addr >> 3] |= 1 << (addr & 7)
+
+	def mark(self, start, stop):
+		for addr in range(max(start, 0), min(stop, self.size)):
+			self.bits[addr >> 3] |= 1 << (addr & 7)
+
+	def __contains__(self, addr):
+		return 0 <= addr < self.size and bool(self.bits[addr >> 3] & (1 << (addr & 7)))
+
+	def __bool__(self):
+		return any(self.bits)
+
+	def __len__(self):
+		return bin(int.from_bytes(self.bits, "little")).count("1")
+
+	def __iter__(self):
+		for idx, byte in enumerate(self.bits):
+			while byte:
+				low = byte & -byte
+				yield (idx << 3) + low.bit_length() - 1
+				byte ^= low
+
+	def __and__(self, other):
+		ret = Bitset(min(self.size, other.size))
+		ret.bits[:] = bytes(a & b for a, b in zip(self.bits, other.bits))
+		return ret
+
+	def clear(self):
+		self.bits[:] = bytes(len(self.bits))
+
+	def ranges(self):
+		"""
+		Yield (start, stop) for every run of consecutive addresses.
+		"""
+		start = prev = None
+		for addr in self:
+			if prev is not None and addr == prev + 1:
+				prev = addr
+				continue
+			if start is not None:
+				yield start, prev + 1
+			start = prev = addr
+		if start is not None:
+			yield start, prev + 1
+
+
+class Tracker(object):
+	"""
+	Executed and written addresses of one machine.
+	"""
+	__slots__ = ("executed", "written")
+
+	def __init__(self, size):
+		self.executed = Bitset(size)
+		self.written = Bitset(size)
+
+	def patched(self):
+		"""
+		Addresses that were both written and executed.
+		"""
+		return self.executed & self.written
+
+	@property
+	def self_modifying(self):
+		return bool(self.patched())
+
+	def clear(self):
+		self.executed.clear()
+		self.written.clear()
+
+	def report(self, stream=None):
+		print("executed: {}".format(list(self.executed.ranges())), file=stream)
+		print("written: {} addresses".format(len(self.written)), file=stream)
+		print("self-modifying: {}".format(
+			list(self.patched().ranges()) if self.self_modifying else "no"
+		), file=stream)
@@ -0,0 +1,68 @@
+"""
+Tests for the asyncio machine network runtime.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import itertools
+import unittest
+
+import day7
+from intcode import load
+from intcode.aio import Network
+
+from .test_replay import FEEDBACK
+
+
+class TestNetwork(unittest.TestCase):
+	def test_feedback_example(self):
+		n, stats = day7.run_network(FEEDBACK, "98765")
+		self.assertEqual(n, 139629729)
+		self.assertEqual(len(stats), 5)
+		self.assertTrue(all(stat.steps for stat in stats.values()))
+
+	def test_day7_part2(self):
+		data = load("day7.txt")
+		best = max(
+			(day7.run_network(data, phases)[0], "".join(phases))
+			for phases in itertools.permutations("56789")
+		)
+		self.assertEqual(best, (5406484, "57986"))
+		self.assertEqual(day7.run_chain(data, "57986"), 5406484)
+
+	def test_chain(self):
+		data = load("day7.txt")
+		names = list("ABCDE")
+		net = Network()
+		for name, phase in zip(names, (0, 3, 1, 2, 4)):
+			net.add(name, data, inputs=[phase])
+		net.chain(names)
+		net.feed("A", 0)
+		stats = net.run()
+		self.assertEqual(stats["E"].outputs, [45730])
+		self.assertEqual([len(stats[name].outputs) for name in names], [1] * 5)
+
+	def test_deadlock_stops(self):
+		# two machines that each wait for the other before writing
+		echo = [3, 9, 4, 9, 1105, 1, 0, 99, 0, 0]
+		net = Network()
+		net.add("a", echo)
+		net.add("b", echo)
+		net.ring(["a", "b"])
+		stats = net.run()
+		self.assertEqual(stats["a"].outputs, [])
+		self.assertEqual(stats["b"].outputs, [])
+		# one that forwards a single value and halts leaves the other
+		# waiting for its next one
+		net = Network()
+		net.add("a", [3, 5, 4, 5, 99, 0])
+		net.add("b", echo)
+		net.ring(["a", "b"])
+		net.feed("a", 7)
+		stats = net.run()
+		self.assertEqual((stats["a"].outputs, stats["b"].outputs), ([7], [7]))
+
+
+if __name__ == "__main__":
+	unittest.main()
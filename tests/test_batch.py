@@ -0,0 +1,107 @@
+"""
+Tests for lockstep batch evaluation against scalar IntCode runs.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import unittest
+
+import day7
+from intcode import IntCode, IntCodeError, HALTED, NEEDS_INPUT, load
+from intcode import batch
+
+from .test_engine import COMPARE8
+
+
+def scalar(program, inputs=(), pokes=()):
+	"""
+	(status, outputs, memory) of one IntCode run, status None on an error.
+	"""
+	machine = IntCode(list(program))
+	for addr, value in pokes:
+		machine.state[addr] = value
+	machine.feed(*inputs)
+	try:
+		status = machine.run()
+	except IntCodeError:
+		status = None
+	return status, machine.drain(), list(machine.state)
+
+
+@unittest.skipIf(batch.numpy is None, "needs numpy")
+class TestBatch(unittest.TestCase):
+	def check(self, lanes, expected):
+		for lane, (status, outputs, memory) in enumerate(expected):
+			self.assertEqual(lanes.status(lane), status, lane)
+			self.assertEqual(lanes.drain(lane), outputs, lane)
+			self.assertEqual(lanes.memory(lane), memory, lane)
+
+	def test_day2_grid(self):
+		data = load("day2.txt")
+		# nouns and verbs past the program make some lanes fail
+		grid = [(noun, verb) for noun in range(0, 200, 9) for verb in range(0, 200, 13)]
+		lanes = batch.Batch.tile(data, len(grid))
+		lanes.poke(1, [noun for noun, _ in grid])
+		lanes.poke(2, [verb for _, verb in grid])
+		lanes.run()
+		expected = [scalar(data, pokes=((1, noun), (2, verb))) for noun, verb in grid]
+		self.assertEqual(sorted(lanes.errors), [idx for idx, (status, _, _) in enumerate(expected) if status is None])
+		self.assertTrue(lanes.errors)
+		for idx, (status, _, memory) in enumerate(expected):
+			if status is not None:
+				self.assertEqual(lanes.peek(0)[idx], memory[0])
+				self.assertEqual(lanes.memory(idx), memory)
+
+	def test_divergent_inputs(self):
+		# every lane of day5 takes its own path through the diagnostics
+		data = load("day5.txt")
+		values = [1, 5, 0, 2, 7, 8, 9, -3] * 3
+		lanes = batch.Batch.tile(data, len(values))
+		for lane, value in enumerate(values):
+			lanes.feed(lane, value)
+		lanes.run()
+		self.check(lanes, [scalar(data, [value]) for value in values])
+		self.assertEqual(lanes.drain(0), [])
+
+	def test_branches_and_small_groups(self):
+		values = list(range(16))
+		for min_lanes in (1, 4, 32):
+			lanes = batch.Batch.tile(COMPARE8, len(values), min_lanes=min_lanes)
+			for lane, value in enumerate(values):
+				lanes.feed(lane, value)
+			lanes.run()
+			self.check(lanes, [scalar(COMPARE8, [value]) for value in values])
+
+	def test_waits_for_input(self):
+		program = [3, 11, 3, 12, 1, 11, 12, 13, 4, 13, 99, 0, 0, 0]
+		lanes = batch.Batch.tile(program, 6)
+		for lane in range(6):
+			lanes.feed(lane, lane)
+		self.assertEqual(lanes.run(), [NEEDS_INPUT] * 6)
+		for lane in range(0, 6, 2):
+			lanes.feed(lane, 10)
+		statuses = lanes.run()
+		self.assertEqual(statuses, [HALTED, NEEDS_INPUT] * 3)
+		self.assertEqual([lanes.drain(lane) for lane in range(6)], [[10], [], [12], [], [14], []])
+
+	def test_wide_values_leave_lockstep(self):
+		# squares its input three times; big inputs overflow int64
+		program = [3, 13, 2, 13, 13, 13, 2, 13, 13, 13, 4, 13, 99, 0]
+		values = [2, 3, 1 << 20, 5, 1 << 40, 7]
+		lanes = batch.Batch.tile(program, len(values), min_lanes=2)
+		for lane, value in enumerate(values):
+			lanes.feed(lane, value)
+		lanes.run()
+		self.assertTrue(lanes.scalar)
+		self.check(lanes, [scalar(program, [value]) for value in values])
+
+	def test_day7_sweep(self):
+		data = load("day7.txt")
+		for phases in ("01234", "56789"):
+			expected = day7.sweep(data, phases)
+			self.assertEqual(day7.sweep_batch(data, phases), list(expected))
+
+
+if __name__ == "__main__":
+	unittest.main()
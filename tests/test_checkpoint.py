@@ -0,0 +1,60 @@
+"""
+Tests for IntCode checkpoints.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from intcode import IntCode, NEEDS_INPUT
+from intcode import checkpoint
+
+
+class TestCheckpoint(unittest.TestCase):
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.dir, "machines.ckpt")
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def test_round_trip(self):
+		machine = IntCode([3, 9, 4, 9, 3, 9, 4, 9, 99, 0])
+		machine.feed(5)
+		self.assertEqual(machine.run(), NEEDS_INPUT)
+		with checkpoint.Checkpointer(self.path) as cp:
+			cp.save([machine], {"round": 1})
+		saved, meta = checkpoint.load(self.path)
+		self.assertEqual(meta, {"round": 1})
+		restored = saved[0].restore()
+		self.assertEqual((restored.ip, restored.state), (machine.ip, machine.state))
+		self.assertEqual(restored.drain(), [5])
+		restored.feed(6)
+		restored.run()
+		self.assertEqual(restored.drain(), [6])
+
+	def test_wait_covers_the_write_in_flight(self):
+		write = checkpoint.write
+
+		def slow(path, data):
+			time.sleep(0.2)
+			write(path, data)
+
+		with mock.patch.object(checkpoint, "write", slow):
+			with checkpoint.Checkpointer(self.path) as cp:
+				cp.save([], {"n": 1})
+				# let the writer take it before waiting
+				time.sleep(0.05)
+				cp.wait()
+				self.assertEqual(checkpoint.load(self.path)[1], {"n": 1})
+				self.assertEqual(cp.written, 1)
+
+
+if __name__ == "__main__":
+	unittest.main()
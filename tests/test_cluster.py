@@ -0,0 +1,108 @@
+"""
+Tests for searches spread over worker processes.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import os
+import time
+import tempfile
+import threading
+import unittest
+
+import day7
+from intcode import load
+from intcode import cluster
+
+
+class Multiples(cluster.Search):
+	"""
+	Matches the multiples of step as [index, pid]. Taking delay seconds per
+	candidate, and exiting at index crash the first time any worker reaches
+	it (marked by creating the file marker).
+	"""
+	def __init__(self, image, step, delay=0, crash=None, marker=None):
+		self.step = step
+		self.delay = delay
+		self.crash = crash
+		self.marker = marker
+
+	def check(self, idx):
+		if idx == self.crash:
+			try:
+				fd = os.open(self.marker, os.O_CREAT | os.O_EXCL)
+			except FileExistsError:
+				pass
+			else:
+				os.close(fd)
+				os._exit(1)
+		if self.delay:
+			time.sleep(self.delay)
+		return [idx, os.getpid()] if idx % self.step == 0 else None
+
+
+def search(ranges, spawn, late=False, **params):
+	"""
+	Run Multiples over ranges with spawn local workers; with late, one more
+	worker joins from a thread of this process once the first range is done.
+	Returns the coordinator, the matches and the ranges done.
+	"""
+	matches = []
+	done = []
+	threads = []
+
+	def finished(start, stop):
+		done.append((start, stop))
+		if late and not threads:
+			thread = threading.Thread(target=cluster.Worker(coordinator.address).run)
+			thread.start()
+			threads.append(thread)
+
+	with cluster.Coordinator("tests.test_cluster:Multiples", params, [99], ranges) as coordinator:
+		coordinator.run(spawn=spawn, on_match=lambda idx, value: matches.append(value), on_done=finished)
+	for thread in threads:
+		thread.join()
+	return coordinator, matches, done
+
+
+def covered(done):
+	return sorted(idx for start, stop in done for idx in range(start, stop))
+
+
+class TestCluster(unittest.TestCase):
+	def test_workers_match_single_process(self):
+		data = load("day7.txt")
+		expected = day7.sweep(data, "56789")
+		self.assertEqual(day7.sweep(data, "56789", workers=3), expected)
+		self.assertEqual(expected, [5406484, ("5", "7", "9", "8", "6")])
+
+	def test_coordinator(self):
+		coordinator, matches, done = search(cluster.split(range(100), 10), 3, step=7)
+		self.assertEqual((coordinator.joined, coordinator.lost), (3, 0))
+		self.assertEqual(coordinator.tried, 100)
+		self.assertEqual(covered(done), list(range(100)))
+		self.assertEqual(sorted(idx for idx, _ in matches), list(range(0, 100, 7)))
+
+	def test_lost_worker_is_requeued(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			coordinator, matches, done = search(
+				cluster.split(range(60), 5), 2, step=3, crash=23, marker=os.path.join(tmp, "crashed")
+			)
+			self.assertTrue(os.path.exists(os.path.join(tmp, "crashed")))
+		self.assertEqual((coordinator.joined, coordinator.lost), (2, 1))
+		# every range is finished exactly once, whoever held it first
+		self.assertEqual(covered(done), list(range(60)))
+		self.assertEqual(sorted(set(idx for idx, _ in matches)), list(range(0, 60, 3)))
+
+	def test_late_worker(self):
+		coordinator, matches, done = search(cluster.split(range(80), 4), 1, late=True, step=1, delay=0.01)
+		self.assertEqual((coordinator.joined, coordinator.lost), (2, 0))
+		self.assertEqual(covered(done), list(range(80)))
+		pids = set(pid for _, pid in matches)
+		self.assertIn(os.getpid(), pids)
+		self.assertEqual(len(pids), 2)
+
+
+if __name__ == "__main__":
+	unittest.main()
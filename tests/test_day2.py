@@ -0,0 +1,45 @@
+"""
+Tests for the day2 noun/verb search.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import unittest
+
+import day2
+from intcode import load
+
+
+# [0] = [13] + [14], except that noun 3 loops forever
+LOOPING = [1, 13, 14, 0, 1008, 13, 3, 12, 1005, 12, 8, 99, 0, 0, 0]
+
+
+class TestFuzz(unittest.TestCase):
+	def setUp(self):
+		self.data = load("day2.txt")
+
+	def test_pool_matches_serial(self):
+		serial = day2.fuzz(self.data, 1, 2, 19690720, jobs=1)
+		parallel = day2.fuzz(self.data, 1, 2, 19690720, jobs=3)
+		self.assertEqual(serial[0], (41, 12))
+		self.assertEqual(parallel[0], serial[0])
+		self.assertGreaterEqual(parallel[1], 1)
+
+	def test_no_match(self):
+		for jobs in (1, 2):
+			match, tried, _ = day2.fuzz(self.data, 1, 2, -1, jobs=jobs)
+			self.assertIsNone(match)
+			self.assertEqual(tried, 100 * 100)
+
+	def test_budget_skips_runaway_candidates(self):
+		for jobs in (1, 2):
+			match, tried, _ = day2.fuzz(LOOPING, 13, 14, 7, space=10, jobs=jobs, budget=1000)
+			self.assertEqual(match, (0, 7))
+			match, tried, _ = day2.fuzz(LOOPING, 13, 14, 12, space=10, jobs=jobs, budget=1000)
+			# 3 + 9 runs forever; the search goes on to 4 + 8
+			self.assertEqual(match, (4, 8))
+
+
+if __name__ == "__main__":
+	unittest.main()
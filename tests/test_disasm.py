@@ -0,0 +1,65 @@
+"""
+Tests for the disassembler and control-flow graph.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import io
+import unittest
+
+from intcode import load
+from intcode.engine import ADD, IN, LESS_THAN, JUMP_IF_TRUE
+from intcode import disasm
+
+from .test_fusion import LOOP
+
+
+class TestDisasm(unittest.TestCase):
+	def test_loop(self):
+		graph = disasm.Graph(LOOP)
+		self.assertEqual(sorted(graph.insts), [0, 4, 8, 11, 13])
+		self.assertEqual(str(graph.insts[4]), "     4: LESS THAN [20], 5 -> [21]")
+		self.assertEqual(graph.insts[8].target, 0)
+		# OUT ends a block
+		self.assertEqual(sorted(graph.blocks), [0, 11, 13])
+		self.assertEqual(graph.blocks[11].succ, [13])
+		self.assertEqual(graph.blocks[0].succ, [11, 0])
+		self.assertEqual(graph.blocks[0].stats()["ops"], {"ADD": 1, "LESS THAN": 1, "JUMP IF TRUE": 1})
+		self.assertEqual(graph.self_modifying(), [])
+		# the words after the HALT are data
+		self.assertEqual(disasm.listing(LOOP)[5:7], ["    14: DATA 0", "    15: DATA 0"])
+
+	def test_day7_patch_sites(self):
+		graph = disasm.Graph(load("day7.txt"))
+		# the phase is read into the target of the jump at 6, through which
+		# the program dispatches to the code for that phase
+		patches = graph.self_modifying()
+		self.assertEqual([(inst.pos, inst.op, inst.writes()) for inst in patches], [(0, IN, [8]), (2, ADD, [8])])
+		self.assertEqual(graph.insts[6].op, JUMP_IF_TRUE)
+		self.assertTrue(graph.insts[6].dynamic)
+		self.assertTrue(graph.blocks[2].dynamic)
+		out = io.StringIO()
+		graph.report(out)
+		self.assertEqual(out.getvalue().splitlines()[-1], "stores into code at: [0, 2]")
+
+	def test_day5_patch_sites(self):
+		data = load("day5.txt")
+		# the word at 6 only becomes an instruction once input patches it
+		graph = disasm.Graph(data)
+		self.assertEqual(sorted(graph.insts), [0, 2])
+		self.assertEqual(disasm.listing(data)[2], "     6: DATA {}".format(data[6]))
+		swept = disasm.Graph(data, sweep=True)
+		patches = {inst.pos: inst.writes()[0] for inst in swept.self_modifying()}
+		self.assertEqual(patches, {7: 104, 284: 0, 304: 0})
+		self.assertEqual(swept.insts[0].op, IN)
+		self.assertIn(LESS_THAN, set(inst.op for inst in swept.insts.values()))
+
+	def test_truncated(self):
+		self.assertIsNone(disasm.decode_at([1101, 1], 0))
+		self.assertIsNone(disasm.decode_at([42], 0))
+		self.assertEqual(disasm.listing([1101, 1]), ["     0: DATA 1101", "     1: DATA 1"])
+
+
+if __name__ == "__main__":
+	unittest.main()
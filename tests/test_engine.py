@@ -0,0 +1,288 @@
+"""
+Tests for the IntCode engine.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import itertools
+import unittest
+
+from intcode import IntCode, IntCodeError, BudgetExceeded, NEEDS_INPUT, OUTPUT, HALTED, build
+from intcode.engine import FEATURES
+
+
+# day5 example: outputs 999, 1000 or 1001 for an input below, equal to or
+# above 8
+COMPARE8 = [
+	3, 21, 1008, 21, 8, 20, 1005, 20, 22, 107, 8, 21, 20, 1006, 20, 31,
+	1106, 0, 36, 98, 0, 0, 1002, 21, 125, 20, 4, 20, 1105, 1, 46, 104,
+	999, 1105, 1, 46, 1101, 1000, 1, 20, 4, 20, 1105, 1, 46, 98, 99,
+]
+
+
+def run(program, *inputs, **kwargs):
+	machine = IntCode(list(program), **kwargs)
+	machine.feed(*inputs)
+	status = machine.run()
+	return status, list(machine.outputs), machine
+
+
+class TestEval(unittest.TestCase):
+	def test_day2_examples(self):
+		for program, state in (
+			([1, 0, 0, 0, 99], [2, 0, 0, 0, 99]),
+			([2, 3, 0, 3, 99], [2, 3, 0, 6, 99]),
+			([2, 4, 4, 5, 99, 0], [2, 4, 4, 5, 99, 9801]),
+			([1, 1, 1, 4, 99, 5, 6, 0, 99], [30, 1, 1, 4, 2, 5, 6, 0, 99]),
+		):
+			machine = IntCode(list(program))
+			machine.eval()
+			self.assertEqual(machine.state, state)
+			self.assertTrue(machine.halted)
+
+	def test_modes_and_negative_immediates(self):
+		machine = IntCode([1101, 100, -1, 4, 0])
+		machine.eval()
+		self.assertEqual(machine.state[4], 99)
+
+	def test_eval_read_write(self):
+		out = []
+		machine = IntCode([3, 0, 4, 0, 99], read=lambda: 42, write=out.append)
+		machine.eval()
+		self.assertEqual(out, [42])
+
+	def test_compare_and_jump(self):
+		for value, expected in ((7, 999), (8, 1000), (9, 1001)):
+			self.assertEqual(run(COMPARE8, value)[1], [expected])
+
+	def test_jump_to_end_halts(self):
+		status, _, machine = run([1105, 1, 10])
+		self.assertEqual(status, HALTED)
+		self.assertEqual(machine.ip, 3)
+
+	def test_jump_target_out_of_range_raises(self):
+		# the position-mode target is read from address 10
+		for program in ([5, 3, 10, 1], [6, 3, 10, 0], [5, 3, 10, 1, 99]):
+			with self.assertRaises(IntCodeError):
+				IntCode(list(program)).eval()
+
+	def test_operand_out_of_range_raises(self):
+		with self.assertRaises(IntCodeError):
+			IntCode([1, 0, 100, 0, 99]).eval()
+
+	def test_invalid_instruction(self):
+		with self.assertRaises(IntCodeError):
+			IntCode([1, 0, 0, 0, 42]).eval()
+
+	def test_grow(self):
+		machine = IntCode([1101, 1, 1, 10, 99], grow=True)
+		machine.eval()
+		self.assertEqual(len(machine.state), 11)
+		self.assertEqual(machine.state[10], 2)
+
+	def test_compact_widens_on_overflow(self):
+		machine = IntCode([1002, 7, 3, 7, 4, 7, 99, 1 << 62], compact=True, write=lambda v: None)
+		machine.eval()
+		self.assertEqual(machine.state[7], 3 << 62)
+
+
+class TestRun(unittest.TestCase):
+	def test_blocks_for_input(self):
+		machine = IntCode([3, 9, 4, 9, 3, 9, 4, 9, 99, 0])
+		self.assertEqual(machine.run(), NEEDS_INPUT)
+		machine.feed(5)
+		self.assertEqual(machine.run(), NEEDS_INPUT)
+		self.assertEqual(machine.drain(), [5])
+		machine.feed(6)
+		self.assertEqual(machine.run(), HALTED)
+		self.assertEqual(machine.drain(), [6])
+
+	def test_until_output(self):
+		machine = IntCode([104, 1, 104, 2, 99])
+		self.assertEqual(machine.run(until_output=True), OUTPUT)
+		self.assertEqual(machine.drain(), [1])
+		self.assertEqual(machine.run(), HALTED)
+		self.assertEqual(machine.drain(), [2])
+
+	def test_budget(self):
+		machine = IntCode([1105, 1, 0])
+		with self.assertRaises(BudgetExceeded):
+			machine.run(budget=100)
+
+	def test_coroutine(self):
+		gen = IntCode(list(COMPARE8)).coroutine()
+		self.assertEqual(next(gen), (NEEDS_INPUT, None))
+		self.assertEqual(gen.send(9), (OUTPUT, 1001))
+
+	def test_fork_runs_independently(self):
+		machine = IntCode(list(COMPARE8))
+		self.assertEqual(machine.run(), NEEDS_INPUT)
+		child = machine.fork()
+		self.assertEqual(child.ip, machine.ip)
+		self.assertIsNot(child.state, machine.state)
+		child.feed(7)
+		machine.feed(9)
+		child.run()
+		machine.run()
+		self.assertEqual((child.drain(), machine.drain()), ([999], [1001]))
+
+	def test_reset(self):
+		machine = IntCode(list(COMPARE8), count=True, fuse=True)
+		machine.feed(7, 8)
+		self.assertEqual(machine.run(), HALTED)
+		machine.reset(COMPARE8)
+		self.assertEqual((machine.status, machine.steps, machine.ip), (None, 0, 0))
+		self.assertEqual((list(machine.inputs), list(machine.outputs)), ([], []))
+		machine.feed(9)
+		self.assertEqual(machine.run(), HALTED)
+		self.assertEqual(machine.drain(), [1001])
+
+	def test_reset_reuses_fusion_analysis(self):
+		machine = IntCode(list(COMPARE8), fuse=True)
+		fused = machine._fused
+		machine.feed(8)
+		machine.run()
+		machine.reset(COMPARE8)
+		self.assertIs(machine._fused, fused)
+		self.assertIs(IntCode(list(COMPARE8), fuse=True)._fused, fused)
+
+
+class TestFork(unittest.TestCase):
+	def setUp(self):
+		# a few pages of memory
+		self.image = list(range(1000))
+		self.parent = IntCode(list(self.image))
+
+	def test_writes_stay_private(self):
+		first = self.parent.fork()
+		second = self.parent.fork()
+		first.state[10] = -1
+		second.state[500] = -2
+		self.parent.state[999] = -3
+		self.assertEqual(list(self.parent.state), self.image[:999] + [-3])
+		self.assertEqual(list(first.state), self.image[:10] + [-1] + self.image[11:])
+		self.assertEqual(list(second.state), self.image[:500] + [-2] + self.image[501:])
+
+	def test_pages_are_shared_until_written(self):
+		first = self.parent.fork()
+		second = first.fork()
+		first.state[10] = -1
+		pages = [
+			sum(1 for a, b in zip(one.state.pages, other.state.pages) if a is b)
+			for one, other in ((self.parent, first), (first, second), (self.parent, second))
+		]
+		count = len(self.parent.state.pages)
+		self.assertEqual(pages, [count - 1, count - 1, count])
+		self.assertEqual(second.state[10], 10)
+
+	def test_fork_of_a_fork_sees_its_writes(self):
+		child = self.parent.fork()
+		child.state[64] = -1
+		grandchild = child.fork()
+		child.state[64] = -2
+		self.assertEqual((self.parent.state[64], child.state[64], grandchild.state[64]), (64, -2, -1))
+
+	def test_out_of_range(self):
+		child = self.parent.fork()
+		with self.assertRaises(IndexError):
+			child.state[1000]
+		with self.assertRaises(IndexError):
+			child.state[-1001] = 0
+		self.assertEqual(child.state[-1], 999)
+
+	def test_grow(self):
+		machine = IntCode([1101, 1, 1, 200, 99], grow=True)
+		child = machine.fork()
+		child.eval()
+		self.assertEqual((len(child.state), child.state[200]), (201, 2))
+		self.assertEqual(len(machine.state), 5)
+
+
+class TestDecodeCache(unittest.TestCase):
+	# outputs 7, then patches the OUT to output 9 and jumps back to it
+	PATCH = [104, 7, 1101, 0, 9, 1, 1105, 1, 0]
+
+	def step(self, machine, count):
+		for _ in range(count):
+			machine.step_forward()
+		return machine.drain()
+
+	def test_hits(self):
+		out = []
+		machine = IntCode([1101, 0, 3, 14, 1001, 14, -1, 14, 1005, 14, 4, 4, 14, 99, 0], write=out.append)
+		while not machine.halted:
+			machine.step_forward()
+		self.assertEqual(out, [0])
+		self.assertEqual(machine.decoded.misses, 5)
+		self.assertEqual(machine.decoded.hits, machine.steps - 5)
+
+	def test_write_invalidates(self):
+		out = []
+		machine = IntCode(list(self.PATCH), write=out.append)
+		self.step(machine, 7)
+		self.assertEqual(out, [7, 9, 9])
+		self.assertEqual(machine.decoded.invalidated, 2)
+
+	def test_step_backward_invalidates(self):
+		out = []
+		machine = IntCode(list(self.PATCH), write=out.append)
+		machine._journal = []
+		self.step(machine, 4)
+		# back to the start, undoing the store that patched the OUT
+		for _ in range(4):
+			machine.step_backward()
+		self.step(machine, 1)
+		self.assertEqual(out, [7, 9, 7])
+
+	def test_run_clears(self):
+		machine = IntCode(list(self.PATCH))
+		machine.step_forward()
+		self.assertEqual(len(machine.decoded), 1)
+		machine.run(until_output=True)
+		self.assertEqual(len(machine.decoded), 0)
+		machine.step_forward()
+		machine.reset(self.PATCH)
+		self.assertEqual(len(machine.decoded), 0)
+
+
+class TestBuild(unittest.TestCase):
+	def test_every_variant_agrees(self):
+		# every feature combination that builds runs the compare program
+		# to the same outputs
+		for combo in itertools.product((False, True), repeat=len(FEATURES)):
+			features = dict(zip(FEATURES, combo))
+			try:
+				build(**features)
+			except ValueError:
+				continue
+			if features["coroutine"] or features["channels"]:
+				continue
+			kwargs = {name: features[name] for name in ("count", "track", "profile", "fuse")}
+			for value, expected in ((7, 999), (8, 1000), (9, 1001)):
+				out = []
+				machine = IntCode(
+					list(COMPARE8), read=lambda: value, write=out.append, tracer=lambda *a: None,
+					trace=features["trace"], **kwargs
+				)
+				machine.eval(budget=10000 if features["budget"] else None)
+				self.assertEqual(out, [expected], features)
+
+	def test_jump_fault_in_every_variant(self):
+		for combo in itertools.product((False, True), repeat=len(FEATURES)):
+			features = dict(zip(FEATURES, combo))
+			try:
+				fn = build(**features)
+			except ValueError:
+				continue
+			if features["coroutine"] or features["checkpoint"] or features["budget"]:
+				continue
+			machine = IntCode([5, 3, 10, 1], tracer=lambda *a: None, **{
+				name: features[name] for name in ("trace", "count", "track", "profile", "fuse")
+			})
+			with self.assertRaises(IntCodeError, msg=str(features)):
+				fn(machine)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,114 @@
+"""
+Tests for compare/jump superinstructions.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import itertools
+import unittest
+
+from intcode import IntCode, HALTED, load
+from intcode import fusion
+
+
+# day7's second part 2 example, with a fusable pair in its loop
+FEEDBACK = [
+	3, 52, 1001, 52, -5, 52, 3, 53, 1, 52, 56, 54, 1007, 54, 5, 55, 1005, 55, 26, 1001, 54,
+	-5, 54, 1105, 1, 12, 1, 53, 54, 53, 1008, 54, 0, 55, 1001, 55, 1, 55, 2, 53, 55, 53, 4,
+	53, 1001, 56, -1, 56, 1005, 56, 6, 99, 0, 0, 0, 0, 10,
+]
+# counts [20] up to 5 with the compare right before the jump on its flag,
+# [21], which starts out 7
+LOOP = [
+	1001, 20, 1, 20,
+	1007, 20, 5, 21,
+	1005, 21, 0,
+	4, 20,
+	99,
+] + [0] * 6 + [0, 7]
+# a compare/jump pair whose jump the first instruction turns from
+# JUMP_IF_TRUE into JUMP_IF_FALSE
+PATCHED = [
+	1101, 0, 1006, 8,
+	1107, 1, 2, 17,
+	1005, 17, 14,
+	104, 0, 99,
+	104, 1, 99,
+	0, 0,
+]
+
+
+def run(program, inputs, **kwargs):
+	machine = IntCode(list(program), **kwargs)
+	machine.feed(*inputs)
+	assert machine.run() == HALTED
+	return machine.drain(), list(machine.state)
+
+
+def chain(program, phases, feedback, **kwargs):
+	amps = [IntCode(list(program), **kwargs) for _ in phases]
+	for amp, phase in zip(amps, phases):
+		amp.feed(phase)
+	amps[0].feed(0)
+	last = None
+	while not amps[-1].halted:
+		for idx, amp in enumerate(amps):
+			amp.run()
+			out = amp.drain()
+			if idx == len(amps) - 1:
+				last = out[-1] if out else last
+				if not feedback:
+					return last
+			amps[(idx + 1) % len(amps)].feed(*out)
+	return last
+
+
+class TestFusion(unittest.TestCase):
+	def test_day5(self):
+		program = load("day5.txt")
+		self.assertTrue(fusion.find(program))
+		for value, expected in ((1, 9961446), (5, 742621)):
+			out, state = run(program, [value])
+			self.assertEqual(out[-1], expected)
+			self.assertEqual(run(program, [value], fuse=True), (out, state))
+
+	def test_day7(self):
+		self.assertIn(12, fusion.find(FEEDBACK))
+		self.assertEqual(chain(FEEDBACK, (9, 7, 8, 5, 6), True, fuse=True), 18216)
+		program = load("day7.txt")
+		for phases, feedback in (("01234", False), ("56789", True)):
+			for perm in itertools.islice(itertools.permutations(int(p) for p in phases), 0, None, 7):
+				for code in (program, FEEDBACK):
+					if code is FEEDBACK and not feedback:
+						continue
+					self.assertEqual(chain(code, perm, feedback, fuse=True), chain(code, perm, feedback))
+
+	def test_fused_pair_counts(self):
+		self.assertEqual(fusion.dispatches(LOOP, [], True), ([5], 5 * 3 + 2, 5 * 2 + 2))
+
+	def test_self_modifying_code_is_not_fused(self):
+		self.assertEqual(fusion.find(PATCHED), {})
+		self.assertEqual(IntCode(list(PATCHED), fuse=True)._fused, {})
+		self.assertEqual(run(PATCHED, [], fuse=True), run(PATCHED, []))
+		self.assertEqual(run(PATCHED, [])[0], [0])
+		# the same program storing next to its code instead
+		moved = PATCHED[:3] + [18] + PATCHED[4:]
+		self.assertEqual(list(fusion.find(moved)), [4])
+		self.assertEqual(run(moved, [], fuse=True), run(moved, []))
+
+	def test_dead_stores_need_elide(self):
+		self.assertFalse(fusion.find(LOOP)[4][2])
+		self.assertTrue(fusion.find(LOOP, elide=True)[4][2])
+		out, state = run(LOOP, [])
+		self.assertEqual(state[21], 0)
+		self.assertEqual(run(LOOP, [], fuse=True), (out, state))
+		elided = run(LOOP, [], fuse=True, elide=True)
+		self.assertEqual(elided[0], out)
+		# the flag word is left as it was
+		self.assertEqual(elided[1][21], 7)
+		self.assertEqual(elided[1][:21], state[:21])
+
+
+if __name__ == "__main__":
+	unittest.main()
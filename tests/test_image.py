@@ -0,0 +1,78 @@
+"""
+Tests for binary program images.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import os
+import pickle
+import tempfile
+import unittest
+
+from intcode import IntCode, HALTED, load
+from intcode import image
+
+
+class TestImage(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.path = os.path.join(self.tmp.name, "day5.icb")
+
+	def tearDown(self):
+		self.tmp.cleanup()
+
+	def test_round_trip(self):
+		words = load("day5.txt")
+		self.assertEqual(image.convert("day5.txt", self.path), len(words))
+		self.assertTrue(image.is_image(self.path))
+		self.assertFalse(image.is_image("day5.txt"))
+		with image.Image(self.path) as img:
+			self.assertEqual(len(img), len(words))
+			self.assertEqual(img.tolist(), words)
+			self.assertEqual(img[3:7], words[3:7])
+			self.assertEqual(img[-1], words[-1])
+		# load() recognizes images by their magic
+		with load(self.path) as img:
+			self.assertIsInstance(img, image.Image)
+			self.assertEqual(list(img), words)
+
+	def test_wide_words(self):
+		words = [-(1 << 63), -1, 0, (1 << 63) - 1]
+		image.write(self.path, words)
+		with image.Image(self.path) as img:
+			self.assertEqual(img.tolist(), words)
+		with self.assertRaises(OverflowError):
+			image.write(self.path, [1 << 63])
+
+	def test_runs_on_a_copy(self):
+		image.convert("day5.txt", self.path)
+		with image.Image(self.path) as img:
+			machine = IntCode(img)
+			machine.feed(5)
+			self.assertEqual(machine.run(), HALTED)
+			self.assertEqual(machine.drain(), [742621])
+			self.assertEqual(img.tolist(), load("day5.txt"))
+
+	def test_pickles_as_path(self):
+		image.write(self.path, [1, 2, 3])
+		with image.Image(self.path) as img:
+			raw = pickle.dumps(img)
+		self.assertIn(self.path.encode("utf-8"), raw)
+		with pickle.loads(raw) as img:
+			self.assertEqual(img.tolist(), [1, 2, 3])
+
+	def test_bad_files(self):
+		for raw in (b"", b"1,2,3\n", image.HEADER.pack(image.MAGIC, image.VERSION + 1, 0, 0)):
+			with open(self.path, "wb") as f:
+				f.write(raw)
+			with self.assertRaises(image.ImageError):
+				image.Image(self.path)
+		with open(self.path, "wb") as f:
+			f.write(image.HEADER.pack(image.MAGIC, image.VERSION, 0, 4) + b"\0" * 8)
+		with self.assertRaisesRegex(image.ImageError, "truncated"):
+			image.Image(self.path)
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,57 @@
+"""
+Tests for the instruction-level profiler.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import io
+import unittest
+
+from intcode import IntCode, HALTED
+from intcode.engine import ADD, LESS_THAN, JUMP_IF_TRUE, OUT, HALT
+
+from .test_fusion import LOOP
+
+
+def profiled(program, step=False):
+	machine = IntCode(list(program), profile=True)
+	if step:
+		while not machine.halted:
+			machine.step_forward()
+	else:
+		assert machine.run() == HALTED
+	return machine.profile
+
+
+class TestProfile(unittest.TestCase):
+	def test_loop_counts(self):
+		for step in (False, True):
+			profile = profiled(LOOP, step)
+			self.assertEqual(dict(profile.ips), {0: 5, 4: 5, 8: 5, 11: 1, 13: 1})
+			self.assertEqual(dict(profile.ops), {ADD: 5, LESS_THAN: 5, JUMP_IF_TRUE: 5, OUT: 1, HALT: 1})
+			self.assertEqual(profile.total, 17)
+			self.assertEqual(profile.hot(3), [(0, 5), (4, 5), (8, 5)])
+
+	def test_blocks(self):
+		profile = profiled(LOOP)
+		# the loop body is entered from the start and from each jump back
+		self.assertEqual(profile.blocks[0][0], 5)
+
+	def test_names_what_ran(self):
+		# the ADD at 0 overwrites itself with a HALT word
+		profile = profiled([1101, 0, 99, 0])
+		out = io.StringIO()
+		profile.report(stream=out)
+		self.assertIn("ADD", out.getvalue())
+		self.assertNotIn("HALT", out.getvalue())
+		self.assertEqual(profile.collapsed("t"), ["t;block 0;0 ADD 1"])
+
+	def test_clear(self):
+		profile = profiled(LOOP)
+		profile.clear()
+		self.assertEqual((profile.total, dict(profile.codes), profile.blocks), (0, {}, {}))
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,81 @@
+"""
+Tests for recording and replaying machine I/O.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from intcode import IntCode, BudgetExceeded, NEEDS_INPUT, HALTED
+from intcode import replay
+
+import day7
+
+
+# day7 part 2 example: 139629729 from phases 98765
+FEEDBACK = [
+	3, 26, 1001, 26, -4, 26, 3, 27, 1002, 27, 2, 27, 1, 27, 26, 27, 4, 27, 1001, 28, -1, 28,
+	1005, 28, 6, 99, 0, 0, 5,
+]
+
+
+class TestReplay(unittest.TestCase):
+	def setUp(self):
+		self.dir = tempfile.mkdtemp()
+		self.path = os.path.join(self.dir, "run.icr")
+
+	def tearDown(self):
+		shutil.rmtree(self.dir)
+
+	def test_round_trip(self):
+		with replay.Recorder(self.path) as recorder:
+			self.assertEqual(day7.run_chain(FEEDBACK, "98765", recorder=recorder), 139629729)
+		tracks = replay.read(self.path)
+		self.assertEqual([track.name for track in tracks], ["98765:{}".format(c) for c in "ABCDE"])
+		for phase, track in zip("98765", tracks):
+			self.assertEqual(track.status, HALTED)
+			self.assertEqual(track.inputs[0][1], int(phase))
+			machine, diff = replay.replay(FEEDBACK, track)
+			self.assertIsNone(diff, track.name)
+			self.assertEqual(machine.status, HALTED)
+		self.assertEqual(tracks[-1].outputs[-1][1], 139629729)
+
+	def test_interrupted_run(self):
+		with replay.Recorder(self.path) as recorder:
+			self.assertIsNone(day7.run_chain(FEEDBACK, "98765", budget=20, recorder=recorder))
+		tracks = replay.read(self.path)
+		interrupted = [track for track in tracks if track.status is None]
+		self.assertEqual(len(interrupted), 1)
+		for track in tracks:
+			machine, diff = replay.replay(FEEDBACK, track)
+			self.assertIsNone(diff, track.name)
+		self.assertEqual(replay.replay(FEEDBACK, interrupted[0])[0].steps, interrupted[0].steps)
+
+	def test_big_values(self):
+		with replay.Recorder(self.path) as recorder:
+			mid = recorder.machine("big")
+			recorder.input(mid, 1, 1 << 70)
+			recorder.output(mid, 2, -(1 << 80))
+			recorder.end(mid, 3, None)
+		track, = replay.read(self.path)
+		self.assertEqual(track.inputs, [(1, 1 << 70)])
+		self.assertEqual(track.outputs, [(2, -(1 << 80))])
+		self.assertEqual((track.steps, track.status), (3, None))
+
+
+class TestStatus(unittest.TestCase):
+	def test_interrupted_run_clears_status(self):
+		machine = IntCode([3, 5, 1105, 1, 2, 0])
+		self.assertEqual(machine.run(), NEEDS_INPUT)
+		machine.feed(1)
+		with self.assertRaises(BudgetExceeded):
+			machine.run(budget=10)
+		self.assertIsNone(machine.status)
+
+
+if __name__ == "__main__":
+	unittest.main()
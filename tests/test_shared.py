@@ -0,0 +1,81 @@
+"""
+Tests for shared program images.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import sys
+import unittest
+import subprocess
+
+from intcode import IntCode, HALTED
+from intcode import shared
+
+from .test_engine import COMPARE8
+
+
+@unittest.skipIf(shared.shared_memory is None, "needs Python 3.8 or later")
+class TestShared(unittest.TestCase):
+	def setUp(self):
+		self.image = shared.SharedImage(COMPARE8)
+
+	def tearDown(self):
+		self.image.unlink()
+
+	def test_private_copies_on_write(self):
+		first = shared.private(self.image)
+		second = shared.private(self.image)
+		first[0] = 99
+		self.assertEqual(second[0], COMPARE8[0])
+		self.assertEqual(self.image[0], COMPARE8[0])
+
+	def test_machines_run_private_memory(self):
+		for value, expected in ((7, 999), (9, 1001)):
+			machine = IntCode(shared.private(self.image))
+			machine.feed(value)
+			self.assertEqual(machine.run(), HALTED)
+			self.assertEqual(machine.drain(), [expected])
+		self.assertEqual(self.image.tolist(), COMPARE8)
+
+	def test_wide_words(self):
+		# IN of a word that does not fit int64, then ADD of one
+		image = shared.SharedImage([3, 9, 1, 9, 9, 10, 4, 10, 99, 0, 0])
+		try:
+			big = 1 << 70
+			outputs = []
+			machine = IntCode(shared.private(image), read=lambda: big, write=outputs.append)
+			machine.eval()
+			self.assertEqual(outputs, [2 * big])
+			machine = IntCode(shared.private(image))
+			machine.feed(big)
+			self.assertEqual(machine.run(), HALTED)
+			self.assertEqual(machine.drain(), [2 * big])
+			stepped = IntCode(shared.private(image), read=lambda: big, write=outputs.append)
+			stepped.step_forward()
+			self.assertEqual(stepped.state[9], big)
+			self.assertEqual(image.tolist()[9], 0)
+		finally:
+			image.unlink()
+
+	def test_failed_read(self):
+		def read():
+			raise ValueError("not a number")
+		machine = IntCode(shared.private(self.image), read=read)
+		with self.assertRaisesRegex(ValueError, "not a number"):
+			machine.eval()
+
+	def test_attach(self):
+		# attach() is for processes multiprocessing did not start
+		code = (
+			"from intcode.shared import SharedImage, private\n"
+			"image = SharedImage.attach({!r}, {})\n"
+			"print(list(private(image)) == image.tolist() == {!r})\n"
+			"image.close()\n"
+		).format(self.image.name, len(self.image), COMPARE8)
+		out = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, check=True)
+		self.assertEqual(out.stdout.strip(), b"True")
+
+
+if __name__ == "__main__":
+	unittest.main()
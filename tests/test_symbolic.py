@@ -0,0 +1,78 @@
+"""
+Tests for symbolic evaluation and the day2 noun/verb solver.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import os
+import sys
+import tempfile
+import unittest
+import subprocess
+
+import day2
+from intcode import IntCode, load
+from intcode.symbolic import NotStraightLine, Poly, UNKNOWN, evaluate, solve
+
+
+TARGET = 19690720
+# [0] = noun * verb + 3, behind a jump
+JUMPING = [1105, 1, 4, 0, 2, 13, 14, 0, 1, 0, 15, 0, 99, 0, 0, 3]
+
+
+def output(data, noun, verb, at=(1, 2)):
+	machine = IntCode(list(data))
+	machine.state[at[0]] = noun
+	machine.state[at[1]] = verb
+	machine.eval()
+	return machine.state[0]
+
+
+class TestSymbolic(unittest.TestCase):
+	def setUp(self):
+		self.data = load("day2.txt")
+
+	def test_day2_closed_form(self):
+		poly = evaluate(self.data, (1, 2))[0]
+		self.assertIsInstance(poly, Poly)
+		for noun, verb in ((12, 2), (0, 0), (99, 99), (41, 12), (7, 63)):
+			self.assertEqual(poly(noun, verb), output(self.data, noun, verb))
+
+	def test_day2_matches_brute_force(self):
+		self.assertEqual(day2.solve_symbolic(self.data, 1, 2, TARGET), (41, 12))
+		match, tried, _ = day2.fuzz(self.data, 1, 2, TARGET, jobs=1)
+		self.assertEqual(match, (41, 12))
+		self.assertEqual(tried, 41 * 100 + 12 + 1)
+
+	def test_every_solution(self):
+		# not affine: [0] = [9] * [10] + 3
+		program = [2, 9, 10, 0, 1, 0, 11, 0, 99, 0, 0, 3]
+		poly = evaluate(program, (9, 10))[0]
+		expected = [(n, v) for n in range(30) for v in range(30) if output(program, n, v, (9, 10)) == 27]
+		self.assertEqual(list(solve(poly, 27, 30)), expected)
+		self.assertEqual(len(expected), 8)
+
+	def test_not_straight_line(self):
+		with self.assertRaises(NotStraightLine):
+			day2.solve_symbolic(JUMPING, 13, 14, 2003)
+		# an output loaded through the noun as an address is not known
+		mem = evaluate([1, 0, 0, 0, 2, 5, 0, 0, 99], (5,))
+		self.assertIs(mem[0], UNKNOWN)
+		with self.assertRaises(NotStraightLine):
+			list(solve(mem[0], 1))
+
+	def test_fallback(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			path = os.path.join(tmp, "jumping.txt")
+			with open(path, "w") as f:
+				f.write(",".join(map(str, JUMPING)))
+			out = subprocess.run(
+				[sys.executable, "day2.py", "-p", path, "-f", "-s", "-n", "13", "-v", "14", "-t", "2003", "-j", "1"],
+				stdout=subprocess.PIPE, check=True
+			)
+		self.assertEqual(out.stdout.strip(), b"noun: 25; verb: 80")
+
+
+if __name__ == "__main__":
+	unittest.main()
@@ -0,0 +1,83 @@
+"""
+Tests for executed/written address tracking.
+
+python -m unittest discover -t . -s tests
+"""
+
+
+import io
+import unittest
+
+from intcode import IntCode, HALTED, load
+from intcode.tracking import Bitset
+
+from .test_fusion import LOOP, PATCHED
+
+
+def tracked(program, inputs=(), step=False):
+	if step:
+		pending = list(inputs)
+		outputs = []
+		machine = IntCode(list(program), read=lambda: pending.pop(0), write=outputs.append, track=True)
+		while not machine.halted:
+			machine.step_forward()
+		machine.outputs.extend(outputs)
+		return machine
+	machine = IntCode(list(program), track=True)
+	machine.feed(*inputs)
+	assert machine.run() == HALTED
+	return machine
+
+
+class TestBitset(unittest.TestCase):
+	def test_ranges(self):
+		bits = Bitset(20)
+		bits.mark(2, 5)
+		bits.add(9)
+		bits.add(25)
+		self.assertEqual(list(bits), [2, 3, 4, 9])
+		self.assertEqual(len(bits), 4)
+		self.assertEqual(list(bits.ranges()), [(2, 5), (9, 10)])
+		self.assertNotIn(25, bits)
+		other = Bitset(12)
+		other.mark(4, 12)
+		self.assertEqual(list((bits & other).ranges()), [(4, 5), (9, 10)])
+
+
+class TestTracker(unittest.TestCase):
+	def test_data_stores(self):
+		for step in (False, True):
+			machine = tracked(LOOP, step=step)
+			self.assertFalse(machine.self_modifying)
+			self.assertEqual(list(machine.tracker.executed.ranges()), [(0, 14)])
+			self.assertEqual(list(machine.tracker.written), [20, 21])
+
+	def test_self_modifying_store(self):
+		for step in (False, True):
+			machine = tracked(PATCHED, step=step)
+			self.assertEqual(machine.outputs[-1], 0)
+			self.assertTrue(machine.self_modifying)
+			# the first instruction rewrote the jump at 8
+			self.assertEqual(list(machine.tracker.patched()), [8])
+			out = io.StringIO()
+			machine.tracker.report(out)
+			self.assertIn("self-modifying: [(8, 9)]", out.getvalue())
+
+	def test_day5(self):
+		machine = tracked(load("day5.txt"), [5])
+		self.assertEqual(machine.outputs[-1], 742621)
+		self.assertTrue(machine.self_modifying)
+		self.assertIn(6, machine.tracker.patched())
+
+	def test_untracked(self):
+		self.assertIsNone(IntCode(list(LOOP)).self_modifying)
+
+	def test_reset_clears(self):
+		machine = tracked(PATCHED)
+		machine.reset(PATCHED)
+		self.assertFalse(machine.tracker.executed)
+		self.assertFalse(machine.self_modifying)
+
+
+if __name__ == "__main__":
+	unittest.main()